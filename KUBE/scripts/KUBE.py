@@ -1,12 +1,21 @@
+import time
+# Start of the cold-start measurement, see record_startup()
+STARTED = time.perf_counter()
+
 import tkinter as tk
-from tkinter import ttk, messagebox, filedialog
-import json
+from tkinter import ttk, messagebox
 import os
+import sys
 from datetime import datetime, timedelta
-import hashlib
-import csv
 import threading
-import time
+import traceback
+from itertools import islice
+import bisect
+
+from kube.engine import KubeEngine
+from kube.archive import MIN_ARCHIVE_DAYS
+from kube.reports import WINDOWS
+from kube.records import CONDITIONS
 
 class LoadingAnimation:
     """Loading animation overlay"""
@@ -54,7 +63,202 @@ class LoadingAnimation:
         if self.overlay and self.overlay.winfo_exists():
             self.overlay.destroy()
 
-class KUBE:
+class VirtualTreeview:
+    """Treeview that only materializes the rows in view and recycles them on scroll"""
+    def __init__(self, parent, columns, **kwargs):
+        self.scrollbar = ttk.Scrollbar(parent, command=self.on_scrollbar)
+        self.scrollbar.pack(side="right", fill="y")
+        
+        self.tree = ttk.Treeview(parent, columns=columns, show="headings", **kwargs)
+        self.row_count = 0
+        self.fetch_row = None
+        self.offset = 0
+        self.visible_rows = 20
+        self.selected_index = None
+        
+        self.tree.bind("<Configure>", self.on_resize)
+        self.tree.bind("<MouseWheel>", lambda e: self.scroll_by(-1 if e.delta > 0 else 1, "units", 3))
+        self.tree.bind("<Button-4>", lambda e: self.scroll_by(-1, "units", 3))
+        self.tree.bind("<Button-5>", lambda e: self.scroll_by(1, "units", 3))
+        self.tree.bind("<Up>", lambda e: self.on_arrow(-1))
+        self.tree.bind("<Down>", lambda e: self.on_arrow(1))
+        self.tree.bind("<Prior>", lambda e: self.scroll_by(-1, "pages"))
+        self.tree.bind("<Next>", lambda e: self.scroll_by(1, "pages"))
+        self.tree.bind("<<TreeviewSelect>>", self.on_select, add="+")
+    
+    def pack(self, **kwargs):
+        self.tree.pack(**kwargs)
+    
+    def set_rows(self, row_count, fetch_row):
+        """Show row_count rows, fetch_row(index) returns (values, tags) for one row"""
+        self.row_count = row_count
+        self.fetch_row = fetch_row
+        self.selected_index = None
+        self.offset = max(0, min(self.offset, row_count - self.visible_rows))
+        self.render()
+    
+    def render(self):
+        """Fill the recycled rows from the current offset"""
+        slots = min(self.visible_rows, self.row_count - self.offset)
+        existing = len(self.tree.get_children())
+        
+        for slot in range(slots):
+            values, tags = self.fetch_row(self.offset + slot)
+            if slot < existing:
+                self.tree.item(str(slot), values=values, tags=tags)
+            else:
+                self.tree.insert("", "end", iid=str(slot), values=values, tags=tags)
+        
+        for slot in range(max(slots, 0), existing):
+            self.tree.delete(str(slot))
+        
+        selected = []
+        if self.selected_index is not None and 0 <= self.selected_index - self.offset < slots:
+            selected = [str(self.selected_index - self.offset)]
+        self.tree.selection_set(selected)
+        self.tree.yview_moveto(0)
+        
+        if self.row_count:
+            self.scrollbar.set(self.offset / self.row_count, (self.offset + slots) / self.row_count)
+        else:
+            self.scrollbar.set(0, 1)
+    
+    def scroll_to(self, offset):
+        offset = max(0, min(offset, self.row_count - self.visible_rows))
+        if offset != self.offset:
+            self.offset = offset
+            self.render()
+    
+    def scroll_by(self, amount, what="units", step=1):
+        if what == "pages":
+            step = max(1, self.visible_rows - 1)
+        self.scroll_to(self.offset + int(amount) * step)
+        return "break"
+    
+    def on_scrollbar(self, *args):
+        if args[0] == "moveto":
+            self.scroll_to(int(float(args[1]) * self.row_count))
+        elif args[0] == "scroll":
+            self.scroll_by(args[1], args[2])
+    
+    def on_arrow(self, direction):
+        """Move the selection, scrolling when it reaches the edge of the window"""
+        if self.selected_index is None:
+            return None
+        
+        index = self.selected_index + direction
+        if not 0 <= index < self.row_count:
+            return "break"
+        
+        self.selected_index = index
+        if index < self.offset:
+            self.scroll_to(index)
+        elif index >= self.offset + self.visible_rows:
+            self.scroll_to(index - self.visible_rows + 1)
+        else:
+            self.render()
+        return "break"
+    
+    def on_select(self, event=None):
+        selection = self.tree.selection()
+        if selection:
+            self.selected_index = self.offset + int(selection[0])
+    
+    def on_resize(self, event):
+        first = self.tree.bbox("0") if self.tree.exists("0") else None
+        if first:
+            heading_height, row_height = first[1], first[3]
+        else:
+            heading_height, row_height = 25, int(ttk.Style().lookup("Treeview", "rowheight") or 20)
+        visible_rows = max(1, (event.height - heading_height) // row_height)
+        if visible_rows != self.visible_rows:
+            self.visible_rows = visible_rows
+            self.offset = max(0, min(self.offset, self.row_count - visible_rows))
+            if self.fetch_row:
+                self.render()
+    
+    def get_selected_index(self):
+        """Index of the selected row in the full row set, None if nothing is selected"""
+        return self.selected_index
+
+class RecycledList:
+    """Scrollable list of widget rows that keeps a small pool of rows and rebinds them on scroll"""
+    def __init__(self, parent, create_row, bind_row, row_height=54, bg="white"):
+        self.create_row = create_row
+        self.bind_row = bind_row
+        self.row_height = row_height
+        self.pool = []
+        self.count = 0
+        self.offset = 0
+        self.visible_rows = 10
+        
+        self.scrollbar = ttk.Scrollbar(parent, command=self.on_scrollbar)
+        self.scrollbar.pack(side="right", fill="y")
+        self.frame = tk.Frame(parent, bg=bg)
+        self.frame.pack(side="left", fill="both", expand=True)
+        self.frame.columnconfigure(0, weight=1)
+        self.frame.grid_propagate(False)
+        self.frame.bind("<Configure>", self.on_resize)
+        self.bind_wheel(self.frame)
+    
+    def bind_wheel(self, widget):
+        widget.bind("<MouseWheel>", lambda e: self.scroll_by(-1 if e.delta > 0 else 1))
+        widget.bind("<Button-4>", lambda e: self.scroll_by(-1))
+        widget.bind("<Button-5>", lambda e: self.scroll_by(1))
+        for child in widget.winfo_children():
+            self.bind_wheel(child)
+    
+    def set_count(self, count):
+        self.count = count
+        self.offset = max(0, min(self.offset, count - self.visible_rows))
+        self.render()
+    
+    def render(self):
+        """Bind pooled rows to the model rows in view and hide the rest"""
+        slots = max(0, min(self.visible_rows, self.count - self.offset))
+        while len(self.pool) < slots:
+            row = self.create_row(self.frame)
+            row["frame"].grid(row=len(self.pool), column=0, sticky="ew", padx=5, pady=5)
+            self.bind_wheel(row["frame"])
+            self.pool.append(row)
+        
+        for slot, row in enumerate(self.pool):
+            if slot < slots:
+                self.bind_row(row, self.offset + slot)
+                row["frame"].grid()
+            else:
+                row["frame"].grid_remove()
+        
+        if self.count:
+            self.scrollbar.set(self.offset / self.count, (self.offset + slots) / self.count)
+        else:
+            self.scrollbar.set(0, 1)
+    
+    def scroll_to(self, offset):
+        offset = max(0, min(offset, self.count - self.visible_rows))
+        if offset != self.offset:
+            self.offset = offset
+            self.render()
+    
+    def scroll_by(self, amount, what="units"):
+        step = max(1, self.visible_rows - 1) if what == "pages" else 1
+        self.scroll_to(self.offset + int(amount) * step)
+        return "break"
+    
+    def on_scrollbar(self, *args):
+        if args[0] == "moveto":
+            self.scroll_to(int(float(args[1]) * self.count))
+        elif args[0] == "scroll":
+            self.scroll_by(args[1], args[2])
+    
+    def on_resize(self, event):
+        visible_rows = max(1, event.height // self.row_height)
+        if visible_rows != self.visible_rows:
+            self.visible_rows = visible_rows
+            self.offset = max(0, min(self.offset, self.count - visible_rows))
+            self.render()
+
+class KUBE(KubeEngine):
     def __init__(self, root):
         self.root = root
         self.root.title("KUBE - Kitchen Utensil Borrowing Engine")
@@ -76,44 +280,63 @@ class KUBE:
             "light": "#ecf0f1"
         }
         
-        # File paths
-        self.data_dir = "kube_data"
-        self.utensils_file = os.path.join(self.data_dir, "utensils.json")
-        self.borrowings_file = os.path.join(self.data_dir, "borrowings.json")
-        self.admin_file = os.path.join(self.data_dir, "admin.json")
-        self.trial_file = os.path.join(self.data_dir, "trial.json")
-        self.settings_file = os.path.join(self.data_dir, "settings.json")
-        self.borrowers_file = os.path.join(self.data_dir, "borrowers.json")
-        
-        if not os.path.exists(self.data_dir):
-            os.makedirs(self.data_dir)
+        KubeEngine.__init__(self)
+        self.root.protocol("WM_DELETE_WINDOW", self.on_close)
+        # Milliseconds from start to each startup milestone, printed when KUBE_STARTUP_TIMING is set
+        self.startup_times = {}
+        self.loader = None
         
         if not self.check_trial():
             self.show_trial_expired()
             return
         
-        self.load_data()
+        # Views register here to refresh when loans turn overdue at a day boundary,
+        # or when another KUBE instance sharing the data folder saved changes
+        self.overdue_listeners = []
+        self.data_listeners = []
+        # Set while save_in_background() has a change in flight
+        self.saving = False
+        
+        # The login screen goes up straight away while the collections load behind it
+        self.loaded = threading.Event()
+        self.load_error = None
+        self.loader = threading.Thread(target=self.load_in_background, name="kube-loader", daemon=True)
+        self.loader.start()
         self.show_login_screen()
+        self.root.after_idle(self.record_startup, "login screen")
+        self.when_loaded(self.start_background_tasks)
     
-    def check_trial(self):
-        """Check if trial period is still valid"""
-        if not os.path.exists(self.trial_file):
-            trial_data = {
-                "start_date": datetime.now().isoformat(),
-                "trial_days": 30
-            }
-            with open(self.trial_file, 'w') as f:
-                json.dump(trial_data, f)
-            return True
-        
-        with open(self.trial_file, 'r') as f:
-            trial_data = json.load(f)
-        
-        start_date = datetime.fromisoformat(trial_data["start_date"])
-        trial_days = trial_data["trial_days"]
-        expiry_date = start_date + timedelta(days=trial_days)
-        
-        return datetime.now() <= expiry_date
+    def load_in_background(self):
+        """Runs on the loader thread, the Tk thread picks the result up through when_loaded()"""
+        try:
+            self.load_data()
+        except Exception as e:
+            traceback.print_exc()
+            self.load_error = e
+        finally:
+            self.loaded.set()
+    
+    def when_loaded(self, callback):
+        """Run callback on the Tk thread once the data has finished loading"""
+        if self.loaded.is_set():
+            callback()
+        else:
+            self.root.after(20, self.when_loaded, callback)
+    
+    def start_background_tasks(self):
+        if self.load_error is not None:
+            messagebox.showerror("Error", f"Could not load the data folder:\n{self.load_error}")
+            self.root.destroy()
+            return
+        self.record_startup("data loaded")
+        self.schedule_overdue_sweep()
+        self.schedule_refresh()
+    
+    def record_startup(self, milestone):
+        """Note how long after start a milestone was reached"""
+        self.startup_times[milestone] = (time.perf_counter() - STARTED) * 1000
+        if os.environ.get("KUBE_STARTUP_TIMING"):
+            print(f"{milestone}: {self.startup_times[milestone]:.0f} ms", file=sys.stderr)
     
     def show_trial_expired(self):
         """Show trial expired message"""
@@ -124,163 +347,144 @@ class KUBE:
         tk.Label(frame, text="Your 30-day free trial has ended.\nPlease contact support to continue.", font=("Arial", 14), bg="#f0f0f0", fg="#555", justify="center").pack(pady=20)
         tk.Button(frame, text="Exit", command=self.root.destroy, font=("Arial", 12), bg="#e74c3c", fg="white", padx=30, pady=10, cursor="hand2").pack(pady=20)
     
-    def load_data(self):
-        """Load all data from JSON files"""
-        if os.path.exists(self.utensils_file):
-            with open(self.utensils_file, 'r') as f:
-                self.utensils = json.load(f)
-        else:
-            self.utensils = [
-                {"id": 1, "name": "Chef Knife", "quantity": 5, "available": 5, "category": "Cutlery"},
-                {"id": 2, "name": "Cutting Board", "quantity": 8, "available": 8, "category": "Preparation"},
-                {"id": 3, "name": "Mixing Bowl", "quantity": 10, "available": 10, "category": "Cookware"},
-                {"id": 4, "name": "Whisk", "quantity": 6, "available": 6, "category": "Utensils"},
-                {"id": 5, "name": "Spatula", "quantity": 7, "available": 7, "category": "Utensils"},
-            ]
-            self.save_utensils()
-        
-        self.borrowings = self._load_json(self.borrowings_file, [])
-        if not os.path.exists(self.borrowings_file):
-            self.save_borrowings()
-        
-        if os.path.exists(self.admin_file):
-            with open(self.admin_file, 'r') as f:
-                self.admin_data = json.load(f)
-        else:
-            self.admin_data = {
-                "username": "admin",
-                "password": self.hash_password("admin123")
-            }
-            self.save_admin()
+    def on_close(self):
+        """Flush pending writes before the window closes"""
+        if self.loader is not None:
+            self.loader.join()
+        self.close()
+        self.root.destroy()
+    
+    def show_save_failed(self, error):
+        """Report a change that could not be saved, the engine has already gone back to the data on disk"""
+        messagebox.showerror("Error", f"{error}. Nothing was changed, please try again.")
+    
+    def save_in_background(self, widget, task, done, failed=None):
+        """Run task(), a change that commits to disk, on a worker thread and hand its result to done() on the Tk thread
+        
+        A transaction holds the data folder lock while it commits and fsyncs,
+        which on a slow disk or a busy shared folder is long enough to freeze
+        the window. widget holds a grab until the change is done, so no other
+        screen reads the data halfway through it. A ValueError shows as an
+        error, an IOError as a failed save followed by failed().
+        """
+        if self.saving:
+            return
+        self.saving = True
+        widget.grab_set()
+        self.root.config(cursor="watch")
+        result = {}
+        
+        def worker():
+            try:
+                result["value"] = task()
+            except Exception as e:
+                if not isinstance(e, (ValueError, IOError)):
+                    traceback.print_exc()
+                result["error"] = e
         
-        self.settings = self._load_json(self.settings_file, {"max_borrow_limit": 5})
-        if not os.path.exists(self.settings_file):
-            self.save_settings()
+        thread = threading.Thread(target=worker, name="kube-save", daemon=True)
+        thread.start()
         
-        self.borrowers = self._load_json(self.borrowers_file, {})
-        if not os.path.exists(self.borrowers_file):
-            self.save_borrowers()
-    
-    def _load_json(self, filepath, default):
-        """Helper to load JSON with default fallback"""
-        if os.path.exists(filepath):
-            with open(filepath, 'r') as f:
-                return json.load(f)
-        return default
+        def poll():
+            if thread.is_alive():
+                self.root.after(20, poll)
+                return
+            self.saving = False
+            self.root.config(cursor="")
+            if widget.winfo_exists():
+                widget.grab_release()
+            error = result.get("error")
+            if isinstance(error, IOError):
+                self.show_save_failed(error)
+                if failed:
+                    failed()
+            elif error is not None:
+                messagebox.showerror("Error", str(error))
+            else:
+                done(result["value"])
+        
+        self.root.after(20, poll)
     
-    def _save_json(self, filepath, data):
-        """Helper to save JSON"""
-        with open(filepath, 'w') as f:
-            json.dump(data, f, indent=2)
+    def clear_window(self):
+        """Clear all widgets from window"""
+        for widget in self.root.winfo_children():
+            widget.destroy()
     
-    def hash_password(self, password):
-        """Hash password using SHA-256"""
-        return hashlib.sha256(password.encode()).hexdigest()
+    def schedule_overdue_sweep(self):
+        """Sweep overdue loans now, then check again in a minute
+        
+        Polling rather than one timer at midnight keeps up with a suspended
+        machine or a changed clock, and a sweep with no new day is a no-op.
+        """
+        # Listeners read the loans, leave them alone until an in-flight change is done
+        changed = () if self.saving else self.sweep_overdue()
+        if changed:
+            for listener in list(self.overdue_listeners):
+                listener(changed)
+        self.root.after(60000, self.schedule_overdue_sweep)
     
-    def save_utensils(self):
-        self._save_json(self.utensils_file, self.utensils)
+    def schedule_refresh(self):
+        """Reload what other KUBE instances saved to the data folder, checking every two seconds"""
+        if self.saving:
+            # The change in flight catches up with the other instances itself
+            self.root.after(2000, self.schedule_refresh)
+            return
+        if self.shared.changed():
+            changed = self.refresh()
+            if changed:
+                for listener in list(self.data_listeners):
+                    listener(changed)
+        errors = self.take_save_errors()
+        if errors:
+            # Everything was reloaded from disk, the screens hold stale records
+            for listener in list(self.data_listeners):
+                listener({"utensils", "borrowings", "borrowers"})
+            messagebox.showerror("Error", "\n".join(errors))
+        self.root.after(2000, self.schedule_refresh)
     
-    def save_borrowings(self):
-        self._save_json(self.borrowings_file, self.borrowings)
+    def watch_overdue(self, widget, callback):
+        """Call callback(changed_ids) after each sweep that flips loans, for as long as widget exists"""
+        self._watch(self.overdue_listeners, widget, callback)
     
-    def save_admin(self):
-        self._save_json(self.admin_file, self.admin_data)
+    def watch_data(self, widget, callback):
+        """Call callback(collections) after changes from another instance were reloaded, for as long as widget exists"""
+        self._watch(self.data_listeners, widget, callback)
     
-    def save_settings(self):
-        self._save_json(self.settings_file, self.settings)
+    def _watch(self, listeners, widget, callback):
+        def listener(changed):
+            if not widget.winfo_exists():
+                listeners.remove(listener)
+                return
+            callback(changed)
+        listeners.append(listener)
     
-    def save_borrowers(self):
-        self._save_json(self.borrowers_file, self.borrowers)
+    def clear_main_content(self):
+        """Hide the cached screens and destroy everything else in the main area"""
+        cached = [screen["frame"] for screen in self.screens.values()]
+        for widget in self.main_content.winfo_children():
+            if widget in cached:
+                widget.pack_forget()
+            else:
+                widget.destroy()
     
-    def clear_window(self):
-        """Clear all widgets from window"""
-        for widget in self.root.winfo_children():
-            widget.destroy()
+    def show_cached_screen(self, name, build):
+        """Show a screen build(frame) creates on the first visit, later visits only call the refresh() it returned"""
+        self.clear_main_content()
+        screen = self.screens.get(name)
+        if screen is None:
+            frame = tk.Frame(self.main_content, bg=self.colors["bg"])
+            screen = self.screens[name] = {"frame": frame, "refresh": build(frame)}
+        screen["frame"].pack(expand=True, fill="both")
+        screen["refresh"]()
     
-    def is_overdue(self, borrowing):
-        """Check if a borrowing is overdue"""
-        if borrowing.get("returned", False):
-            return False
-        
-        due_date_str = borrowing.get("due_date")
-        if not due_date_str:
-            return False
-        
-        due_date = datetime.strptime(due_date_str, "%Y-%m-%d")
-        return datetime.now() > due_date
-    
-    def days_overdue(self, borrowing):
-        """Calculate how many days overdue a borrowing is"""
-        if not self.is_overdue(borrowing):
-            return 0
-        
-        due_date = datetime.strptime(borrowing["due_date"], "%Y-%m-%d")
-        return (datetime.now() - due_date).days
-    
-    def calculate_credit_score(self, borrower_name):
-        """Calculate credit score for a borrower (0-100, starting at 100)"""
-        borrower_key = borrower_name.lower().strip()
-        
-        if borrower_key not in self.borrowers:
-            return 100
-        
-        borrower_data = self.borrowers[borrower_key]
-        return borrower_data.get("credit_score", 100)
-    
-    def update_credit_score(self, borrower_name, borrowing):
-        """Update credit score based on borrowing behavior with detailed point system"""
-        borrower_key = borrower_name.lower().strip()
-        
-        if borrower_key not in self.borrowers:
-            self.borrowers[borrower_key] = {
-                "name": borrower_name,
-                "credit_score": 100,
-                "total_borrowings": 0,
-                "on_time_returns": 0,
-                "late_returns": 0,
-                "damaged_items": 0,
-                "contact_info": borrowing.get("contact_info", {})
-            }
-        
-        borrower_data = self.borrowers[borrower_key]
-        borrower_data["total_borrowings"] += 1
-        
-        if borrowing.get("returned"):
-            if self.is_overdue(borrowing):
-                borrower_data["late_returns"] += 1
-                days_late = self.days_overdue(borrowing)
-                
-                # Scale penalty: -10 for 1 day, up to -25 for 7+ days
-                if days_late == 1:
-                    penalty = -10
-                elif days_late <= 3:
-                    penalty = -15
-                elif days_late <= 7:
-                    penalty = -20
-                else:
-                    penalty = -25
-                
-                borrower_data["credit_score"] = max(0, borrower_data["credit_score"] + penalty)
-            else:
-                borrower_data["on_time_returns"] += 1
-                # +5 points for on-time return
-                borrower_data["credit_score"] = min(100, borrower_data["credit_score"] + 5)
-            
-            # Check for damaged/lost items
-            condition = borrowing.get("return_condition", "Good")
-            if condition in ["Damaged", "Lost"]:
-                borrower_data["damaged_items"] += 1
-                # -50 points for damaged/lost items
-                borrower_data["credit_score"] = max(0, borrower_data["credit_score"] - 50)
-            elif condition == "Excellent":
-                # +2 bonus for excellent condition
-                borrower_data["credit_score"] = min(100, borrower_data["credit_score"] + 2)
-            
-            # Check for perfect history milestone bonus (+25 points at 10 loans)
-            if borrower_data["total_borrowings"] == 10 and borrower_data["late_returns"] == 0 and borrower_data["damaged_items"] == 0:
-                borrower_data["credit_score"] = min(100, borrower_data["credit_score"] + 25)
-        
-        self.save_borrowers()
+    def sync_view(self, view, collection, rebuild, update):
+        """Bring a cached view up to date: update(keys) with the keys changed since its last sync, or rebuild()"""
+        keys = None if view.get("version") is None else self.changes.since(view["version"], collection)
+        view["version"] = self.changes.version
+        if keys is None:
+            rebuild()
+        elif keys:
+            update(keys)
     
     def get_credit_score_color(self, score):
         """Get color based on credit score"""
@@ -300,15 +504,6 @@ class KUBE:
         else:
             return "Poor"
     
-    def get_active_borrowings_count(self, borrower_name):
-        """Count active borrowings for a borrower"""
-        borrower_key = borrower_name.lower().strip()
-        count = 0
-        for b in self.borrowings:
-            if b["borrower_name"].lower().strip() == borrower_key and not b.get("returned", False):
-                count += b["quantity"]
-        return count
-    
     def create_dialog(self, title, width=450, height=350):
         """Helper to create a standard dialog"""
         dialog = tk.Toplevel(self.root)
@@ -330,6 +525,7 @@ class KUBE:
     def show_login_screen(self):
         """Display admin login screen"""
         self.clear_window()
+        self.root.unbind("<Control-Shift-P>")
         
         container = tk.Frame(self.root, bg=self.colors["bg"])
         container.pack(expand=True, fill="both")
@@ -355,20 +551,25 @@ class KUBE:
         self.password_entry.grid(row=2, column=1, padx=20, pady=15)
         self.password_entry.bind('<Return>', lambda e: self.admin_login())
         
-        tk.Button(form_frame, text="Login", command=self.admin_login, font=("Arial", 12, "bold"), 
+        self.login_button = tk.Button(form_frame, text="Login", command=self.admin_login, font=("Arial", 12, "bold"), 
                  bg=self.colors["danger"], fg=self.colors["white"], padx=40, pady=12, 
-                 cursor="hand2", relief="flat", bd=0).grid(row=3, column=0, columnspan=2, pady=30)
-        
-        with open(self.trial_file, 'r') as f:
-            trial_data = json.load(f)
-        start_date = datetime.fromisoformat(trial_data["start_date"])
-        days_left = 30 - (datetime.now() - start_date).days
+                 cursor="hand2", relief="flat", bd=0)
+        self.login_button.grid(row=3, column=0, columnspan=2, pady=30)
         
-        tk.Label(center_frame, text=f"⏰ Trial: {max(0, days_left)} days remaining", 
+        tk.Label(center_frame, text=f"⏰ Trial: {self.trial_days_left()} days remaining", 
                 font=("Arial", 10), bg=self.colors["bg"], fg=self.colors["warning"]).pack(pady=20)
     
     def admin_login(self):
         """Handle admin login"""
+        if not self.loaded.is_set():
+            # Log in as soon as the data is there
+            self.login_button.config(text="Loading...", state="disabled")
+            self.when_loaded(self.admin_login)
+            return
+        if self.load_error is not None:
+            return
+        self.login_button.config(text="Login", state="normal")
+        
         username = self.username_entry.get().strip()
         password = self.password_entry.get()
         
@@ -408,6 +609,8 @@ class KUBE:
         
         self.main_content = tk.Frame(content_area, bg=self.colors["bg"])
         self.main_content.pack(side="right", expand=True, fill="both")
+        # Screens kept between visits by show_cached_screen(), keyed by name
+        self.screens = {}
         
         sidebar_buttons = [
             ("📊 Dashboard", lambda: self.show_dashboard_content(), self.colors["primary"]),
@@ -417,6 +620,7 @@ class KUBE:
             ("👥 Borrowers", lambda: self.show_borrowers_content(), self.colors["secondary"]),
             ("📜 Transaction Log", lambda: self.show_transaction_log_content(), self.colors["secondary"]),
             ("🔍 Search Borrowings", lambda: self.show_search_content(), self.colors["secondary"]),
+            ("📈 Reports", lambda: self.show_reports_content(), self.colors["info"]),
             ("⚙️ Manage Equipment", lambda: self.show_equipment_content(), self.colors["dark"]),
             ("⚙️ System Settings", lambda: self.show_settings_content(), self.colors["dark"]),
             ("ℹ️ About KUBE", lambda: self.show_about_content(), "#1abc9c"),
@@ -428,12 +632,14 @@ class KUBE:
                            relief="flat", bd=0, anchor="w", justify="left")
             btn.pack(fill="x", padx=10, pady=5)
         
+        # Not on the sidebar: only whoever is chasing a slow screen needs it
+        self.root.bind("<Control-Shift-P>", self.show_performance_panel)
+        
         self.show_dashboard_content()
     
     def show_dashboard_content(self):
         """Dashboard content in main area"""
-        for widget in self.main_content.winfo_children():
-            widget.destroy()
+        self.clear_main_content()
         
         title_frame = tk.Frame(self.main_content, bg=self.colors["bg"])
         title_frame.pack(fill="x", padx=30, pady=20)
@@ -444,16 +650,10 @@ class KUBE:
         stats_frame = tk.Frame(self.main_content, bg=self.colors["bg"])
         stats_frame.pack(fill="x", padx=30, pady=10)
         
-        total_utensils = sum(u["quantity"] for u in self.utensils)
-        available_utensils = sum(u["available"] for u in self.utensils)
-        borrowed_utensils = total_utensils - available_utensils
-        
-        active_borrowings = [b for b in self.borrowings if not b.get("returned", False)]
-        overdue_borrowings = [b for b in active_borrowings if self.is_overdue(b)]
-        
+        dashboard_stats = self.get_dashboard_stats()
         stats = [
-            ("Utensils Out", borrowed_utensils, self.colors["warning"]),
-            ("Overdue Items", len(overdue_borrowings), self.colors["danger"]),
+            ("Utensils Out", dashboard_stats["borrowed"], self.colors["warning"]),
+            ("Overdue Items", dashboard_stats["overdue"], self.colors["danger"]),
         ]
         
         for label, value, color in stats:
@@ -463,6 +663,9 @@ class KUBE:
             tk.Label(card, text=str(value), font=("Arial", 48, "bold"), bg=self.colors["white"], fg=color).pack(pady=(20, 5))
             tk.Label(card, text=label, font=("Arial", 12), bg=self.colors["white"], fg="#7f8c8d").pack(pady=(0, 20))
         
+        self.watch_overdue(stats_frame, lambda changed: self.show_dashboard_content())
+        self.watch_data(stats_frame, lambda changed: self.show_dashboard_content())
+        
         activity_frame = tk.LabelFrame(self.main_content, text="Recent Activity", font=("Arial", 13, "bold"), 
                                       bg=self.colors["white"], relief="flat", bd=0)
         activity_frame.pack(fill="both", expand=True, padx=30, pady=10)
@@ -485,7 +688,7 @@ class KUBE:
         tree.column("Action", width=150)
         tree.column("Date", width=200)
         
-        for borrowing in sorted(self.borrowings, key=lambda x: x.get("borrow_date", ""), reverse=True)[:10]:
+        for borrowing in self.get_recent_activity():
             action = "Returned" if borrowing.get("returned") else "Borrowed"
             date = borrowing.get("return_date") if borrowing.get("returned") else borrowing.get("borrow_date")
             tree.insert("", "end", values=(borrowing["borrower_name"], borrowing["utensil_name"], action, date))
@@ -494,16 +697,16 @@ class KUBE:
     
     def show_inventory_content(self):
         """Inventory content"""
-        for widget in self.main_content.winfo_children():
-            widget.destroy()
-        
-        title_frame = tk.Frame(self.main_content, bg=self.colors["bg"])
+        self.show_cached_screen("inventory", self.build_inventory_screen)
+    
+    def build_inventory_screen(self, screen):
+        title_frame = tk.Frame(screen, bg=self.colors["bg"])
         title_frame.pack(fill="x", padx=30, pady=20)
         
         tk.Label(title_frame, text="Utensil Inventory", font=("Arial", 24, "bold"), 
                 bg=self.colors["bg"], fg=self.colors["dark"]).pack(anchor="w")
         
-        tree_frame = tk.Frame(self.main_content, bg=self.colors["white"])
+        tree_frame = tk.Frame(screen, bg=self.colors["white"])
         tree_frame.pack(fill="both", expand=True, padx=30, pady=10)
         
         scrollbar = ttk.Scrollbar(tree_frame)
@@ -523,17 +726,41 @@ class KUBE:
         tree.column("Available", width=100)
         tree.column("Borrowed", width=100)
         
-        for utensil in self.utensils:
+        def row_values(utensil):
             borrowed = utensil["quantity"] - utensil["available"]
-            tree.insert("", "end", values=(utensil["id"], utensil["name"], utensil.get("category", "Uncategorized"), 
-                                          utensil["quantity"], utensil["available"], borrowed))
+            return (utensil["id"], utensil["name"], utensil.get("category", "Uncategorized"), 
+                    utensil["quantity"], utensil["available"], borrowed)
+        
+        def rebuild():
+            tree.delete(*tree.get_children())
+            for utensil in self.utensils:
+                tree.insert("", "end", iid=str(utensil["id"]), values=row_values(utensil))
+        
+        def update(utensil_ids):
+            for utensil_id in utensil_ids:
+                utensil = self.utensils_by_id.get(utensil_id)
+                iid = str(utensil_id)
+                if utensil is None:
+                    if tree.exists(iid):
+                        tree.delete(iid)
+                elif tree.exists(iid):
+                    tree.item(iid, values=row_values(utensil))
+                else:
+                    # New utensils go to the end of the list, as in self.utensils
+                    tree.insert("", "end", iid=iid, values=row_values(utensil))
+        
+        view = {}
+        
+        def refresh():
+            self.sync_view(view, "utensils", rebuild, update)
         
         tree.pack(expand=True, fill="both")
+        self.watch_data(tree, lambda changed: refresh())
+        return refresh
     
     def show_borrow_content(self):
         """Borrow utensils content"""
-        for widget in self.main_content.winfo_children():
-            widget.destroy()
+        self.clear_main_content()
         
         title_frame = tk.Frame(self.main_content, bg=self.colors["bg"])
         title_frame.pack(fill="x", padx=30, pady=20)
@@ -605,60 +832,28 @@ class KUBE:
         button_frame.pack(pady=20)
         
         def process_borrow():
-            borrower_name = borrower_entry.get().strip()
-            if not borrower_name:
-                messagebox.showerror("Error", "Please enter borrower name")
-                return
-            
-            selected_utensils = [uid for uid, var in selected_items.items() if var.get()]
-            if not selected_utensils:
-                messagebox.showerror("Error", "Please select at least one item")
-                return
-            
-            active_count = self.get_active_borrowings_count(borrower_name)
-            total_qty = sum(qty_vars[uid].get() for uid in selected_utensils)
-            
-            if active_count + total_qty > self.settings["max_borrow_limit"]:
-                messagebox.showerror("Error", f"Borrow limit exceeded. Current: {active_count}, Limit: {self.settings['max_borrow_limit']}")
+            try:
+                quantities = {uid: qty_vars[uid].get() for uid, var in selected_items.items() if var.get()}
+            except tk.TclError:
+                messagebox.showerror("Error", "Please enter valid quantities")
                 return
             
             due_date = (datetime.now() + timedelta(days=due_days_var.get())).strftime("%Y-%m-%d")
+            contact_info = {"phone": phone_entry.get(), "email": email_entry.get()}
+            borrower_name = borrower_entry.get()
             
-            for uid in selected_utensils:
-                utensil = next(u for u in self.utensils if u["id"] == uid)
-                qty = qty_vars[uid].get()
-                
-                if qty > utensil["available"]:
-                    messagebox.showerror("Error", f"Not enough {utensil['name']} available")
-                    return
-                
-                borrowing = {
-                    "id": len(self.borrowings) + 1,
-                    "borrower_name": borrower_name,
-                    "utensil_name": utensil["name"],
-                    "utensil_id": utensil["id"],
-                    "quantity": qty,
-                    "borrow_date": datetime.now().strftime("%Y-%m-%d"),
-                    "due_date": due_date,
-                    "returned": False,
-                    "contact_info": {"phone": phone_entry.get(), "email": email_entry.get()}
-                }
-                
-                self.borrowings.append(borrowing)
-                utensil["available"] -= qty
-                self.update_credit_score(borrower_name, borrowing)
+            def done(_):
+                messagebox.showinfo("Success", f"Borrowed {len(quantities)} item(s) successfully!")
+                self.show_borrow_content()
             
-            self.save_borrowings()
-            self.save_utensils()
-            messagebox.showinfo("Success", f"Borrowed {len(selected_utensils)} item(s) successfully!")
-            self.show_borrow_content()
+            self.save_in_background(self.main_content, lambda: self.borrow_items(borrower_name, quantities, due_date, contact_info),
+                                    done, failed=self.show_borrow_content)
         
         self.create_button(button_frame, "🛒 Process Borrowing", process_borrow, self.colors["success"])
     
     def show_return_content(self):
         """Return utensils content"""
-        for widget in self.main_content.winfo_children():
-            widget.destroy()
+        self.clear_main_content()
         
         title_frame = tk.Frame(self.main_content, bg=self.colors["bg"])
         title_frame.pack(fill="x", padx=30, pady=20)
@@ -673,123 +868,103 @@ class KUBE:
         tree_frame = tk.Frame(items_frame, bg=self.colors["white"])
         tree_frame.pack(expand=True, fill="both", padx=15, pady=15)
         
-        canvas = tk.Canvas(tree_frame, bg=self.colors["white"], highlightthickness=0)
-        canvas.pack(side="left", fill="both", expand=True)
-        
-        scrollbar = ttk.Scrollbar(tree_frame, command=canvas.yview)
-        scrollbar.pack(side="right", fill="y")
-        canvas.config(yscrollcommand=scrollbar.set)
-        
-        scrollable_frame = tk.Frame(canvas, bg=self.colors["white"])
-        canvas.create_window((0, 0), window=scrollable_frame, anchor="nw")
-        
-        borrowing_data = {}
-        selected_items = {}
-        return_qty_vars = {}
-        condition_vars = {}
-        notes_vars = {}
-        
-        active_borrowings = [b for b in self.borrowings if not b.get("returned", False)]
-        
-        for borrowing in active_borrowings:
-            status = "OVERDUE" if self.is_overdue(borrowing) else "Active"
-            bg_color = "#ffcccc" if status == "OVERDUE" else "#fff3cd"
+        # Selection and return details live in a plain model, widgets only exist for visible rows
+        active_borrowings = self.get_active_borrowings()
+        return_model = [{"borrowing": borrowing, "selected": False, "quantity": borrowing["quantity"], 
+                         "condition": "Good", "notes": ""} for borrowing in active_borrowings]
+        
+        def create_row(parent):
+            row = {"index": None}
+            row["frame"] = tk.Frame(parent, relief="raised", bd=1)
+            row["selected"] = tk.BooleanVar()
+            row["quantity"] = tk.IntVar()
+            row["condition"] = tk.StringVar()
+            row["notes"] = tk.StringVar()
             
-            item_frame = tk.Frame(scrollable_frame, bg=bg_color, relief="raised", bd=1)
-            item_frame.pack(fill="x", padx=5, pady=5)
+            row["check"] = tk.Checkbutton(row["frame"], variable=row["selected"])
+            row["check"].pack(side="left", padx=10, pady=10)
+            row["info"] = tk.Label(row["frame"], font=("Arial", 11, "bold"), width=35, anchor="w")
+            row["info"].pack(side="left", padx=10, pady=10)
+            row["borrowed"] = tk.Label(row["frame"], font=("Arial", 10), width=15, anchor="w")
+            row["borrowed"].pack(side="left", padx=5, pady=10)
             
-            var = tk.BooleanVar()
-            selected_items[borrowing["id"]] = var
+            row["return_label"] = tk.Label(row["frame"], text="Return:", font=("Arial", 10))
+            row["return_label"].pack(side="left", padx=5, pady=10)
+            row["spinbox"] = tk.Spinbox(row["frame"], from_=1, to=1, textvariable=row["quantity"], font=("Arial", 10), width=5)
+            row["spinbox"].pack(side="left", padx=5, pady=10)
             
-            tk.Checkbutton(item_frame, variable=var, bg=bg_color, activebackground=bg_color).pack(side="left", padx=10, pady=10)
+            row["condition_label"] = tk.Label(row["frame"], text="Condition:", font=("Arial", 10))
+            row["condition_label"].pack(side="left", padx=5, pady=10)
+            ttk.Combobox(row["frame"], textvariable=row["condition"], values=list(CONDITIONS), 
+                        font=("Arial", 10), width=12, state="readonly").pack(side="left", padx=5, pady=10)
             
-            info_text = f"{borrowing['borrower_name']} - {borrowing['utensil_name']}"
-            tk.Label(item_frame, text=info_text, font=("Arial", 11, "bold"), bg=bg_color, width=35, anchor="w").pack(side="left", padx=10, pady=10)
-            tk.Label(item_frame, text=f"Borrowed: {borrowing['quantity']}", font=("Arial", 10), bg=bg_color, width=15, anchor="w").pack(side="left", padx=5, pady=10)
+            row["notes_label"] = tk.Label(row["frame"], text="Notes:", font=("Arial", 10))
+            row["notes_label"].pack(side="left", padx=5, pady=10)
+            tk.Entry(row["frame"], textvariable=row["notes"], font=("Arial", 10), width=20).pack(side="left", padx=5, pady=10)
             
-            tk.Label(item_frame, text="Return:", font=("Arial", 10), bg=bg_color).pack(side="left", padx=5, pady=10)
-            qty_var = tk.IntVar(value=borrowing["quantity"])
-            return_qty_vars[borrowing["id"]] = qty_var
-            tk.Spinbox(item_frame, from_=1, to=borrowing["quantity"], textvariable=qty_var, font=("Arial", 10), width=5).pack(side="left", padx=5, pady=10)
+            def write_back(field):
+                if row["index"] is None:
+                    return
+                try:
+                    return_model[row["index"]][field] = row[field].get()
+                except tk.TclError:
+                    pass  # Spinbox is mid-edit and not a valid number yet
             
-            tk.Label(item_frame, text="Condition:", font=("Arial", 10), bg=bg_color).pack(side="left", padx=5, pady=10)
-            cond_var = tk.StringVar(value="Good")
-            condition_vars[borrowing["id"]] = cond_var
-            ttk.Combobox(item_frame, textvariable=cond_var, values=["Excellent", "Good", "Fair", "Damaged", "Lost"], 
-                        font=("Arial", 10), width=12, state="readonly").pack(side="left", padx=5, pady=10)
+            for field in ("selected", "quantity", "condition", "notes"):
+                row[field].trace_add("write", lambda *args, field=field: write_back(field))
+            return row
+        
+        def bind_row(row, index):
+            entry = return_model[index]
+            borrowing = entry["borrowing"]
+            bg_color = "#ffcccc" if self.is_overdue(borrowing) else "#fff3cd"
             
-            tk.Label(item_frame, text="Notes:", font=("Arial", 10), bg=bg_color).pack(side="left", padx=5, pady=10)
-            notes_var = tk.StringVar()
-            notes_vars[borrowing["id"]] = notes_var
-            tk.Entry(item_frame, textvariable=notes_var, font=("Arial", 10), width=20).pack(side="left", padx=5, pady=10)
+            row["index"] = None
+            row["spinbox"].config(to=borrowing["quantity"])
+            for field in ("selected", "quantity", "condition", "notes"):
+                row[field].set(entry[field])
+            row["index"] = index
             
-            borrowing_data[borrowing["id"]] = borrowing
-        
-        scrollable_frame.update_idletasks()
-        canvas.config(scrollregion=canvas.bbox("all"))
+            row["info"].config(text=f"{borrowing['borrower_name']} - {borrowing['utensil_name']}")
+            row["borrowed"].config(text=f"Borrowed: {borrowing['quantity']}")
+            for name in ("frame", "info", "borrowed", "return_label", "condition_label", "notes_label"):
+                row[name].config(bg=bg_color)
+            row["check"].config(bg=bg_color, activebackground=bg_color)
+        
+        return_list = RecycledList(tree_frame, create_row, bind_row, bg=self.colors["white"])
+        return_list.set_count(len(return_model))
+        self.watch_overdue(tree_frame, lambda changed: return_list.render())
+        # Loans returned elsewhere show as returned and are refused if picked
+        self.watch_data(tree_frame, lambda changed: return_list.render())
         
         button_frame = tk.Frame(self.main_content, bg=self.colors["bg"])
         button_frame.pack(pady=20)
         
         def process_return():
-            selected_borrowing_ids = [bid for bid, var in selected_items.items() if var.get()]
-            if not selected_borrowing_ids:
-                messagebox.showerror("Error", "Please select at least one item to return")
-                return
+            returns = [(entry["borrowing"], entry["quantity"], entry["condition"], entry["notes"]) 
+                       for entry in return_model if entry["selected"]]
             
-            for bid in selected_borrowing_ids:
-                borrowing = borrowing_data[bid]
-                return_qty = return_qty_vars[bid].get()
-                borrowed_qty = borrowing["quantity"]
-                
-                if return_qty < borrowed_qty:
-                    remaining_qty = borrowed_qty - return_qty
-                    new_borrowing = {
-                        "id": len(self.borrowings) + 1,
-                        "borrower_name": borrowing["borrower_name"],
-                        "utensil_name": borrowing["utensil_name"],
-                        "utensil_id": borrowing["utensil_id"],
-                        "quantity": remaining_qty,
-                        "borrow_date": borrowing["borrow_date"],
-                        "due_date": borrowing["due_date"],
-                        "returned": False,
-                        "contact_info": borrowing.get("contact_info", {})
-                    }
-                    self.borrowings.append(new_borrowing)
-                
-                borrowing["returned"] = True
-                borrowing["return_date"] = datetime.now().strftime("%Y-%m-%d")
-                borrowing["return_condition"] = condition_vars[bid].get()
-                borrowing["return_notes"] = notes_vars[bid].get()
-                borrowing["return_quantity"] = return_qty
-                borrowing["quantity"] = return_qty
-                
-                for utensil in self.utensils:
-                    if utensil["id"] == borrowing["utensil_id"]:
-                        utensil["available"] += return_qty
-                        break
-                
-                self.update_credit_score(borrowing["borrower_name"], borrowing)
+            def done(_):
+                messagebox.showinfo("Success", f"Returned {len(returns)} item(s) successfully!")
+                self.show_return_content()
             
-            self.save_borrowings()
-            self.save_utensils()
-            messagebox.showinfo("Success", f"Returned {len(selected_borrowing_ids)} item(s) successfully!")
-            self.show_return_content()
+            # After a failed save the listed loans were reloaded from disk, list them again
+            self.save_in_background(self.main_content, lambda: self.return_items(returns), done, failed=self.show_return_content)
         
         self.create_button(button_frame, "✓ Return Selected Items", process_return, self.colors["warning"])
     
     def show_borrowers_content(self):
         """Borrowers content"""
-        for widget in self.main_content.winfo_children():
-            widget.destroy()
-        
-        title_frame = tk.Frame(self.main_content, bg=self.colors["bg"])
+        self.show_cached_screen("borrowers", self.build_borrowers_screen)
+    
+    def build_borrowers_screen(self, screen):
+        title_frame = tk.Frame(screen, bg=self.colors["bg"])
         title_frame.pack(fill="x", padx=30, pady=20)
         
         tk.Label(title_frame, text="Borrower History", font=("Arial", 24, "bold"), 
                 bg=self.colors["bg"], fg=self.colors["dark"]).pack(anchor="w")
         
-        tree_frame = tk.Frame(self.main_content, bg=self.colors["white"])
+        tree_frame = tk.Frame(screen, bg=self.colors["white"])
         tree_frame.pack(fill="both", expand=True, padx=30, pady=10)
         
         scrollbar = ttk.Scrollbar(tree_frame)
@@ -808,16 +983,40 @@ class KUBE:
         tree.column("Total Borrowings", width=150)
         tree.column("Late Returns", width=150)
         
-        borrower_names = list(set(b["borrower_name"] for b in self.borrowings))
-        for name in sorted(borrower_names):
+        # Rows are keyed by the name as typed, kept sorted to place new names
+        names = []
+        
+        def row_values(name):
             score = self.calculate_credit_score(name)
             active = self.get_active_borrowings_count(name)
-            borrower_key = name.lower().strip()
+            borrower_key = self.get_borrower_key(name)
             borrower_data = self.borrowers.get(borrower_key, {})
-            
-            tree.insert("", "end", values=(name, f"{score}/100", active, borrower_data.get("total_borrowings", 0), borrower_data.get("late_returns", 0)))
+            return (name, f"{score}/100", active, borrower_data.get("total_borrowings", 0), borrower_data.get("late_returns", 0))
         
-        button_frame = tk.Frame(self.main_content, bg=self.colors["bg"])
+        def rebuild():
+            tree.delete(*tree.get_children())
+            names[:] = self.borrower_view.names()
+            for name in names:
+                tree.insert("", "end", iid=name, values=row_values(name))
+        
+        def update(borrower_keys):
+            for borrower_key in borrower_keys:
+                for name in self.borrower_view.names_of(borrower_key):
+                    if tree.exists(name):
+                        tree.item(name, values=row_values(name))
+                    else:
+                        index = bisect.bisect_left(names, name)
+                        names.insert(index, name)
+                        tree.insert("", index, iid=name, values=row_values(name))
+        
+        view = {}
+        
+        def refresh():
+            self.sync_view(view, "borrowers", rebuild, update)
+        
+        self.watch_data(tree, lambda changed: refresh())
+        
+        button_frame = tk.Frame(screen, bg=self.colors["bg"])
         button_frame.pack(pady=20)
         
         def view_details():
@@ -825,35 +1024,31 @@ class KUBE:
             if not selected:
                 messagebox.showerror("Error", "Please select a borrower")
                 return
-            
-            item = tree.item(selected[0])
-            borrower_name = item["values"][0]
-            self.show_borrower_detail(borrower_name)
+        
+            self.show_borrower_detail(selected[0])
         
         self.create_button(button_frame, "👁️ View Details", view_details, self.colors["info"])
         
         tree.pack(expand=True, fill="both")
+        return refresh
     
     def show_transaction_log_content(self):
         """Transaction log content"""
-        for widget in self.main_content.winfo_children():
-            widget.destroy()
-        
-        title_frame = tk.Frame(self.main_content, bg=self.colors["bg"])
+        self.show_cached_screen("transaction_log", self.build_transaction_log_screen)
+    
+    def build_transaction_log_screen(self, screen):
+        title_frame = tk.Frame(screen, bg=self.colors["bg"])
         title_frame.pack(fill="x", padx=30, pady=20)
         
         tk.Label(title_frame, text="Transaction Log", font=("Arial", 24, "bold"), 
                 bg=self.colors["bg"], fg=self.colors["dark"]).pack(anchor="w")
         
-        tree_frame = tk.Frame(self.main_content, bg=self.colors["white"])
+        tree_frame = tk.Frame(screen, bg=self.colors["white"])
         tree_frame.pack(fill="both", expand=True, padx=30, pady=10)
         
-        scrollbar = ttk.Scrollbar(tree_frame)
-        scrollbar.pack(side="right", fill="y")
-        
         columns = ("ID", "Borrower", "Utensil", "Qty", "Borrow Date", "Due Date", "Return Date", "Status")
-        tree = ttk.Treeview(tree_frame, columns=columns, show="headings", yscrollcommand=scrollbar.set)
-        scrollbar.config(command=tree.yview)
+        view = VirtualTreeview(tree_frame, columns)
+        tree = view.tree
         
         for col in columns:
             tree.heading(col, text=col)
@@ -867,63 +1062,39 @@ class KUBE:
         tree.column("Return Date", width=130)
         tree.column("Status", width=100)
         
-        for borrowing in sorted(self.borrowings, key=lambda x: x.get("borrow_date", ""), reverse=True):
-            status = "Returned" if borrowing.get("returned") else ("Overdue" if self.is_overdue(borrowing) else "Active")
-            tree.insert("", "end", values=(borrowing["id"], borrowing["borrower_name"], borrowing["utensil_name"], 
-                                          borrowing["quantity"], borrowing["borrow_date"], borrowing.get("due_date", "N/A"), 
-                                          borrowing.get("return_date", "N/A"), status), tags=(status,))
+        def fetch_row(index):
+            # Archived loans are merged in by date, read a month at a time as they scroll into view
+            borrowing = self.transaction_log_at(index)
+            status = self.get_borrowing_status(borrowing)
+            return (borrowing["id"], borrowing["borrower_name"], borrowing["utensil_name"], 
+                    borrowing["quantity"], borrowing["borrow_date"], borrowing.get("due_date", "N/A"), 
+                    borrowing.get("return_date", "N/A"), status), (status,)
         
         tree.tag_configure("Overdue", background="#ffcccc")
         tree.tag_configure("Active", background="#fff3cd")
         tree.tag_configure("Returned", background="#d4edda")
         
-        tree.pack(expand=True, fill="both")
+        def refresh():
+            # The engine keeps the order up to date, only the rows in view are redrawn
+            count = self.transaction_log_count()
+            if count != view.row_count or view.fetch_row is None:
+                view.set_rows(count, fetch_row)
+            else:
+                view.render()
         
-        button_frame = tk.Frame(self.main_content, bg=self.colors["bg"])
-        button_frame.pack(pady=20)
+        view.pack(expand=True, fill="both")
+        self.watch_overdue(tree, lambda changed: view.render())
+        self.watch_data(tree, lambda changed: refresh())
         
-        def export_to_csv():
-            """Export transaction log to CSV file"""
-            file_path = filedialog.asksaveasfilename(
-                defaultextension=".csv",
-                filetypes=[("CSV files", "*.csv"), ("All files", "*.*")],
-                initialfile=f"transaction_log_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv"
-            )
-            
-            if not file_path:
-                return
-            
-            try:
-                with open(file_path, 'w', newline='') as csvfile:
-                    fieldnames = ["ID", "Borrower", "Utensil", "Quantity", "Borrow Date", "Due Date", "Return Date", "Status", "Condition", "Notes"]
-                    writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
-                    
-                    writer.writeheader()
-                    for borrowing in sorted(self.borrowings, key=lambda x: x.get("borrow_date", ""), reverse=True):
-                        status = "Returned" if borrowing.get("returned") else ("Overdue" if self.is_overdue(borrowing) else "Active")
-                        writer.writerow({
-                            "ID": borrowing["id"],
-                            "Borrower": borrowing["borrower_name"],
-                            "Utensil": borrowing["utensil_name"],
-                            "Quantity": borrowing["quantity"],
-                            "Borrow Date": borrowing["borrow_date"],
-                            "Due Date": borrowing.get("due_date", "N/A"),
-                            "Return Date": borrowing.get("return_date", "N/A"),
-                            "Status": status,
-                            "Condition": borrowing.get("return_condition", "N/A"),
-                            "Notes": borrowing.get("return_notes", "")
-                        })
-                
-                messagebox.showinfo("Success", f"Transaction log exported successfully to:\n{file_path}")
-            except Exception as e:
-                messagebox.showerror("Error", f"Failed to export: {str(e)}")
+        button_frame = tk.Frame(screen, bg=self.colors["bg"])
+        button_frame.pack(pady=20)
         
-        self.create_button(button_frame, "📥 Export to CSV", export_to_csv, self.colors["info"])
+        self.create_button(button_frame, "📥 Export to CSV", self.show_export_dialog, self.colors["info"])
+        return refresh
     
     def show_search_content(self):
         """Search content"""
-        for widget in self.main_content.winfo_children():
-            widget.destroy()
+        self.clear_main_content()
         
         title_frame = tk.Frame(self.main_content, bg=self.colors["bg"])
         title_frame.pack(fill="x", padx=30, pady=20)
@@ -947,12 +1118,9 @@ class KUBE:
         tree_frame = tk.Frame(self.main_content, bg=self.colors["white"])
         tree_frame.pack(fill="both", expand=True, padx=30, pady=10)
         
-        scrollbar = ttk.Scrollbar(tree_frame)
-        scrollbar.pack(side="right", fill="y")
-        
         columns = ("ID", "Borrower", "Utensil", "Qty", "Borrow Date", "Due Date", "Status")
-        tree = ttk.Treeview(tree_frame, columns=columns, show="headings", yscrollcommand=scrollbar.set)
-        scrollbar.config(command=tree.yview)
+        view = VirtualTreeview(tree_frame, columns)
+        tree = view.tree
         
         for col in columns:
             tree.heading(col, text=col)
@@ -965,40 +1133,158 @@ class KUBE:
         tree.column("Due Date", width=100)
         tree.column("Status", width=100)
         
+        search_state = {"after_id": None, "generation": 0}
+        
+        def fetch_row(results, index):
+            borrowing = results[index]
+            status = self.get_borrowing_status(borrowing)
+            return (borrowing["id"], borrowing["borrower_name"], borrowing["utensil_name"], 
+                    borrowing["quantity"], borrowing["borrow_date"], borrowing.get("due_date", "N/A"), status), (status,)
+        
         def update_results():
-            for item in tree.get_children():
-                tree.delete(item)
+            """Run the search in chunks, abandoning it as soon as a newer search starts"""
+            search_state["after_id"] = None
+            search_state["generation"] += 1
+            generation = search_state["generation"]
+            matches = self.iter_search_borrowings(search_entry.get(), status_var.get())
+            results = []
             
-            search_term = search_entry.get().lower().strip()
-            status_filter = status_var.get()
+            def step():
+                if generation != search_state["generation"] or not tree.winfo_exists():
+                    return
+                chunk = list(islice(matches, 5000))
+                results.extend(chunk)
+                if len(chunk) == 5000:
+                    self.root.after(1, step)
+                else:
+                    view.set_rows(len(results), lambda index: fetch_row(results, index))
             
-            for borrowing in self.borrowings:
-                status = "Returned" if borrowing.get("returned") else ("Overdue" if self.is_overdue(borrowing) else "Active")
-                
-                if status_filter != "All" and status != status_filter:
-                    continue
-                
-                if search_term and search_term not in borrowing["borrower_name"].lower() and search_term not in borrowing["utensil_name"].lower():
-                    continue
-                
-                tree.insert("", "end", values=(borrowing["id"], borrowing["borrower_name"], borrowing["utensil_name"], 
-                                              borrowing["quantity"], borrowing["borrow_date"], borrowing.get("due_date", "N/A"), status), tags=(status,))
+            step()
+        
+        def schedule_search(delay=200):
+            """Debounce typing so only the last keystroke triggers a search"""
+            if search_state["after_id"]:
+                self.root.after_cancel(search_state["after_id"])
+            search_state["after_id"] = self.root.after(delay, update_results)
         
         tree.tag_configure("Overdue", background="#ffcccc")
         tree.tag_configure("Active", background="#fff3cd")
         tree.tag_configure("Returned", background="#d4edda")
         
-        tree.pack(expand=True, fill="both")
+        view.pack(expand=True, fill="both")
         
-        search_entry.bind('<KeyRelease>', lambda e: update_results())
-        status_dropdown.bind('<<ComboboxSelected>>', lambda e: update_results())
+        search_entry.bind('<KeyRelease>', lambda e: schedule_search())
+        status_dropdown.bind('<<ComboboxSelected>>', lambda e: schedule_search(0))
+        # Loans turning overdue can move in or out of the status filter
+        self.watch_overdue(tree, lambda changed: schedule_search(0))
+        self.watch_data(tree, lambda changed: schedule_search(0))
         
         update_results()
     
+    def show_reports_content(self):
+        """Utilization reports content"""
+        self.clear_main_content()
+        
+        title_frame = tk.Frame(self.main_content, bg=self.colors["bg"])
+        title_frame.pack(fill="x", padx=30, pady=20)
+        
+        tk.Label(title_frame, text="Utilization Reports", font=("Arial", 24, "bold"), 
+                bg=self.colors["bg"], fg=self.colors["dark"]).pack(anchor="w")
+        
+        filter_frame = tk.Frame(self.main_content, bg=self.colors["white"])
+        filter_frame.pack(fill="x", padx=30, pady=10)
+        
+        tk.Label(filter_frame, text="Window:", font=("Arial", 11, "bold"), bg=self.colors["white"]).pack(side="left", padx=15, pady=15)
+        window_var = tk.StringVar(value="Last 30 days")
+        window_dropdown = ttk.Combobox(filter_frame, textvariable=window_var, values=list(WINDOWS), 
+                                      font=("Arial", 11), width=15, state="readonly")
+        window_dropdown.pack(side="left", padx=10, pady=15)
+        
+        tk.Label(filter_frame, text="Group by:", font=("Arial", 11, "bold"), bg=self.colors["white"]).pack(side="left", padx=15, pady=15)
+        group_var = tk.StringVar(value="Utensil")
+        group_dropdown = ttk.Combobox(filter_frame, textvariable=group_var, values=["Utensil", "Category"], 
+                                     font=("Arial", 11), width=15, state="readonly")
+        group_dropdown.pack(side="left", padx=10, pady=15)
+        
+        status_label = tk.Label(filter_frame, text="", font=("Arial", 10), bg=self.colors["white"], fg="#7f8c8d")
+        status_label.pack(side="right", padx=15, pady=15)
+        
+        tree_frame = tk.Frame(self.main_content, bg=self.colors["white"])
+        tree_frame.pack(fill="both", expand=True, padx=30, pady=10)
+        
+        scrollbar = ttk.Scrollbar(tree_frame)
+        scrollbar.pack(side="right", fill="y")
+        
+        columns = ("Name", "Loans", "Qty Borrowed", "Avg Loan Days", "Late Return Rate", "Peak Out")
+        tree = ttk.Treeview(tree_frame, columns=columns, show="headings", yscrollcommand=scrollbar.set)
+        scrollbar.config(command=tree.yview)
+        
+        for col in columns:
+            tree.heading(col, text=col)
+            tree.column(col, width=130)
+        tree.column("Name", width=220)
+        
+        tree.pack(expand=True, fill="both")
+        
+        report_state = {"generation": 0}
+        
+        def show_rows(rows):
+            tree.delete(*tree.get_children())
+            for row in rows:
+                mean_days = "N/A" if row["mean_loan_days"] is None else f"{row['mean_loan_days']:.1f}"
+                late_rate = "N/A" if row["late_rate"] is None else f"{row['late_rate']:.0%}"
+                tree.insert("", "end", values=(row["name"], row["loans"], row["quantity"], mean_days, late_rate, row["peak"]))
+        
+        def refresh():
+            """Compute every window on a worker thread, later window switches come from the cache"""
+            report_state["generation"] += 1
+            report_state.pop("reports", None)
+            generation = report_state["generation"]
+            group_by = group_var.get()
+            result = {}
+            status_label.config(text="Computing...")
+            
+            def worker():
+                started = time.perf_counter()
+                try:
+                    with self.data_lock:
+                        prepared = self.report_engine.prepare(self.report_history(), self.utensils, group_by)
+                    result["reports"] = self.report_engine.run(prepared, list(WINDOWS))
+                except Exception as e:
+                    result["error"] = e
+                result["elapsed"] = time.perf_counter() - started
+            
+            thread = threading.Thread(target=worker, daemon=True)
+            thread.start()
+            
+            def poll():
+                if generation != report_state["generation"] or not tree.winfo_exists():
+                    return
+                if thread.is_alive():
+                    self.root.after(50, poll)
+                    return
+                if "error" in result:
+                    status_label.config(text="")
+                    messagebox.showerror("Error", f"Report failed: {result['error']}")
+                    return
+                report_state["reports"] = result["reports"]
+                status_label.config(text=f"Computed in {result['elapsed'] * 1000:.0f} ms")
+                show_rows(result["reports"][window_var.get()])
+            
+            poll()
+        
+        def change_window():
+            if "reports" in report_state:
+                show_rows(report_state["reports"][window_var.get()])
+        
+        window_dropdown.bind('<<ComboboxSelected>>', lambda e: change_window())
+        group_dropdown.bind('<<ComboboxSelected>>', lambda e: refresh())
+        
+        refresh()
+    
     def show_equipment_content(self):
         """Equipment management content"""
-        for widget in self.main_content.winfo_children():
-            widget.destroy()
+        self.clear_main_content()
         
         title_frame = tk.Frame(self.main_content, bg=self.colors["bg"])
         title_frame.pack(fill="x", padx=30, pady=20)
@@ -1065,22 +1351,19 @@ class KUBE:
         tk.Spinbox(form_frame, from_=1, to=100, textvariable=qty_var, font=("Arial", 11), width=23).grid(row=2, column=1, padx=10, pady=15)
         
         def add():
-            name = name_entry.get().strip()
-            category = category_entry.get().strip()
-            qty = qty_var.get()
-            
-            if not name:
-                messagebox.showerror("Error", "Please enter utensil name")
+            try:
+                quantity = qty_var.get()
+            except tk.TclError:
+                messagebox.showerror("Error", "Please enter a valid quantity")
                 return
+            name, category = name_entry.get(), category_entry.get()
             
-            new_id = max([u["id"] for u in self.utensils], default=0) + 1
-            new_utensil = {"id": new_id, "name": name, "category": category or "Uncategorized", "quantity": qty, "available": qty}
+            def done(new_utensil):
+                messagebox.showinfo("Success", f"Utensil '{new_utensil['name']}' added successfully!")
+                dialog.destroy()
+                self.show_equipment_content()
             
-            self.utensils.append(new_utensil)
-            self.save_utensils()
-            messagebox.showinfo("Success", f"Utensil '{name}' added successfully!")
-            dialog.destroy()
-            self.show_equipment_content()
+            self.save_in_background(dialog, lambda: self.add_utensil(name, category, quantity), done)
         
         button_frame = tk.Frame(main_frame, bg=self.colors["white"])
         button_frame.pack(pady=20)
@@ -1139,7 +1422,7 @@ class KUBE:
         
         def load_utensil_data(event=None):
             selected_name = selected_utensil_var.get()
-            utensil = next((u for u in self.utensils if u["name"] == selected_name), None)
+            utensil = self.utensils_by_name.get(selected_name)
             if utensil:
                 name_entry.delete(0, tk.END)
                 name_entry.insert(0, utensil["name"])
@@ -1152,36 +1435,25 @@ class KUBE:
         
         def edit():
             selected_name = selected_utensil_var.get()
-            utensil = next((u for u in self.utensils if u["name"] == selected_name), None)
+            utensil = self.utensils_by_name.get(selected_name)
             
             if not utensil:
                 messagebox.showerror("Error", "Utensil not found")
                 return
             
-            new_name = name_entry.get().strip()
-            if not new_name:
-                messagebox.showerror("Error", "Please enter utensil name")
+            try:
+                quantity = qty_var.get()
+            except tk.TclError:
+                messagebox.showerror("Error", "Please enter a valid quantity")
                 return
+            name, category = name_entry.get(), category_entry.get()
             
-            utensil["name"] = new_name
-            utensil["category"] = category_entry.get().strip() or "Uncategorized"
-            old_qty = utensil["quantity"]
-            new_qty = qty_var.get()
-            
-            if new_qty > old_qty:
-                utensil["available"] += (new_qty - old_qty)
-            elif new_qty < old_qty:
-                borrowed = old_qty - utensil["available"]
-                if borrowed > new_qty:
-                    messagebox.showerror("Error", f"Cannot reduce quantity below borrowed amount ({borrowed})")
-                    return
-                utensil["available"] = new_qty - borrowed
+            def done(_):
+                messagebox.showinfo("Success", "Utensil updated successfully!")
+                dialog.destroy()
+                self.show_equipment_content()
             
-            utensil["quantity"] = new_qty
-            self.save_utensils()
-            messagebox.showinfo("Success", "Utensil updated successfully!")
-            dialog.destroy()
-            self.show_equipment_content()
+            self.save_in_background(dialog, lambda: self.update_utensil(utensil, name, category, quantity), done)
         
         button_frame = tk.Frame(main_frame, bg=self.colors["white"])
         button_frame.pack(pady=20, fill="x", side="bottom")
@@ -1213,23 +1485,24 @@ class KUBE:
         
         def delete():
             selected_name = selected_utensil_var.get()
-            utensil = next((u for u in self.utensils if u["name"] == selected_name), None)
+            utensil = self.utensils_by_name.get(selected_name)
             
             if not utensil:
                 messagebox.showerror("Error", "Utensil not found")
                 return
             
-            borrowed_count = sum(b["quantity"] for b in self.borrowings if b["utensil_id"] == utensil["id"] and not b.get("returned", False))
+            borrowed_count = utensil["quantity"] - utensil["available"]
             if borrowed_count > 0:
                 messagebox.showerror("Error", f"Cannot delete utensil with {borrowed_count} active borrowing(s)")
                 return
             
             if messagebox.askyesno("Confirm", f"Are you sure you want to delete '{selected_name}'?"):
-                self.utensils.remove(utensil)
-                self.save_utensils()
-                messagebox.showinfo("Success", "Utensil deleted successfully!")
-                dialog.destroy()
-                self.show_equipment_content()
+                def done(_):
+                    messagebox.showinfo("Success", "Utensil deleted successfully!")
+                    dialog.destroy()
+                    self.show_equipment_content()
+                
+                self.save_in_background(dialog, lambda: self.delete_utensil(utensil), done)
         
         button_frame = tk.Frame(main_frame, bg=self.colors["white"])
         button_frame.pack(pady=20)
@@ -1237,6 +1510,120 @@ class KUBE:
         self.create_button(button_frame, "Delete", delete, self.colors["danger"])
         self.create_button(button_frame, "Cancel", dialog.destroy, self.colors["dark"])
     
+    def show_export_dialog(self):
+        """Show dialog to export the transaction log to CSV on a worker thread"""
+        # Only needed here, kept off the startup path
+        from tkinter import filedialog
+        from kube.export import ExportCancelled, iter_export_rows, write_csv
+        
+        dialog = self.create_dialog("Export Transaction Log", 450, 400)
+        main_frame = tk.Frame(dialog, bg=self.colors["white"])
+        main_frame.pack(fill="both", expand=True, padx=20, pady=20)
+        
+        tk.Label(main_frame, text="Export to CSV", font=("Arial", 16, "bold"), 
+                bg=self.colors["white"], fg=self.colors["dark"]).pack(pady=10)
+        
+        form_frame = tk.Frame(main_frame, bg=self.colors["white"])
+        form_frame.pack(fill="x", pady=10)
+        
+        tk.Label(form_frame, text="Borrowed From:", font=("Arial", 11), bg=self.colors["white"]).grid(row=0, column=0, padx=10, pady=8, sticky="e")
+        start_entry = tk.Entry(form_frame, font=("Arial", 11), width=20)
+        start_entry.grid(row=0, column=1, padx=10, pady=8)
+        
+        tk.Label(form_frame, text="Borrowed To:", font=("Arial", 11), bg=self.colors["white"]).grid(row=1, column=0, padx=10, pady=8, sticky="e")
+        end_entry = tk.Entry(form_frame, font=("Arial", 11), width=20)
+        end_entry.grid(row=1, column=1, padx=10, pady=8)
+        
+        tk.Label(form_frame, text="Status:", font=("Arial", 11), bg=self.colors["white"]).grid(row=2, column=0, padx=10, pady=8, sticky="e")
+        status_var = tk.StringVar(value="All")
+        ttk.Combobox(form_frame, textvariable=status_var, values=["All", "Active", "Returned", "Overdue"], 
+                    font=("Arial", 11), width=18, state="readonly").grid(row=2, column=1, padx=10, pady=8)
+        
+        tk.Label(form_frame, text="Dates are YYYY-MM-DD, leave blank for no limit", font=("Arial", 9), 
+                bg=self.colors["white"], fg="#7f8c8d").grid(row=3, column=0, columnspan=2, pady=5)
+        
+        progress_bar = ttk.Progressbar(main_frame, mode="determinate", length=350, maximum=100)
+        progress_bar.pack(pady=10)
+        progress_label = tk.Label(main_frame, text="", font=("Arial", 10), bg=self.colors["white"], fg="#7f8c8d")
+        progress_label.pack()
+        
+        export_state = {"thread": None, "cancel": threading.Event()}
+        
+        def start_export():
+            start_date = start_entry.get().strip() or None
+            end_date = end_entry.get().strip() or None
+            try:
+                for value in (start_date, end_date):
+                    if value:
+                        datetime.strptime(value, "%Y-%m-%d")
+            except ValueError:
+                messagebox.showerror("Error", "Dates must be in YYYY-MM-DD format", parent=dialog)
+                return
+            
+            file_path = filedialog.asksaveasfilename(
+                parent=dialog,
+                defaultextension=".csv",
+                filetypes=[("CSV files", "*.csv"), ("All files", "*.*")],
+                initialfile=f"transaction_log_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv"
+            )
+            
+            if not file_path:
+                return
+            
+            statuses = None if status_var.get() == "All" else {status_var.get()}
+            # A copy of the current loans, the log order takes new ones in place while the worker reads it
+            borrowings = self.export_borrowings(start_date, end_date, statuses)
+            total = len(borrowings) if isinstance(borrowings, list) else (
+                len(self.get_transaction_log_order()) + self.archive.count(start_date, end_date))
+            result = {"scanned": 0, "written": None, "error": None}
+            
+            def worker():
+                try:
+                    rows = iter_export_rows(borrowings, start_date, end_date, statuses, 
+                                            progress=lambda scanned: result.update(scanned=scanned), 
+                                            cancel_event=export_state["cancel"])
+                    result["written"] = write_csv(file_path, rows)
+                except Exception as e:
+                    result["error"] = e
+            
+            export_state["thread"] = threading.Thread(target=worker, daemon=True)
+            export_state["thread"].start()
+            export_button.config(state="disabled")
+            # Let the rest of the app keep working while the export runs
+            dialog.grab_release()
+            
+            def poll():
+                if export_state["thread"].is_alive():
+                    progress_bar["value"] = result["scanned"] * 100 / max(total, 1)
+                    progress_label.config(text=f"Scanned {result['scanned']:,} of {total:,} records")
+                    dialog.after(100, poll)
+                    return
+                
+                error = result["error"]
+                dialog.destroy()
+                if isinstance(error, ExportCancelled):
+                    messagebox.showinfo("Cancelled", "Export cancelled")
+                elif error:
+                    messagebox.showerror("Error", f"Failed to export: {str(error)}")
+                else:
+                    messagebox.showinfo("Success", f"Exported {result['written']:,} records to:\n{file_path}")
+            
+            poll()
+        
+        def cancel():
+            if export_state["thread"] and export_state["thread"].is_alive():
+                export_state["cancel"].set()
+            else:
+                dialog.destroy()
+        
+        dialog.protocol("WM_DELETE_WINDOW", cancel)
+        
+        button_frame = tk.Frame(main_frame, bg=self.colors["white"])
+        button_frame.pack(pady=15)
+        
+        export_button = self.create_button(button_frame, "📥 Export", start_export, self.colors["info"])
+        self.create_button(button_frame, "Cancel", cancel, self.colors["dark"])
+    
     def show_borrower_detail(self, borrower_name):
         """Show detailed view of a borrower"""
         dialog = self.create_dialog(f"Borrower Details - {borrower_name}", 900, 600)
@@ -1249,7 +1636,7 @@ class KUBE:
         tk.Label(header_frame, text=f"Borrower: {borrower_name}", font=("Arial", 14, "bold"), 
                 bg=self.colors["light"]).pack(anchor="w", padx=15, pady=10)
         
-        borrower_key = borrower_name.lower().strip()
+        borrower_key = self.get_borrower_key(borrower_name)
         borrower_data = self.borrowers.get(borrower_key, {})
         score = self.calculate_credit_score(borrower_name)
         score_color = self.get_credit_score_color(score)
@@ -1307,21 +1694,20 @@ class KUBE:
         tree.column("Notes", width=150)
         tree.column("Status", width=80)
         
-        for borrowing in self.borrowings:
-            if borrowing["borrower_name"] == borrower_name:
-                status = "Returned" if borrowing.get("returned") else ("Overdue" if self.is_overdue(borrowing) else "Active")
-                condition = borrowing.get("return_condition", "N/A")
-                notes = borrowing.get("return_notes", "N/A")
-                tree.insert("", "end", values=(
-                    borrowing["utensil_name"],
-                    borrowing["quantity"],
-                    borrowing["borrow_date"],
-                    borrowing.get("due_date", "N/A"),
-                    borrowing.get("return_date", "N/A"),
-                    condition,
-                    notes,
-                    status
-                ), tags=(status,))
+        for borrowing in self.get_borrower_history(borrower_name):
+            status = self.get_borrowing_status(borrowing)
+            condition = borrowing.get("return_condition", "N/A")
+            notes = borrowing.get("return_notes", "N/A")
+            tree.insert("", "end", values=(
+                borrowing["utensil_name"],
+                borrowing["quantity"],
+                borrowing["borrow_date"],
+                borrowing.get("due_date", "N/A"),
+                borrowing.get("return_date", "N/A"),
+                condition,
+                notes,
+                status
+            ), tags=(status,))
         
         tree.tag_configure("Overdue", background="#ffcccc")
         tree.tag_configure("Active", background="#fff3cd")
@@ -1331,8 +1717,7 @@ class KUBE:
     
     def show_settings_content(self):
         """Settings content"""
-        for widget in self.main_content.winfo_children():
-            widget.destroy()
+        self.clear_main_content()
         
         title_frame = tk.Frame(self.main_content, bg=self.colors["bg"])
         title_frame.pack(fill="x", padx=30, pady=20)
@@ -1349,14 +1734,133 @@ class KUBE:
         limit_var = tk.IntVar(value=self.settings["max_borrow_limit"])
         tk.Spinbox(settings_frame, from_=1, to=50, textvariable=limit_var, font=("Arial", 12), width=10).grid(row=0, column=1, padx=20, pady=20, sticky="w")
         
+        tk.Label(settings_frame, text="Storage Backend:", font=("Arial", 12, "bold"), 
+                bg=self.colors["white"]).grid(row=1, column=0, padx=20, pady=20, sticky="e")
+        
+        backend_var = tk.StringVar(value=self.settings.get("storage_backend", "json"))
+        ttk.Combobox(settings_frame, textvariable=backend_var, values=["json", "packed", "sqlite"], 
+                    font=("Arial", 12), width=10, state="readonly").grid(row=1, column=1, padx=20, pady=20, sticky="w")
+        
+        profiling_var = tk.BooleanVar(value=self.settings.get("profiling", False))
+        tk.Checkbutton(settings_frame, text="Record performance timings (Ctrl+Shift+P to view)", variable=profiling_var, 
+                      font=("Arial", 11), bg=self.colors["white"]).grid(row=2, column=0, columnspan=2, padx=20, pady=10)
+        
         def save_settings():
-            self.settings["max_borrow_limit"] = limit_var.get()
-            self.save_settings()
-            messagebox.showinfo("Success", "Settings saved successfully!")
+            try:
+                limit = limit_var.get()
+            except tk.TclError:
+                messagebox.showerror("Error", "Please enter a valid borrow limit")
+                return
+            profiling, backend = profiling_var.get(), backend_var.get()
+            
+            def save():
+                with self.transaction():
+                    self.settings["max_borrow_limit"] = limit
+                    self.settings["profiling"] = profiling
+                    self.save_settings()
+                self.set_storage_backend(backend)
+            
+            def done(_):
+                self.set_profiling(profiling or bool(os.environ.get("KUBE_PROFILE")))
+                messagebox.showinfo("Success", "Settings saved successfully!")
+            
+            self.save_in_background(self.main_content, save, done)
         
         tk.Button(settings_frame, text="Save Settings", command=save_settings, font=("Arial", 11, "bold"), 
                  bg=self.colors["success"], fg=self.colors["white"], padx=20, pady=10, 
-                 cursor="hand2", relief="flat", bd=0).grid(row=1, column=0, columnspan=2, pady=20)
+                 cursor="hand2", relief="flat", bd=0).grid(row=3, column=0, columnspan=2, pady=20)
+        
+        credit_frame = tk.LabelFrame(self.main_content, text="Credit Scores", font=("Arial", 12, "bold"), 
+                                    bg=self.colors["white"], relief="flat", bd=0)
+        credit_frame.pack(padx=30, pady=10)
+        
+        tk.Label(credit_frame, text="Replay the borrowing history to check or rebuild every borrower's score.", 
+                font=("Arial", 10), bg=self.colors["white"], fg="#7f8c8d").pack(padx=20, pady=(10, 5))
+        
+        credit_buttons = tk.Frame(credit_frame, bg=self.colors["white"])
+        credit_buttons.pack(pady=10)
+        
+        def run_in_background(task, done, failure="Credit score replay failed"):
+            """Run a replay on a worker thread and hand the result to done() on the UI thread"""
+            result = {}
+            
+            def worker():
+                try:
+                    result["value"] = task()
+                except Exception as e:
+                    result["error"] = e
+            
+            thread = threading.Thread(target=worker, daemon=True)
+            thread.start()
+            
+            def poll():
+                if thread.is_alive():
+                    self.root.after(100, poll)
+                elif "error" in result:
+                    messagebox.showerror("Error", f"{failure}: {result['error']}")
+                else:
+                    done(result["value"])
+            
+            poll()
+        
+        def verify_scores():
+            def done(mismatches):
+                if not mismatches:
+                    messagebox.showinfo("Credit Scores", "All stored credit scores match the borrowing history.")
+                    return
+                borrowers = sorted({key for key, _, _, _ in mismatches})
+                sample = "\n".join(f"{key}: {field} is {stored}, history gives {expected}" 
+                                   for key, field, stored, expected in mismatches[:5])
+                messagebox.showwarning("Credit Scores", f"{len(borrowers)} borrower(s) differ from the borrowing history:\n\n{sample}")
+            
+            run_in_background(self.verify_credit_scores, done)
+        
+        def rebuild_scores():
+            if not messagebox.askyesno("Confirm", "Recompute every borrower's credit score and counters from the borrowing history?"):
+                return
+            run_in_background(self.rebuild_credit_scores, 
+                              lambda changed: messagebox.showinfo("Success", f"Credit scores rebuilt, {changed} borrower(s) updated."))
+        
+        self.create_button(credit_buttons, "🔎 Verify", verify_scores, self.colors["info"])
+        self.create_button(credit_buttons, "♻️ Rebuild from History", rebuild_scores, self.colors["warning"])
+        
+        archive_frame = tk.LabelFrame(self.main_content, text="Archive", font=("Arial", 12, "bold"), 
+                                     bg=self.colors["white"], relief="flat", bd=0)
+        archive_frame.pack(padx=30, pady=10)
+        
+        tk.Label(archive_frame, text=f"Move returned loans to compressed monthly files. {len(self.archive):,} loan(s) archived so far.", 
+                font=("Arial", 10), bg=self.colors["white"], fg="#7f8c8d").grid(row=0, column=0, columnspan=2, padx=20, pady=(10, 5))
+        
+        tk.Label(archive_frame, text="Archive loans returned more than (days):", font=("Arial", 11), 
+                bg=self.colors["white"]).grid(row=1, column=0, padx=20, pady=10, sticky="e")
+        
+        archive_days_var = tk.IntVar(value=self.settings.get("archive_after_days", MIN_ARCHIVE_DAYS))
+        tk.Spinbox(archive_frame, from_=MIN_ARCHIVE_DAYS, to=3650, textvariable=archive_days_var, 
+                  font=("Arial", 11), width=8).grid(row=1, column=1, padx=20, pady=10, sticky="w")
+        
+        def archive_now():
+            try:
+                days = archive_days_var.get()
+            except tk.TclError:
+                days = -1
+            if days < MIN_ARCHIVE_DAYS:
+                messagebox.showerror("Error", f"Loans can only be archived {MIN_ARCHIVE_DAYS} or more days after their return")
+                return
+            if not messagebox.askyesno("Confirm", f"Archive every loan returned more than {days} days ago?"):
+                return
+            
+            def archive():
+                with self.transaction():
+                    self.settings["archive_after_days"] = days
+                    self.save_settings()
+                return self.archive_borrowings(days)
+            
+            self.save_in_background(self.main_content, archive, 
+                                    lambda moved: messagebox.showinfo("Success", f"{moved:,} loan(s) archived."))
+        
+        archive_buttons = tk.Frame(archive_frame, bg=self.colors["white"])
+        archive_buttons.grid(row=2, column=0, columnspan=2, pady=10)
+        self.create_button(archive_buttons, "🗄️ Archive Now", archive_now, self.colors["info"])
     
     def show_change_password(self):
         """Show change password dialog"""
@@ -1395,10 +1899,18 @@ class KUBE:
                 messagebox.showerror("Error", "Password must be at least 6 characters")
                 return
             
-            self.admin_data["password"] = self.hash_password(new_pass.get())
-            self.save_admin()
-            messagebox.showinfo("Success", "Password changed successfully!")
-            dialog.destroy()
+            password = self.hash_password(new_pass.get())
+            
+            def change_password():
+                with self.transaction():
+                    self.admin_data["password"] = password
+                    self.save_admin()
+            
+            def done(_):
+                messagebox.showinfo("Success", "Password changed successfully!")
+                dialog.destroy()
+            
+            self.save_in_background(dialog, change_password, done)
         
         button_frame = tk.Frame(main_frame, bg=self.colors["white"])
         button_frame.pack(pady=20)
@@ -1406,10 +1918,111 @@ class KUBE:
         self.create_button(button_frame, "Change", change, self.colors["success"])
         self.create_button(button_frame, "Cancel", dialog.destroy, self.colors["dark"])
 
+    def profiled_methods(self):
+        screens = tuple(sorted(name for name in dir(type(self)) if name.startswith("show_") and name.endswith("_content")))
+        return KubeEngine.profiled_methods(self) + screens
+    
+    def show_performance_panel(self, event=None):
+        """Hidden admin panel (Ctrl+Shift+P) listing the slowest profiled operations"""
+        dialog = self.create_dialog("Performance", 760, 520)
+        main_frame = tk.Frame(dialog, bg=self.colors["white"])
+        main_frame.pack(fill="both", expand=True, padx=20, pady=20)
+        
+        status_label = tk.Label(main_frame, text="", font=("Arial", 10), bg=self.colors["white"], fg="#7f8c8d")
+        status_label.pack(anchor="w")
+        
+        sort_var = tk.StringVar(value="total")
+        sort_frame = tk.Frame(main_frame, bg=self.colors["white"])
+        sort_frame.pack(anchor="w", pady=5)
+        tk.Label(sort_frame, text="Slowest by:", font=("Arial", 10), bg=self.colors["white"]).pack(side="left")
+        for text, value in (("Total time", "total"), ("Longest call", "max")):
+            tk.Radiobutton(sort_frame, text=text, variable=sort_var, value=value, bg=self.colors["white"], 
+                          command=lambda: refresh()).pack(side="left", padx=5)
+        
+        tree_frame = tk.Frame(main_frame, bg=self.colors["white"])
+        tree_frame.pack(expand=True, fill="both", pady=5)
+        
+        scrollbar = ttk.Scrollbar(tree_frame)
+        scrollbar.pack(side="right", fill="y")
+        
+        columns = ("Operation", "Calls", "Total ms", "Mean ms", "Max ms")
+        tree = ttk.Treeview(tree_frame, columns=columns, show="headings", yscrollcommand=scrollbar.set)
+        scrollbar.config(command=tree.yview)
+        for col in columns:
+            tree.heading(col, text=col)
+            tree.column(col, width=100, anchor="e")
+        tree.column("Operation", width=260, anchor="w")
+        tree.pack(expand=True, fill="both")
+        
+        def refresh():
+            if self.profiler.enabled:
+                status_label.config(text="Timing is on. Click Refresh to pick up new calls.")
+            else:
+                status_label.config(text="Timing is off. Turn it on in System Settings or start KUBE with KUBE_PROFILE=1.")
+            tree.delete(*tree.get_children())
+            for label, calls, total, mean, longest in self.profiler.slowest(sort_by=sort_var.get()):
+                tree.insert("", "end", values=(label, calls, f"{total:.1f}", f"{mean:.2f}", f"{longest:.1f}"))
+        
+        def reset():
+            self.profiler.reset()
+            refresh()
+        
+        def profile_next_screen():
+            self.profiler.capture_next(self, [name for name in self.profiled_methods() if name.startswith("show_")], 
+                                       self.show_captured_profile)
+            dialog.destroy()
+            messagebox.showinfo("Performance", "The next screen you open will be profiled.")
+        
+        def save_trace():
+            from tkinter import filedialog
+            file_path = filedialog.asksaveasfilename(parent=dialog, defaultextension=".json", 
+                                                     initialfile="kube-trace.json", filetypes=[("Trace files", "*.json")])
+            if not file_path:
+                return
+            try:
+                count = self.profiler.dump_trace(file_path)
+            except OSError as e:
+                messagebox.showerror("Error", f"Could not save the trace: {e}", parent=dialog)
+                return
+            messagebox.showinfo("Performance", f"Saved {count} calls to {file_path}\nOpen it in chrome://tracing or Perfetto.", 
+                                parent=dialog)
+        
+        button_frame = tk.Frame(main_frame, bg=self.colors["white"])
+        button_frame.pack(pady=10)
+        
+        self.create_button(button_frame, "Refresh", refresh, self.colors["primary"], padx=5)
+        self.create_button(button_frame, "Reset", reset, self.colors["warning"], padx=5)
+        self.create_button(button_frame, "Profile Next Screen", profile_next_screen, self.colors["info"], padx=5)
+        self.create_button(button_frame, "Save Trace...", save_trace, self.colors["secondary"], padx=5)
+        self.create_button(button_frame, "Close", dialog.destroy, self.colors["dark"], padx=5)
+        
+        refresh()
+    
+    def show_captured_profile(self, name, profile):
+        """Save a one-off cProfile capture under kube_data/profiles and show its top functions"""
+        import io
+        import pstats
+        
+        profiles_dir = os.path.join(self.data_dir, "profiles")
+        os.makedirs(profiles_dir, exist_ok=True)
+        file_path = os.path.join(profiles_dir, f"{name}-{datetime.now().strftime('%Y%m%d-%H%M%S')}.prof")
+        profile.dump_stats(file_path)
+        
+        output = io.StringIO()
+        pstats.Stats(profile, stream=output).sort_stats("cumulative").print_stats(30)
+        
+        dialog = tk.Toplevel(self.root)
+        dialog.title(f"Profile of {name}")
+        dialog.geometry("900x600")
+        tk.Label(dialog, text=f"Saved to {file_path}", font=("Arial", 10), fg="#7f8c8d").pack(anchor="w", padx=10, pady=5)
+        text = tk.Text(dialog, font=("Courier", 9), wrap="none")
+        text.insert("1.0", output.getvalue())
+        text.config(state="disabled")
+        text.pack(expand=True, fill="both", padx=10, pady=(0, 10))
+    
     def show_about_content(self):
         """About KUBE page with team information"""
-        for widget in self.main_content.winfo_children():
-            widget.destroy()
+        self.clear_main_content()
         
         scroll_frame = tk.Frame(self.main_content, bg=self.colors["bg"])
         scroll_frame.pack(fill="both", expand=True, padx=0, pady=0)
@@ -0,0 +1 @@
+"""Data engine helpers for KUBE - Kitchen Utensil Borrowing Engine"""
@@ -0,0 +1,26 @@
+import heapq
+
+
+class RecentActivity:
+    """The newest loans by borrow date, kept as a bounded min-heap so the dashboard never sorts the history
+
+    Borrowings are never deleted, so the newest capacity of them only
+    change when a newer one is added and the heap never needs a rescan.
+    """
+
+    def __init__(self, borrowings=(), capacity=50):
+        self.capacity = capacity
+        self.heap = heapq.nlargest(capacity, ((b.get("borrow_date", ""), b["id"], b) for b in borrowings),
+                                   key=lambda entry: entry[:2])
+        heapq.heapify(self.heap)
+
+    def add(self, borrowing):
+        entry = (borrowing.get("borrow_date", ""), borrowing["id"], borrowing)
+        if len(self.heap) < self.capacity:
+            heapq.heappush(self.heap, entry)
+        elif entry[:2] > self.heap[0][:2]:
+            heapq.heapreplace(self.heap, entry)
+
+    def newest(self, limit=10):
+        """Up to limit loans, newest borrow date first, later ids first on the same day"""
+        return [entry[2] for entry in heapq.nlargest(limit, self.heap, key=lambda entry: entry[:2])]
@@ -0,0 +1,111 @@
+def borrower_key(borrower_name):
+    """Normalize a borrower name for lookups"""
+    return borrower_name.lower().strip()
+
+
+class BorrowerAggregates:
+    """Materialized per-borrower view kept in step with every borrow, return and split
+
+    Entries are keyed like the borrowers collection (lower-cased, stripped),
+    but posting lists stay per display name since the screens list names
+    exactly as they were typed.
+    """
+
+    def __init__(self, borrowings=()):
+        self.entries = {}
+        for borrowing in borrowings:
+            self._count(borrowing)
+
+    @classmethod
+    def from_rows(cls, rows):
+        """Build from (borrower name, id, quantity, returned) rows, for loaders that never build records"""
+        view = cls()
+        by_name = {}
+        for borrower_name, borrowing_id, quantity, returned in rows:
+            found = by_name.get(borrower_name)
+            if found is None:
+                entry = view._entry(borrower_name)
+                found = by_name[borrower_name] = (entry, entry["ids_by_name"].setdefault(borrower_name, []))
+            entry, ids = found
+            entry["total_quantity"] += quantity
+            if not returned:
+                entry["active_quantity"] += quantity
+            ids.append(borrowing_id)
+        return view
+
+    def _count(self, borrowing):
+        self._add(borrowing["borrower_name"], borrowing["id"], borrowing["quantity"], borrowing.get("returned", False))
+
+    def _add(self, borrower_name, borrowing_id, quantity, returned):
+        entry = self._entry(borrower_name)
+        entry["total_quantity"] += quantity
+        if not returned:
+            entry["active_quantity"] += quantity
+        entry["ids_by_name"].setdefault(borrower_name, []).append(borrowing_id)
+
+    def rebuild(self, key, borrowings):
+        """Recount one borrower key from its full history, oldest first"""
+        previous = self.entries.pop(key, None)
+        for borrowing in borrowings:
+            self._count(borrowing)
+        if previous:
+            self.add_names(previous["ids_by_name"])
+
+    def add_names(self, names):
+        """List names with no current borrowings too, those whose loans were all archived"""
+        for name in names:
+            self._entry(name)["ids_by_name"].setdefault(name, [])
+
+    def _entry(self, borrower_name):
+        key = borrower_key(borrower_name)
+        entry = self.entries.get(key)
+        if entry is None:
+            entry = self.entries[key] = {"active_quantity": 0, "total_quantity": 0, "ids_by_name": {}}
+        return entry
+
+    def borrowed(self, borrowing):
+        """A new loan went out"""
+        entry = self._entry(borrowing["borrower_name"])
+        entry["active_quantity"] += borrowing["quantity"]
+        entry["total_quantity"] += borrowing["quantity"]
+        entry["ids_by_name"].setdefault(borrowing["borrower_name"], []).append(borrowing["id"])
+
+    def split(self, remainder):
+        """A partial return moved the rest of a loan onto a new record, the quantities are unchanged"""
+        entry = self._entry(remainder["borrower_name"])
+        entry["ids_by_name"].setdefault(remainder["borrower_name"], []).append(remainder["id"])
+
+    def returned(self, borrowing, quantity):
+        entry = self._entry(borrowing["borrower_name"])
+        entry["active_quantity"] -= quantity
+
+    def active_quantity(self, borrower_name):
+        entry = self.entries.get(borrower_key(borrower_name))
+        return entry["active_quantity"] if entry else 0
+
+    def total_quantity(self, borrower_name):
+        entry = self.entries.get(borrower_key(borrower_name))
+        return entry["total_quantity"] if entry else 0
+
+    def names(self):
+        """Every borrower name as typed, sorted"""
+        return sorted(name for entry in self.entries.values() for name in entry["ids_by_name"])
+
+    def names_of(self, key):
+        """Every spelling of the name under this borrower key"""
+        entry = self.entries.get(key)
+        return list(entry["ids_by_name"]) if entry else []
+
+    def all_borrowing_ids(self, borrower_name):
+        """Ids of every borrowing under this borrower's key, whatever the name's spelling"""
+        entry = self.entries.get(borrower_key(borrower_name))
+        if entry is None:
+            return []
+        return [bid for ids in entry["ids_by_name"].values() for bid in ids]
+
+    def borrowing_ids(self, borrower_name):
+        """Ids of this exact name's borrowings, oldest first"""
+        entry = self.entries.get(borrower_key(borrower_name))
+        if entry is None:
+            return []
+        return entry["ids_by_name"].get(borrower_name, [])
@@ -0,0 +1,172 @@
+import gzip
+import io
+import json
+import os
+import threading
+from collections import OrderedDict
+
+from kube.aggregates import borrower_key
+from kube.credit import build_events, replay_events
+from kube.records import Borrowing, record_to_json
+
+# Returned loans stay in the hot set for at least a year, so every report window but All time sees them all
+MIN_ARCHIVE_DAYS = 365
+
+
+def log_key(borrowing):
+    """Transaction log order, newest borrow date first and later ids first on the same day"""
+    return (borrowing.get("borrow_date", ""), borrowing["id"])
+
+
+class BorrowingArchive:
+    """Old returned borrowings, moved out of memory into per-month gzip JSONL segments
+
+    Segments are keyed by borrow month and hold their loans newest first.
+    archive/index.json lists them with the borrower and utensil names in
+    each, so a query only opens the months it can match, and keeps what the
+    hot set still needs from the archived history: each borrower's credit
+    counters after it (the baseline rescoring starts from), the highest ids
+    in use, and the returned loans from before split tracking that a later
+    remainder may continue (build_events' archived origins).
+    """
+
+    def __init__(self, data_dir, cache_size=6):
+        self.archive_dir = os.path.join(data_dir, "archive")
+        self.index_file = os.path.join(self.archive_dir, "index.json")
+        self.cache_size = cache_size
+        self.cache = OrderedDict()
+        self.lock = threading.Lock()
+        self.set_index(self._empty_index())
+
+    def _empty_index(self):
+        return {"archived_before": None, "segments": {}, "baseline": {}, "origins": [],
+                "max_borrowing_id": 0, "max_utensil_id": 0}
+
+    def load(self):
+        """Read index.json, the segments themselves are read on demand"""
+        index = self._empty_index()
+        if os.path.exists(self.index_file):
+            with open(self.index_file, 'r') as f:
+                index.update(json.load(f))
+        self.set_index(index)
+
+    def set_index(self, index):
+        with self.lock:
+            self.index = index
+            self.months = sorted(index["segments"], reverse=True)
+            self.origins = {tuple(origin[:4]): origin[4] for origin in index["origins"]}
+            self.cache.clear()
+
+    def __len__(self):
+        return self.count()
+
+    def months_in(self, start_date=None, end_date=None):
+        """Archived months, newest first, a borrow date range overlaps"""
+        return [month for month in self.months
+                if not (start_date and month < start_date[:7]) and not (end_date and month > end_date[:7])]
+
+    def count(self, start_date=None, end_date=None):
+        """How many borrowings iter_borrowings() yields for the same range"""
+        return sum(self.index["segments"][month]["count"] for month in self.months_in(start_date, end_date))
+
+    def segment_file(self, month):
+        return os.path.join(self.archive_dir, f"borrowings-{month}.jsonl.gz")
+
+    def is_archive_file(self, path):
+        return os.path.dirname(path) == self.archive_dir
+
+    def borrower_names(self):
+        return sorted({name for segment in self.index["segments"].values() for name in segment["borrowers"]})
+
+    def read_segment(self, month, cache=True):
+        """One month's borrowings, newest first, the last few months read are kept"""
+        with self.lock:
+            borrowings = self.cache.get(month)
+            if borrowings is not None:
+                self.cache.move_to_end(month)
+                return borrowings
+        with gzip.open(self.segment_file(month), 'rt', encoding="utf-8") as f:
+            borrowings = [Borrowing.from_dict(json.loads(line)) for line in f if line.strip()]
+        if cache:
+            with self.lock:
+                self.cache[month] = borrowings
+                while len(self.cache) > self.cache_size:
+                    self.cache.popitem(last=False)
+        return borrowings
+
+    def iter_borrowings(self, start_date=None, end_date=None, cache=True):
+        """Archived borrowings newest first, opening only the months a borrow date range overlaps"""
+        for month in self.months_in(start_date, end_date):
+            yield from self.read_segment(month, cache)
+
+    def borrower_history(self, borrower_name):
+        """This exact name's archived borrowings, oldest first"""
+        history = []
+        for month in reversed(self.months):
+            if borrower_name in self.index["segments"][month]["borrowers"]:
+                history.extend(b for b in reversed(self.read_segment(month)) if b["borrower_name"] == borrower_name)
+        return history
+
+    def search(self, term):
+        """Lazily yield archived borrowings whose borrower or utensil name contains term
+
+        Oldest month first and in id order within a month, so ids mostly
+        keep rising after the current matches. A month is only read once
+        the caller has used up the ones before it.
+        """
+        term = term.lower().strip()
+        for month in reversed(self.months):
+            segment = self.index["segments"][month]
+            if term and not any(term in name.lower() for name in segment["borrowers"] + segment["utensils"]):
+                continue
+            found = [b for b in self.read_segment(month, cache=bool(term))
+                     if term in b["borrower_name"].lower() or term in b["utensil_name"].lower()]
+            found.sort(key=lambda b: b["id"])
+            yield from found
+
+    def add(self, borrowings, archived_before, tracked_from):
+        """Index and segment payloads with borrowings moved in, returns (index, {month: gzip bytes})
+
+        The hot set must hold no returns from before archived_before, or
+        rescoring would apply them after the archived history.
+        """
+        by_month = {}
+        for borrowing in borrowings:
+            by_month.setdefault(borrowing["borrow_date"][:7], []).append(borrowing)
+
+        index = json.loads(json.dumps(self.index))
+        rebuilt = replay_events(build_events(borrowings, tracked_from, self.origins), workers=1,
+                                baseline=index["baseline"])
+        index["baseline"].update(rebuilt)
+        index["archived_before"] = max(filter(None, (index["archived_before"], archived_before)))
+        for borrowing in borrowings:
+            index["max_borrowing_id"] = max(index["max_borrowing_id"], borrowing["id"])
+            index["max_utensil_id"] = max(index["max_utensil_id"], borrowing["utensil_id"])
+            if tracked_from is None or borrowing["id"] < tracked_from:
+                index["origins"].append([borrower_key(borrowing["borrower_name"]), borrowing["utensil_id"],
+                                         borrowing["borrow_date"], borrowing.get("due_date"), borrowing["id"]])
+
+        payloads = {}
+        for month, moved in by_month.items():
+            segment = list(self.read_segment(month, cache=False)) if month in index["segments"] else []
+            segment.extend(moved)
+            segment.sort(key=log_key, reverse=True)
+            index["segments"][month] = {
+                "count": len(segment),
+                "borrowers": sorted({b["borrower_name"] for b in segment}),
+                "utensils": sorted({b["utensil_name"] for b in segment}),
+            }
+            lines = "".join(json.dumps(b, default=record_to_json) + "\n" for b in segment)
+            buffer = io.BytesIO()
+            # No timestamp in the header, so the same segment always compresses to the same bytes
+            with gzip.GzipFile(fileobj=buffer, mode='wb', mtime=0) as f:
+                f.write(lines.encode("utf-8"))
+            payloads[month] = buffer.getvalue()
+        return index, payloads
+
+    def commit_ops(self, index, payloads):
+        """Group commit ops writing what add() prepared"""
+        os.makedirs(self.archive_dir, exist_ok=True)
+        ops = [("replace", self.segment_file(month), payload) for month, payload in payloads.items()]
+        ops.append(("replace", self.index_file, json.dumps(index, default=record_to_json)))
+        return ops
@@ -0,0 +1 @@
+"""Synthetic data sets and a timing/memory benchmark suite for the KUBE data engine"""
@@ -0,0 +1,104 @@
+import argparse
+import os
+import sys
+import time
+
+from kube.bench.generate import SCALES, generate
+from kube.bench.run import BENCHMARKS, compare, load_baseline, run_benchmarks, save_baseline
+
+
+def add_size_arguments(parser):
+    parser.add_argument("--scale", choices=list(SCALES), default="1k", help="preset sizes (default: 1k)")
+    parser.add_argument("--utensils", type=int, help="override the preset")
+    parser.add_argument("--borrowers", type=int, help="override the preset")
+    parser.add_argument("--borrowings", type=int, help="override the preset")
+    parser.add_argument("--overdue-rate", type=float, default=0.03, help="share of loans out past due (default: 0.03)")
+    parser.add_argument("--returned-rate", type=float, default=0.9, help="share of loans returned (default: 0.9)")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--packed", action="store_true", help="store the borrowings in the packed binary format")
+
+
+def sizes(args):
+    counts = dict(SCALES[args.scale])
+    for key in counts:
+        if getattr(args, key) is not None:
+            counts[key] = getattr(args, key)
+    return counts
+
+
+def generate_data(data_dir, args):
+    started = time.perf_counter()
+    counts = generate(data_dir, overdue_rate=args.overdue_rate, returned_rate=args.returned_rate, seed=args.seed,
+                      packed=args.packed, **sizes(args))
+    print(f"Generated {data_dir} in {time.perf_counter() - started:.1f}s: "
+          + ", ".join(f"{value} {key}" for key, value in counts.items()), file=sys.stderr)
+
+
+def cmd_generate(args):
+    generate_data(args.data_dir, args)
+    return 0
+
+
+def cmd_run(args):
+    data_dir = args.data_dir or os.path.join("bench_data", args.scale + ("-packed" if args.packed else ""))
+    if not os.path.exists(os.path.join(data_dir, "settings.json")):
+        generate_data(data_dir, args)
+
+    def show(name, result):
+        peak = f"{result['peak_kib']:>10} KiB" if "peak_kib" in result else ""
+        print(f"{name:<24}{result['best_ms']:>12.2f} ms{result['median_ms']:>12.2f} ms{peak}")
+
+    print(f"{'benchmark':<24}{'best':>15}{'median':>15}{'peak':>14}" if args.memory else
+          f"{'benchmark':<24}{'best':>15}{'median':>15}")
+    results = run_benchmarks(data_dir, args.repeat, args.only, args.memory, on_result=show)
+
+    if args.save_baseline:
+        save_baseline(args.save_baseline, args.scale, results)
+        print(f"Saved baseline to {args.save_baseline}")
+    if not args.baseline:
+        return 0
+
+    baseline = load_baseline(args.baseline)
+    if baseline.get("scale") != args.scale:
+        print(f"Warning: baseline was recorded at scale {baseline.get('scale')}", file=sys.stderr)
+    regressions = 0
+    print(f"\nCompared with {args.baseline}:")
+    for name, metric, before, now, ratio, regressed in compare(results, baseline, args.tolerance):
+        regressions += regressed
+        print(f"{name:<24}{metric:<10}{before:>12}{now:>12}{ratio:>8.2f}x{'  REGRESSED' if regressed else ''}")
+    print(f"{regressions} regression(s) beyond {args.tolerance:.0%}")
+    return 1 if regressions else 0
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="python -m kube.bench", description="KUBE data engine benchmarks")
+    commands = parser.add_subparsers(dest="command")
+    commands.required = True
+
+    generate_parser = commands.add_parser("generate", help="write a synthetic kube_data folder")
+    generate_parser.add_argument("data_dir")
+    add_size_arguments(generate_parser)
+    generate_parser.set_defaults(run=cmd_generate)
+
+    run_parser = commands.add_parser("run", help="time the engine against a generated data folder")
+    run_parser.add_argument("--data-dir", help="default: bench_data/<scale>, generated when missing")
+    add_size_arguments(run_parser)
+    run_parser.add_argument("--repeat", type=int, default=3, help="timed runs per benchmark (default: 3)")
+    run_parser.add_argument("--only", action="append", choices=[name for name, _ in BENCHMARKS],
+                            help="run just this benchmark, repeat to pick several")
+    run_parser.add_argument("--no-memory", dest="memory", action="store_false", help="skip the tracemalloc pass")
+    run_parser.add_argument("--baseline", help="compare with results saved earlier, exit 1 on a regression")
+    run_parser.add_argument("--save-baseline", help="save these results for later comparisons")
+    run_parser.add_argument("--tolerance", type=float, default=0.25,
+                            help="slowdown or growth counted as a regression (default: 0.25)")
+    run_parser.set_defaults(run=cmd_run)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    return args.run(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
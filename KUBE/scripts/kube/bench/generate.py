@@ -0,0 +1,158 @@
+import hashlib
+import json
+import os
+import random
+import shutil
+from datetime import date, datetime
+
+from kube.credit import replay
+from kube.packed import pack_borrowings
+from kube.records import record_to_json
+
+FIRST_NAMES = ("Maria", "Jose", "Ana", "Juan", "Carmen", "Luis", "Rosa", "Pedro", "Elena", "Miguel",
+               "Sofia", "Carlos", "Isabel", "Antonio", "Lucia", "Mark", "Grace", "John", "Joy", "Paolo")
+LAST_NAMES = ("Santos", "Reyes", "Cruz", "Bautista", "Garcia", "Mendoza", "Torres", "Flores", "Ramos",
+              "Villanueva", "Aquino", "Castillo", "Navarro", "Dela Cruz", "Lim", "Tan", "Gonzales", "Rivera")
+CATALOG = (
+    ("Chef Knife", "Cutlery"), ("Paring Knife", "Cutlery"), ("Bread Knife", "Cutlery"),
+    ("Cutting Board", "Preparation"), ("Peeler", "Preparation"), ("Grater", "Preparation"),
+    ("Mixing Bowl", "Cookware"), ("Saucepan", "Cookware"), ("Frying Pan", "Cookware"), ("Stock Pot", "Cookware"),
+    ("Whisk", "Utensils"), ("Spatula", "Utensils"), ("Ladle", "Utensils"), ("Tongs", "Utensils"),
+    ("Baking Sheet", "Bakeware"), ("Muffin Tin", "Bakeware"), ("Rolling Pin", "Bakeware"),
+    ("Measuring Cups", "Measuring"), ("Kitchen Scale", "Measuring"), ("Thermometer", "Measuring"),
+)
+CONDITIONS = (("Excellent", 25), ("Good", 60), ("Fair", 10), ("Damaged", 4), ("Lost", 1))
+
+SCALES = {
+    "1k": {"utensils": 50, "borrowers": 200, "borrowings": 1000},
+    "100k": {"utensils": 500, "borrowers": 5000, "borrowings": 100000},
+    "1m": {"utensils": 2000, "borrowers": 50000, "borrowings": 1000000},
+}
+
+
+def borrower_names(count):
+    """Distinct "First Last" names, numbered once the combinations run out"""
+    combos = len(FIRST_NAMES) * len(LAST_NAMES)
+    names = []
+    for i in range(count):
+        name = f"{FIRST_NAMES[i % len(FIRST_NAMES)]} {LAST_NAMES[(i // len(FIRST_NAMES)) % len(LAST_NAMES)]}"
+        names.append(name if i < combos else f"{name} {i // combos + 1}")
+    return names
+
+
+def utensil_names(count):
+    names = []
+    for i in range(count):
+        name, category = CATALOG[i % len(CATALOG)]
+        names.append((name if i < len(CATALOG) else f"{name} {i // len(CATALOG) + 1}", category))
+    return names
+
+
+def _loan(rng, today, days, status):
+    """(borrow, due, returned on) day ordinals for one loan, returned on is None while active"""
+    if status == "overdue":
+        borrowed = today - rng.randint(15, 60)
+        return borrowed, rng.randint(borrowed + 1, today - 1), None
+    if status == "active":
+        borrowed = today - rng.randint(0, 13)
+        return borrowed, borrowed + 14, None
+    borrowed = today - rng.randint(1, days)
+    due = borrowed + rng.choice((1, 3, 7, 7, 14))
+    # One loan in ten comes back late
+    returned = due + rng.randint(1, 10) if rng.random() < 0.1 else rng.randint(borrowed, due)
+    return borrowed, due, min(returned, today)
+
+
+def generate(data_dir, utensils=50, borrowers=200, borrowings=1000, overdue_rate=0.03, returned_rate=0.9,
+             days=730, seed=1, packed=False):
+    """Write a complete kube_data folder with a realistic history, returns its counts
+
+    Loans are spread over the last days days: returned_rate of them are
+    back (a tenth of those late), overdue_rate are out past their due date
+    and the rest are out and not yet due. Borrowers follow a skewed
+    distribution so a few regulars account for many loans, and their
+    credit scores are replayed from the generated history. packed writes
+    the borrowings as a packed borrowings.bin for the packed backend.
+    """
+    rng = random.Random(seed)
+    today = date.today().toordinal()
+    os.makedirs(data_dir, exist_ok=True)
+
+    people = borrower_names(borrowers)
+    contacts = [{"phone": f"09{rng.randint(100000000, 999999999)}",
+                 "email": name.lower().replace(" ", ".") + "@example.com"} for name in people]
+    catalog = utensil_names(utensils)
+    weights = [1.0 / (rank + 1) ** 0.8 for rank in range(borrowers)]
+
+    loans = []
+    borrower_of = rng.choices(range(borrowers), weights, k=borrowings)
+    for i in range(borrowings):
+        r = rng.random()
+        status = "overdue" if r < overdue_rate else ("active" if r < 1 - returned_rate else "returned")
+        borrowed, due, returned = _loan(rng, today, days, status)
+        loans.append((borrowed, i, borrower_of[i], rng.randrange(utensils), rng.choice((1, 1, 1, 2, 3)),
+                      due, returned))
+    # Ids follow the borrow dates, as they do when the loans are entered day by day
+    loans.sort()
+
+    out = [0] * utensils
+    records = []
+    condition_names = [name for name, _ in CONDITIONS]
+    condition_weights = [weight for _, weight in CONDITIONS]
+    for borrowing_id, (borrowed, _, who, utensil, quantity, due, returned) in enumerate(loans, 1):
+        name, _ = catalog[utensil]
+        record = {
+            "id": borrowing_id,
+            "borrower_name": people[who],
+            "utensil_name": name,
+            "utensil_id": utensil + 1,
+            "quantity": quantity,
+            "borrow_date": date.fromordinal(borrowed).isoformat(),
+            "due_date": date.fromordinal(due).isoformat(),
+            "returned": returned is not None,
+            "contact_info": contacts[who],
+        }
+        if returned is None:
+            out[utensil] += quantity
+        else:
+            record["return_date"] = date.fromordinal(returned).isoformat()
+            record["return_condition"] = rng.choices(condition_names, condition_weights)[0]
+            record["return_notes"] = ""
+            record["return_quantity"] = quantity
+        records.append(record)
+
+    utensil_rows = []
+    for i, (name, category) in enumerate(catalog):
+        quantity = out[i] + rng.randint(5, 40)
+        utensil_rows.append({"id": i + 1, "name": name, "quantity": quantity, "available": quantity - out[i],
+                             "category": category})
+
+    # No partial returns are generated, so every record can be tracked as its own loan
+    settings = {"max_borrow_limit": 5, "split_tracking_from": 1}
+    if packed:
+        settings["storage_backend"] = "packed"
+    files = {
+        "utensils.json": utensil_rows,
+        "borrowings.json": records,
+        "borrowers.json": replay(records, settings["split_tracking_from"]),
+        "settings.json": settings,
+        "admin.json": {"username": "admin", "password": hashlib.sha256(b"admin123").hexdigest()},
+        "trial.json": {"start_date": datetime.now().isoformat(), "trial_days": 30},
+    }
+    if packed:
+        with open(os.path.join(data_dir, "borrowings.bin"), 'wb') as f:
+            f.write(pack_borrowings(files.pop("borrowings.json")))
+    for file_name, data in files.items():
+        with open(os.path.join(data_dir, file_name), 'w') as f:
+            json.dump(data, f, default=record_to_json)
+    # A leftover snapshot, journal, database or archive would be replayed over the new one
+    stale = ("borrowings.json",) if packed else ("borrowings.bin",)
+    for file_name in stale + ("borrowings.journal.jsonl", "kube.db", "versions.json"):
+        path = os.path.join(data_dir, file_name)
+        if os.path.exists(path):
+            os.remove(path)
+    shutil.rmtree(os.path.join(data_dir, "archive"), ignore_errors=True)
+
+    active = [loan for loan in loans if loan[6] is None]
+    return {"utensils": utensils, "borrowers": borrowers, "borrowings": borrowings, "active": len(active),
+            "overdue": sum(1 for loan in active if loan[5] <= today)}
@@ -0,0 +1,194 @@
+import json
+import os
+import platform
+import shutil
+import statistics
+import tempfile
+import time
+import tracemalloc
+
+from kube.engine import KubeEngine
+from kube.export import iter_export_rows, write_csv
+
+# Differences below these are timer and allocator noise, whatever the ratio
+NOISE_FLOOR = {"best_ms": 1.0, "peak_kib": 64}
+
+
+class BenchContext:
+    """A loaded engine on a scratch copy of the generated data, so saves and loans leave the set untouched"""
+
+    def __init__(self, data_dir):
+        self.data_dir = data_dir
+        self.scratch_dir = tempfile.mkdtemp(prefix="kube-bench-")
+        self.work_dir = os.path.join(self.scratch_dir, "kube_data")
+        shutil.copytree(data_dir, self.work_dir)
+        self.export_file = os.path.join(self.scratch_dir, "export.csv")
+        self.engine = KubeEngine(self.work_dir)
+        self.engine.load_data()
+        self.utensil_ids = [u["id"] for u in self.engine.utensils]
+        self.loans = 0
+
+    def close(self):
+        self.engine.close()
+        shutil.rmtree(self.scratch_dir, ignore_errors=True)
+
+
+def bench_load_data(ctx):
+    engine = KubeEngine(ctx.data_dir)
+    engine.load_data()
+    engine.writer.stop()
+
+
+def _save(name):
+    def bench(ctx):
+        getattr(ctx.engine, name)()
+        ctx.engine.writer.flush()
+    return bench
+
+
+def bench_is_overdue(ctx):
+    is_overdue = ctx.engine.is_overdue
+    return sum(1 for borrowing in ctx.engine.borrowings if is_overdue(borrowing))
+
+
+def _new_loans(ctx, count):
+    """Loans for borrowers who have none yet, so the borrow limit never gets in the way"""
+    loans = []
+    for _ in range(count):
+        ctx.loans += 1
+        utensil_id = ctx.utensil_ids[ctx.loans % len(ctx.utensil_ids)]
+        loans.append((f"Bench Borrower {ctx.loans}", {utensil_id: 1}, "2099-12-31", {}))
+    return loans
+
+
+def bench_borrow_return(ctx):
+    """200 borrows and their returns as one transaction, the processing cost without per-loan fsyncs"""
+    engine = ctx.engine
+    with engine.transaction():
+        borrowed = [engine.borrow_items(*loan)[0] for loan in _new_loans(ctx, 200)]
+        for borrowing in borrowed:
+            engine.return_items([(borrowing, 1, "Good", "")])
+
+
+def bench_borrow_single(ctx):
+    """One borrow committed to disk, what a click on Borrow costs"""
+    ctx.engine.borrow_items(*_new_loans(ctx, 1)[0])
+
+
+def bench_search_index_build(ctx):
+    ctx.engine._search_index = None
+    return len(ctx.engine.search_borrowings("santos"))
+
+
+def _search(term, status):
+    def bench(ctx):
+        return len(ctx.engine.search_borrowings(term, status))
+    return bench
+
+
+def bench_dashboard(ctx):
+    ctx.engine.get_dashboard_stats()
+    ctx.engine.get_recent_activity()
+
+
+def bench_transaction_log_order(ctx):
+    ctx.engine._log_order = None
+    ctx.engine.get_transaction_log_order()
+
+
+def bench_export_csv(ctx):
+    engine = ctx.engine
+    rows = iter_export_rows(list(engine.borrowings), today=engine.overdue_index.today)
+    return write_csv(ctx.export_file, rows)
+
+
+BENCHMARKS = [
+    ("load_data", bench_load_data),
+    ("save_utensils", _save("save_utensils")),
+    ("save_borrowings", _save("save_borrowings")),
+    ("save_borrowers", _save("save_borrowers")),
+    ("save_settings", _save("save_settings")),
+    ("save_admin", _save("save_admin")),
+    ("is_overdue_all", bench_is_overdue),
+    ("borrow_return_200", bench_borrow_return),
+    ("borrow_single", bench_borrow_single),
+    ("search_index_build", bench_search_index_build),
+    ("search_name", _search("santos", "All")),
+    ("search_active", _search("", "Active")),
+    ("search_overdue", _search("", "Overdue")),
+    ("dashboard", bench_dashboard),
+    ("transaction_log_order", bench_transaction_log_order),
+    ("export_csv", bench_export_csv),
+]
+
+
+def measure(bench, ctx, repeat):
+    """(best, median) wall time in seconds over repeat runs"""
+    times = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        bench(ctx)
+        times.append(time.perf_counter() - started)
+    return min(times), statistics.median(times)
+
+
+def measure_peak(bench, ctx):
+    """Peak bytes Python allocated during one run, traced separately since tracing slows everything down"""
+    tracemalloc.start()
+    try:
+        bench(ctx)
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def run_benchmarks(data_dir, repeat=3, only=None, memory=True, on_result=None):
+    """Run the suite against a generated data folder, returns {name: result}"""
+    results = {}
+    ctx = BenchContext(data_dir)
+    try:
+        for name, bench in BENCHMARKS:
+            if only and name not in only:
+                continue
+            best, median = measure(bench, ctx, repeat)
+            result = {"best_ms": round(best * 1000, 3), "median_ms": round(median * 1000, 3)}
+            if memory:
+                result["peak_kib"] = measure_peak(bench, ctx) // 1024
+            results[name] = result
+            if on_result:
+                on_result(name, result)
+    finally:
+        ctx.close()
+    return results
+
+
+def save_baseline(file_path, scale, results):
+    with open(file_path, 'w') as f:
+        json.dump({"scale": scale, "python": platform.python_version(), "machine": platform.machine(),
+                   "results": results}, f, indent=2, sort_keys=True)
+
+
+def load_baseline(file_path):
+    with open(file_path, 'r') as f:
+        return json.load(f)
+
+
+def compare(results, baseline, tolerance=0.25):
+    """Rows of (name, metric, baseline, now, ratio, regressed) for metrics both runs have
+
+    Time compares the best run, memory the traced peak. A metric regressed
+    when it grew by more than tolerance (0.25 = 25%) and by more than its
+    noise floor.
+    """
+    rows = []
+    for name, result in results.items():
+        before = baseline["results"].get(name)
+        if before is None:
+            continue
+        for metric in ("best_ms", "peak_kib"):
+            if metric not in result or metric not in before:
+                continue
+            ratio = result[metric] / before[metric] if before[metric] else 1.0
+            regressed = ratio > 1 + tolerance and result[metric] - before[metric] > NOISE_FLOOR[metric]
+            rows.append((name, metric, before[metric], result[metric], ratio, regressed))
+    return rows
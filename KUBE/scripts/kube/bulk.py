@@ -0,0 +1,220 @@
+import csv
+import json
+import sys
+from datetime import datetime
+from itertools import islice
+
+from kube.records import CONDITIONS
+
+DEFAULT_CHUNK_SIZE = 5000
+
+
+def read_rows(file_path, file_format=None):
+    """Yield (line_number, row) from a CSV file with a header row or a JSON Lines file, "-" reads stdin
+
+    The format follows the extension (.jsonl/.ndjson) unless given. Rows
+    are read lazily so files far larger than memory can be imported.
+    """
+    if file_format is None:
+        file_format = "jsonl" if file_path.endswith((".jsonl", ".ndjson")) else "csv"
+
+    f = sys.stdin if file_path == "-" else open(file_path, 'r', newline='', encoding='utf-8')
+    try:
+        if file_format == "csv":
+            reader = csv.DictReader(f)
+            for row in reader:
+                # Blank cells mean "not given", the same as a missing JSON key
+                yield reader.line_num, {key: value for key, value in row.items() if key and value not in (None, "")}
+        else:
+            for line_number, line in enumerate(f, 1):
+                if not line.strip():
+                    continue
+                try:
+                    row = json.loads(line)
+                except ValueError:
+                    yield line_number, None
+                    continue
+                yield line_number, row if isinstance(row, dict) else None
+    finally:
+        if f is not sys.stdin:
+            f.close()
+
+
+def chunked(rows, size=DEFAULT_CHUNK_SIZE):
+    """Group an iterable into lists of at most size items"""
+    rows = iter(rows)
+    while True:
+        chunk = list(islice(rows, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def _text(row, key, default=None):
+    value = row.get(key, default)
+    if value is None:
+        raise ValueError(f"Missing {key}")
+    value = str(value).strip()
+    if not value:
+        raise ValueError(f"Missing {key}")
+    return value
+
+
+def _int(row, key, default=None):
+    value = row.get(key, default)
+    if value is None:
+        raise ValueError(f"Missing {key}")
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"{key} must be a whole number, got {value!r}") from None
+
+
+def parse_date(row, key, default=None, required=False):
+    """A YYYY-MM-DD date as the zero-padded string the rest of KUBE compares and sorts"""
+    value = row.get(key, default)
+    if value is None:
+        if required:
+            raise ValueError(f"Missing {key}")
+        return None
+    try:
+        # fromisoformat() would also take 20250101 or 2025-W01-1
+        return datetime.strptime(str(value), "%Y-%m-%d").date().isoformat()
+    except ValueError:
+        raise ValueError(f"{key} must be a YYYY-MM-DD date, got {value!r}") from None
+
+
+def find_utensil(engine, row):
+    """Look a utensil up by utensil_id, or by utensil name"""
+    if "utensil_id" in row:
+        utensil = engine.utensils_by_id.get(_int(row, "utensil_id"))
+    else:
+        utensil = engine.utensils_by_name.get(_text(row, "utensil"))
+    if utensil is None:
+        raise ValueError("Utensil not found")
+    return utensil
+
+
+def parse_borrow(engine, row):
+    """Arguments for engine.borrow_items() from a row
+
+    borrower, due_date, optional phone, email and borrow_date, then either
+    utensil or utensil_id with quantity, or an items list of those.
+    """
+    if not isinstance(row, dict):
+        raise ValueError("Not a JSON object")
+    items = row.get("items", [row])
+    if not isinstance(items, list) or not all(isinstance(item, dict) for item in items):
+        raise ValueError("items must be a list of objects")
+    quantities = {}
+    for item in items:
+        utensil = find_utensil(engine, item)
+        quantities[utensil["id"]] = quantities.get(utensil["id"], 0) + _int(item, "quantity", 1)
+    contact_info = {key: str(row[key]) for key in ("phone", "email") if key in row}
+    return (_text(row, "borrower"), quantities, parse_date(row, "due_date", required=True), contact_info,
+            parse_date(row, "borrow_date"))
+
+
+def apply_borrow(engine, row):
+    return engine.borrow_items(*parse_borrow(engine, row))
+
+
+def find_borrowing(engine, row):
+    """The borrowing named by id, or the oldest active one for borrower and utensil"""
+    if "id" in row:
+        borrowing = engine.borrowings_by_id.get(_int(row, "id"))
+        if borrowing is None:
+            raise ValueError("Borrowing not found")
+        return borrowing
+
+    borrower_name = _text(row, "borrower")
+    utensil_name = _text(row, "utensil")
+    for borrowing_id in engine.borrower_view.all_borrowing_ids(borrower_name):
+        borrowing = engine.borrowings_by_id[borrowing_id]
+        if not borrowing.get("returned", False) and borrowing["utensil_name"] == utensil_name:
+            return borrowing
+    raise ValueError(f"No active borrowing of {utensil_name} for {borrower_name}")
+
+
+def parse_return(engine, row):
+    """(borrowing, quantity, condition, notes) for engine.return_items() from a row
+
+    id, or borrower and utensil, optional quantity (default all), condition and notes.
+    """
+    if not isinstance(row, dict):
+        raise ValueError("Not a JSON object")
+    borrowing = find_borrowing(engine, row)
+    condition = _text(row, "condition", "Good")
+    if condition not in CONDITIONS:
+        raise ValueError(f"condition must be one of {', '.join(CONDITIONS)}")
+    quantity = _int(row, "quantity", borrowing["quantity"])
+    return borrowing, quantity, condition, str(row.get("notes", ""))
+
+
+def apply_return(engine, row):
+    """A return row, optionally with a return_date"""
+    engine.return_items([parse_return(engine, row)], return_date=parse_date(row, "return_date"))
+
+
+def apply_utensil(engine, row):
+    """name, category and quantity add or update a utensil, action=delete removes it
+
+    An id picks the utensil to update or delete, otherwise it is matched by name.
+    """
+    if not isinstance(row, dict):
+        raise ValueError("Not a JSON object")
+    action = str(row.get("action", "upsert")).strip().lower()
+    if action not in ("upsert", "delete"):
+        raise ValueError(f"action must be upsert or delete, got {action!r}")
+
+    if "id" in row:
+        utensil = engine.utensils_by_id.get(_int(row, "id"))
+        if utensil is None:
+            raise ValueError("Utensil not found")
+    else:
+        utensil = engine.utensils_by_name.get(_text(row, "name"))
+
+    if action == "delete":
+        if utensil is None:
+            raise ValueError("Utensil not found")
+        engine.delete_utensil(utensil)
+    elif utensil is None:
+        engine.add_utensil(_text(row, "name"), str(row.get("category", "")), _int(row, "quantity"))
+    else:
+        engine.update_utensil(utensil, _text(row, "name", utensil["name"]),
+                              str(row.get("category", utensil.get("category", ""))),
+                              _int(row, "quantity", utensil["quantity"]))
+
+
+APPLY = {
+    "borrows": apply_borrow,
+    "returns": apply_return,
+    "utensils": apply_utensil,
+}
+
+
+def import_rows(engine, kind, rows, chunk_size=DEFAULT_CHUNK_SIZE, on_chunk=None):
+    """Apply (line_number, row) pairs chunk by chunk, one engine.transaction() per chunk
+
+    Each row is its own transaction and a row that fails validation is
+    skipped without touching the data. Returns (applied, errors) where
+    errors lists (line_number, message). Raises IOError if a chunk could
+    not be saved, everything before it is on disk.
+    """
+    apply = APPLY[kind]
+    applied = 0
+    errors = []
+    for chunk in chunked(rows, chunk_size):
+        try:
+            with engine.transaction():
+                for line_number, row in chunk:
+                    try:
+                        apply(engine, row)
+                        applied += 1
+                    except ValueError as e:
+                        errors.append((line_number, str(e)))
+        except IOError:
+            raise IOError(f"Could not save the batch ending at line {chunk[-1][0]}") from None
+        if on_chunk:
+            on_chunk(applied, errors)
+    return applied, errors
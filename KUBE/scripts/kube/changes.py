@@ -0,0 +1,39 @@
+from collections import deque
+
+
+class ChangeFeed:
+    """Numbered log of changed record keys, so a screen built once can catch up on just those rows
+
+    reset() marks a whole collection as replaced. Screens that last synced
+    before a reset, or before entries the bounded log has since dropped,
+    are told to rebuild instead.
+    """
+
+    def __init__(self, capacity=10000):
+        self.version = 0
+        self.log = deque(maxlen=capacity)
+        self.resets = {}
+        self.dropped = 0
+
+    def changed(self, collection, keys):
+        for key in keys:
+            if len(self.log) == self.log.maxlen:
+                self.dropped = self.log[0][0]
+            self.version += 1
+            self.log.append((self.version, collection, key))
+
+    def reset(self, collection):
+        self.version += 1
+        self.resets[collection] = self.version
+
+    def since(self, version, collection):
+        """Keys of collection changed after version, None when the screen has to rebuild"""
+        if self.resets.get(collection, 0) > version or self.dropped > version:
+            return None
+        keys = set()
+        for entry_version, entry_collection, key in reversed(self.log):
+            if entry_version <= version:
+                break
+            if entry_collection == collection:
+                keys.add(key)
+        return keys
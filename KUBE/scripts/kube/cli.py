@@ -0,0 +1,144 @@
+import argparse
+import csv
+import sys
+
+from kube.bulk import DEFAULT_CHUNK_SIZE, import_rows, read_rows
+from kube.engine import KubeEngine
+from kube.export import iter_export_rows, write_csv
+from kube.reports import WINDOWS
+
+REPORT_FIELDS = ["Name", "Loans", "Qty Borrowed", "Avg Loan Days", "Late Return Rate", "Peak Out"]
+STATUSES = ("Active", "Returned", "Overdue")
+
+
+def open_engine(data_dir):
+    """Load the data directory the way the window does, None once the trial has expired"""
+    engine = KubeEngine(data_dir)
+    if not engine.check_trial():
+        engine.writer.stop()
+        return None
+    engine.load_data()
+    return engine
+
+
+def cmd_import(engine, args):
+    def progress(applied, errors):
+        print(f"{applied} applied, {len(errors)} rejected", file=sys.stderr)
+
+    applied, errors = import_rows(engine, args.kind, read_rows(args.file, args.format), args.chunk_size,
+                                  on_chunk=progress if args.verbose else None)
+    for line_number, message in errors[:args.max_errors]:
+        print(f"{args.file}:{line_number}: {message}", file=sys.stderr)
+    if len(errors) > args.max_errors:
+        print(f"... and {len(errors) - args.max_errors} more", file=sys.stderr)
+    print(f"Imported {applied} {args.kind} row(s), rejected {len(errors)}")
+    return 1 if errors else 0
+
+
+def cmd_export(engine, args):
+    statuses = set(args.status) if args.status else None
+    with engine.data_lock:
+        borrowings = engine.export_borrowings(args.start, args.end, statuses)
+    rows = iter_export_rows(borrowings, args.start, args.end, statuses, today=engine.overdue_index.today)
+    count = write_csv(args.file, rows)
+    print(f"Exported {count} record(s) to {args.file}")
+    return 0
+
+
+def report_rows(rows):
+    for row in rows:
+        mean_days = "N/A" if row["mean_loan_days"] is None else f"{row['mean_loan_days']:.1f}"
+        late_rate = "N/A" if row["late_rate"] is None else f"{row['late_rate']:.0%}"
+        yield [row["name"], row["loans"], row["quantity"], mean_days, late_rate, row["peak"]]
+
+
+def cmd_report(engine, args):
+    with engine.data_lock:
+        prepared = engine.report_engine.prepare(engine.report_history(), engine.utensils, args.group_by)
+    rows = list(report_rows(engine.report_engine.run(prepared, [args.window])[args.window]))
+
+    if args.output:
+        with open(args.output, 'w', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(REPORT_FIELDS)
+            writer.writerows(rows)
+        print(f"Wrote {len(rows)} row(s) to {args.output}")
+        return 0
+
+    widths = [max(len(str(value)) for value in column) for column in zip(REPORT_FIELDS, *rows)]
+    for values in [REPORT_FIELDS] + rows:
+        print("  ".join(str(value).ljust(width) for value, width in zip(values, widths)).rstrip())
+    return 0
+
+
+def cmd_archive(engine, args):
+    try:
+        moved = engine.archive_borrowings(args.older_than)
+    except ValueError as e:
+        print(e, file=sys.stderr)
+        return 2
+    print(f"Archived {moved} returned loan(s), {len(engine.archive)} in the archive")
+    return 0
+
+
+def cmd_serve(engine, args):
+    from kube.server import run
+
+    print(f"Serving {args.data_dir} on http://{args.host}:{args.port}/, Ctrl+C to stop", file=sys.stderr)
+    for route, latency in run(engine, args.host, args.port, args.token).items():
+        print(f"{route}: {latency}", file=sys.stderr)
+    return 0
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="python -m kube", description="KUBE batch import, export and reports")
+    parser.add_argument("--data-dir", default="kube_data", help="data folder (default: kube_data)")
+    commands = parser.add_subparsers(dest="command")
+    commands.required = True
+
+    import_parser = commands.add_parser("import", help="apply borrows, returns or utensil changes from a file")
+    import_parser.add_argument("kind", choices=["borrows", "returns", "utensils"])
+    import_parser.add_argument("file", help="CSV with a header row or JSON Lines, - for stdin")
+    import_parser.add_argument("--format", choices=["csv", "jsonl"], help="default: from the file extension")
+    import_parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE,
+                               help=f"rows per commit (default: {DEFAULT_CHUNK_SIZE})")
+    import_parser.add_argument("--max-errors", type=int, default=50, help="rejected rows to list (default: 50)")
+    import_parser.add_argument("-v", "--verbose", action="store_true", help="report progress after each chunk")
+    import_parser.set_defaults(run=cmd_import)
+
+    export_parser = commands.add_parser("export", help="export the transaction log to CSV")
+    export_parser.add_argument("file")
+    export_parser.add_argument("--from", dest="start", help="first borrow date, YYYY-MM-DD")
+    export_parser.add_argument("--to", dest="end", help="last borrow date, YYYY-MM-DD")
+    export_parser.add_argument("--status", action="append", choices=STATUSES, help="repeat to include several")
+    export_parser.set_defaults(run=cmd_export)
+
+    report_parser = commands.add_parser("report", help="print a utilization report")
+    report_parser.add_argument("--window", choices=list(WINDOWS), default="Last 30 days")
+    report_parser.add_argument("--group-by", choices=["Utensil", "Category"], default="Utensil")
+    report_parser.add_argument("-o", "--output", help="write CSV here instead of printing a table")
+    report_parser.set_defaults(run=cmd_report)
+
+    archive_parser = commands.add_parser("archive", help="move old returned loans to the monthly archive files")
+    archive_parser.add_argument("--older-than", type=int, metavar="DAYS",
+                                help="days since the return (default: the archive_after_days setting, else 365)")
+    archive_parser.set_defaults(run=cmd_archive)
+
+    serve_parser = commands.add_parser("serve", help="serve the HTTP/JSON API for other stations")
+    serve_parser.add_argument("--host", default="127.0.0.1", help="default: 127.0.0.1, this machine only")
+    serve_parser.add_argument("--port", type=int, default=8765)
+    serve_parser.add_argument("--token", help="require an Authorization: Bearer <token> header")
+    serve_parser.set_defaults(run=cmd_serve)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    engine = open_engine(args.data_dir)
+    if engine is None:
+        print("Trial period expired", file=sys.stderr)
+        return 2
+    try:
+        return args.run(engine, args)
+    finally:
+        engine.close()
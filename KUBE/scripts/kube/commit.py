@@ -0,0 +1,101 @@
+import json
+import os
+
+# Operations making up a group commit:
+#   ("replace", path, payload)    rewrite a whole file, payload is str or bytes (a callable returning one
+#                                 from a writer job, called after data_lock is released)
+#   ("truncate", path)            empty a file (a journal folded into a snapshot)
+#   ("remove", path)              delete a file if it exists (a snapshot replaced by one in another format)
+#   ("append", path, lines)       append journal lines
+#   ("sqlite", store, kind, data) one write in the store's transaction, see SQLiteStore.write_batch
+#   ("rollback", fn)              undo in-memory bookkeeping if the commit fails
+
+
+def _fsync_write(path, data, mode='w'):
+    with open(path, mode) as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+
+
+def commit_group(ops, manifest_file):
+    """Write every file change in ops as one all-or-nothing group
+
+    New file contents go to temp files and are fsynced together, then a
+    manifest listing the renames and appends is written. Applying the
+    manifest is idempotent, so recover_group() can roll an interrupted
+    commit forward on the next start.
+
+    SQLite writes commit first, in the store's own transaction, and are
+    not covered by the manifest: a crash between the two keeps them but
+    loses the group's file changes, version stamps included, so other
+    instances only pick them up with the next commit. A failure there
+    still raises, and the writer's caller reloads from what is on disk.
+    """
+    sqlite_ops = {}
+    appends = {}
+    manifest = {"replace": [], "truncate": [], "remove": [], "append": []}
+    for op in ops:
+        kind = op[0]
+        if kind == "sqlite":
+            sqlite_ops.setdefault(id(op[1]), (op[1], []))[1].append((op[2], op[3]))
+        elif kind == "replace":
+            tmp_file = op[1] + ".tmp"
+            _fsync_write(tmp_file, op[2], 'wb' if isinstance(op[2], bytes) else 'w')
+            manifest["replace"].append([tmp_file, op[1]])
+        elif kind == "truncate":
+            manifest["truncate"].append(op[1])
+        elif kind == "remove":
+            manifest["remove"].append(op[1])
+        elif kind == "append":
+            appends.setdefault(op[1], []).extend(op[2])
+
+    for path, lines in appends.items():
+        # Appends land after truncates when the manifest is applied
+        size = 0 if path in manifest["truncate"] or not os.path.exists(path) else os.path.getsize(path)
+        manifest["append"].append([path, "".join(lines), size])
+
+    for store, writes in sqlite_ops.values():
+        store.write_batch(writes)
+
+    if not any(manifest.values()):
+        return
+
+    _fsync_write(manifest_file + ".tmp", json.dumps(manifest))
+    os.replace(manifest_file + ".tmp", manifest_file)
+    _apply_manifest(manifest)
+    os.remove(manifest_file)
+
+
+def _apply_manifest(manifest):
+    for tmp_file, path in manifest["replace"]:
+        if os.path.exists(tmp_file):
+            os.replace(tmp_file, path)
+    for path in manifest["truncate"]:
+        open(path, 'w').close()
+    for path in manifest.get("remove", ()):
+        if os.path.exists(path):
+            os.remove(path)
+    for path, data, size in manifest["append"]:
+        with open(path, 'ab') as f:
+            # Cut back to the size before the commit, a retry drops what an interrupted attempt wrote
+            f.truncate(size)
+            f.write(data.encode("utf-8"))
+            f.flush()
+            os.fsync(f.fileno())
+
+
+def recover_group(manifest_file):
+    """Finish a group commit that was interrupted by a crash"""
+    if not os.path.exists(manifest_file):
+        return False
+    with open(manifest_file, 'r') as f:
+        _apply_manifest(json.load(f))
+    os.remove(manifest_file)
+    return True
+
+
+def rollback(ops):
+    for op in ops:
+        if op[0] == "rollback":
+            op[1]()
@@ -0,0 +1,185 @@
+import os
+from operator import attrgetter
+
+from kube.aggregates import borrower_key
+from kube.overdue import date_ordinal
+from kube.records import Borrowing
+
+COUNTERS = ("credit_score", "total_borrowings", "on_time_returns", "late_returns", "damaged_items")
+# Below this many events a replay is cheaper in-process than shipped to workers
+POOL_MIN_EVENTS = 200000
+
+BORROW = 0
+RETURN = 1
+
+
+def new_borrower(name, contact_info):
+    return {
+        "name": name,
+        "credit_score": 100,
+        "total_borrowings": 0,
+        "on_time_returns": 0,
+        "late_returns": 0,
+        "damaged_items": 0,
+        "contact_info": contact_info,
+    }
+
+
+def late_days(due_date, return_date):
+    """Days a return came after its due date, 0 on the due date itself, None when it was on time
+
+    A loan counts as overdue from its due date on (see OverdueIndex), so a
+    return that day is late as well.
+    """
+    if not due_date or not return_date:
+        return None
+    days = date_ordinal(return_date) - date_ordinal(due_date)
+    return days if days >= 0 else None
+
+
+def score_borrow(borrower):
+    borrower["total_borrowings"] += 1
+
+
+def score_return(borrower, late_days, condition):
+    """Apply the point system for one returned loan, late_days as from late_days()
+
+    A return before the due date is on time (+5), one on or after it is
+    late (-10 to -25 by days). Damaged or lost items cost 50 more,
+    excellent condition adds 2. The 10th on-time return with no late or
+    damaged ones before it earns a one-off +25; the old rule checked 10
+    loans, but loans were counted twice, once on the borrow and again on
+    the return, so it fired at an arbitrary point.
+    """
+    if late_days is not None:
+        borrower["late_returns"] += 1
+        # Scale penalty: -10 up to a day late, up to -25 for 8+ days
+        if late_days <= 1:
+            penalty = -10
+        elif late_days <= 3:
+            penalty = -15
+        elif late_days <= 7:
+            penalty = -20
+        else:
+            penalty = -25
+        borrower["credit_score"] = max(0, borrower["credit_score"] + penalty)
+    else:
+        borrower["on_time_returns"] += 1
+        # +5 points for on-time return
+        borrower["credit_score"] = min(100, borrower["credit_score"] + 5)
+
+    # Check for damaged/lost items
+    if condition in ["Damaged", "Lost"]:
+        borrower["damaged_items"] += 1
+        # -50 points for damaged/lost items
+        borrower["credit_score"] = max(0, borrower["credit_score"] - 50)
+    elif condition == "Excellent":
+        # +2 bonus for excellent condition
+        borrower["credit_score"] = min(100, borrower["credit_score"] + 2)
+
+    # Perfect history milestone bonus (+25 points) on the 10th clean return
+    if borrower["on_time_returns"] == 10 and borrower["late_returns"] == 0 and borrower["damaged_items"] == 0:
+        borrower["credit_score"] = min(100, borrower["credit_score"] + 25)
+
+
+def build_events(borrowings, tracked_from=None, archived_origins=None):
+    """Group Borrowing records (or plain dicts) into per-borrower event lists, {key: (name, contact_info, events)}
+
+    Partial-return remainders are not new borrows. Records with ids from
+    tracked_from on carry split_from when they are one. Older records count
+    as a remainder when an earlier returned record has the same borrower,
+    utensil, borrow date and due date, archived_origins maps those of
+    archived records to their ids.
+    """
+    by_key = {}
+    returned_origins = set()
+    archived_origins = archived_origins or {}
+    records = (Borrowing.from_dict(b) if isinstance(b, dict) else b for b in borrowings)
+    for borrowing in sorted(records, key=attrgetter("id")):
+        # Plain attribute reads, a million mapping-style lookups add up
+        name = borrowing.borrower_name
+        key = borrower_key(name)
+        entry = by_key.get(key)
+        if entry is None:
+            entry = by_key[key] = (name, getattr(borrowing, "contact_info", {}), [])
+        events = entry[2]
+
+        borrow_date = borrowing.borrow_date
+        due_date = getattr(borrowing, "due_date", None)
+        origin = (key, borrowing.utensil_id, borrow_date, due_date)
+        if tracked_from is not None and borrowing.id >= tracked_from:
+            is_split = getattr(borrowing, "split_from", None) is not None
+        else:
+            is_split = origin in returned_origins or archived_origins.get(origin, borrowing.id) < borrowing.id
+        if not is_split:
+            events.append((date_ordinal(borrow_date), BORROW, borrowing.id, 0, None))
+        if getattr(borrowing, "returned", False):
+            returned_origins.add(origin)
+            return_date = getattr(borrowing, "return_date", None)
+            returned_on = date_ordinal(return_date) if return_date else 0
+            events.append((returned_on, RETURN, borrowing.id, late_days(due_date, return_date),
+                           getattr(borrowing, "return_condition", "Good")))
+    return by_key
+
+
+def replay_chunk(chunk, baseline=None):
+    """Recompute borrowers for {key: (name, contact_info, events)}, from their baseline counters if they have one"""
+    borrowers = {}
+    for key, (name, contact_info, events) in chunk.items():
+        borrower = new_borrower(name, contact_info)
+        if baseline and key in baseline:
+            for field in COUNTERS:
+                borrower[field] = baseline[key][field]
+        # Same-day borrows come before returns, ties in creation order
+        events.sort()
+        for _, kind, _, late_days, condition in events:
+            if kind == BORROW:
+                score_borrow(borrower)
+            else:
+                score_return(borrower, late_days, condition)
+        borrowers[key] = borrower
+    return borrowers
+
+
+def replay(borrowings, tracked_from=None, workers=None):
+    """Rebuild every borrower's score and counters from the borrowing history, in chronological order"""
+    return replay_events(build_events(borrowings, tracked_from), workers)
+
+
+def replay_events(by_key, workers=None, baseline=None):
+    """Replay the output of build_events(), split into chunks of borrowers across processes when large
+
+    baseline holds the counters of borrowers whose older history was
+    archived (see kube.archive), the events continue from there. Borrowers
+    only found in the baseline come back as they are.
+    """
+    borrowers = {key: dict(data) for key, data in (baseline or {}).items() if key not in by_key}
+    event_count = sum(len(events) for _, _, events in by_key.values())
+    workers = workers or os.cpu_count() or 1
+    if workers < 2 or event_count < POOL_MIN_EVENTS:
+        borrowers.update(replay_chunk(by_key, baseline))
+        return borrowers
+
+    chunks = [{} for _ in range(workers * 4)]
+    for i, (key, entry) in enumerate(by_key.items()):
+        chunks[i % len(chunks)][key] = entry
+    from concurrent.futures import ProcessPoolExecutor
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        baselines = [{key: baseline[key] for key in chunk if key in baseline} if baseline else None for chunk in chunks]
+        for result in pool.map(replay_chunk, chunks, baselines):
+            borrowers.update(result)
+    return borrowers
+
+
+def verify(stored, rebuilt):
+    """List (key, field, stored, expected) for every counter that drifted from the replay"""
+    mismatches = []
+    for key in sorted(set(stored) | set(rebuilt)):
+        current = stored.get(key, {})
+        expected = rebuilt.get(key)
+        if expected is None:
+            continue  # No history to replay, leave as is
+        for field in COUNTERS:
+            if current.get(field) != expected[field]:
+                mismatches.append((key, field, current.get(field), expected[field]))
+    return mismatches
@@ -0,0 +1,1068 @@
+import hashlib
+import heapq
+import json
+import logging
+import os
+import threading
+import traceback
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta
+from itertools import chain
+
+from kube.activity import RecentActivity
+from kube.aggregates import BorrowerAggregates, borrower_key
+from kube.archive import MIN_ARCHIVE_DAYS, BorrowingArchive, log_key
+from kube.changes import ChangeFeed
+from kube.commit import recover_group
+from kube.credit import COUNTERS, build_events, replay_events, verify
+from kube.journal import BorrowingJournal
+from kube.overdue import OverdueIndex, date_ordinal, today_ordinal
+from kube.packed import LazyBorrowingMap, LazyBorrowings
+from kube.profiling import Profiler
+from kube.records import Utensil, Borrowing, Borrower, IdAllocator, record_to_json
+from kube.reports import ReportEngine
+from kube.search import TrigramIndex
+from kube.shared import SharedDataDir
+from kube.writer import WriteBehindWriter
+
+log = logging.getLogger(__name__)
+
+
+class KubeEngine:
+    """Data files, indexes and transactions behind the KUBE window, usable without a display"""
+
+    # Methods timed while profiling is on, see set_profiling()
+    PROFILED = ("load_data", "_load_json", "refresh", "save_utensils", "save_borrowings", "save_borrowers",
+                "save_settings", "save_admin", "is_overdue", "borrow_items", "return_items")
+
+    def __init__(self, data_dir="kube_data"):
+        # File paths
+        self.data_dir = data_dir
+        self.utensils_file = os.path.join(self.data_dir, "utensils.json")
+        self.borrowings_file = os.path.join(self.data_dir, "borrowings.json")
+        self.admin_file = os.path.join(self.data_dir, "admin.json")
+        self.trial_file = os.path.join(self.data_dir, "trial.json")
+        self.settings_file = os.path.join(self.data_dir, "settings.json")
+        self.borrowers_file = os.path.join(self.data_dir, "borrowers.json")
+        self.db_file = os.path.join(self.data_dir, "kube.db")
+        self.commit_file = os.path.join(self.data_dir, "commit.json")
+
+        if not os.path.exists(self.data_dir):
+            os.makedirs(self.data_dir)
+
+        self.borrowings_journal = BorrowingJournal(self.borrowings_file)
+        self.archive = BorrowingArchive(self.data_dir)
+        self.store = None
+        self.pending_borrowings = {}
+        # Borrowers to rescore once the current batch() ends, None outside a batch
+        self._deferred_rescore = None
+
+        # Other KUBE processes may use the same folder: commits hold its lock and bump
+        # versions.json, and refresh() reloads whatever the others changed
+        self.shared = SharedDataDir(self.data_dir, self.commit_file, self._collections_of)
+        self.shared.on_commit = self._committed
+        self.shared.on_conflict = self._rejected
+        self._transaction_depth = 0
+        # Messages about background saves that were refused, see take_save_errors()
+        self.save_errors = []
+        # How far into the journal (or the borrowings table) this instance has read
+        self.journal_offset = 0
+        self.borrowings_seq = 0
+        # Keys of the utensils, borrowings and borrowers changed so far, for screens kept between visits
+        self.changes = ChangeFeed()
+
+        # Disk writes happen on the writer thread, which snapshots data under data_lock
+        # and group-commits it
+        self.data_lock = threading.RLock()
+        self.writer = WriteBehindWriter(self.data_lock, self.commit_file, shared=self.shared)
+
+        # Off unless KUBE_PROFILE is set or the profiling setting is on once the settings load
+        self.profiler = Profiler()
+        if os.environ.get("KUBE_PROFILE"):
+            self.set_profiling(True)
+
+    def check_trial(self):
+        """Check if trial period is still valid"""
+        if not os.path.exists(self.trial_file):
+            trial_data = {
+                "start_date": datetime.now().isoformat(),
+                "trial_days": 30
+            }
+            with open(self.trial_file, 'w') as f:
+                json.dump(trial_data, f)
+            self.trial_data = trial_data
+            return True
+
+        with open(self.trial_file, 'r') as f:
+            trial_data = json.load(f)
+        self.trial_data = trial_data
+
+        start_date = datetime.fromisoformat(trial_data["start_date"])
+        trial_days = trial_data["trial_days"]
+        expiry_date = start_date + timedelta(days=trial_days)
+
+        return datetime.now() <= expiry_date
+
+    def profiled_methods(self):
+        return self.PROFILED
+
+    def set_profiling(self, enabled):
+        """Start or stop timing the profiled methods and writer flushes, which run unwrapped while off"""
+        if enabled == self.profiler.enabled:
+            return
+        if enabled:
+            self.profiler.attach(self, self.profiled_methods())
+            self.profiler.attach(self.writer, ("flush",), prefix="writer.")
+        else:
+            self.profiler.detach()
+
+    def trial_days_left(self):
+        """Whole days left in the trial, from the trial.json check_trial() read"""
+        start_date = datetime.fromisoformat(self.trial_data["start_date"])
+        return max(0, self.trial_data["trial_days"] - (datetime.now() - start_date).days)
+
+    def load_data(self):
+        """Load all data from JSON files or the SQLite database"""
+        with self.shared:
+            self.shared.mark_synced(self.shared.changed(force=True))
+            self._load_collections()
+            self._committed(())
+            if self.settings.get("profiling"):
+                self.set_profiling(True)
+            # Write the defaults created above before another instance looks
+            if not self.writer.flush():
+                raise IOError("Could not save the data folder")
+
+    def _load_collections(self):
+        self.settings = self._load_json(self.settings_file, {"max_borrow_limit": 5})
+        if not os.path.exists(self.settings_file):
+            self.save_settings()
+
+        self.archive.load()
+        self.borrowings_journal.packed = self.settings.get("storage_backend") == "packed"
+        if self.settings.get("storage_backend") == "sqlite":
+            from kube.sqlite_store import SQLiteStore, migrate_json
+            if os.path.exists(self.db_file):
+                self.store = SQLiteStore(self.db_file)
+            else:
+                self.store = migrate_json(self.data_dir, self.db_file)
+            self.utensils = self.store.load_utensils()
+            self.borrowings = self.store.load_borrowings()
+            self.borrowers = self.store.load_borrowers()
+        else:
+            self.load_json_collections()
+
+        self.utensils = [Utensil.from_dict(u) for u in self.utensils]
+        self.borrowings = self._borrowing_records(self.borrowings)
+        self.borrowers = {key: Borrower.from_dict(data) for key, data in self.borrowers.items()}
+        self.build_indexes()
+
+        if "split_tracking_from" not in self.settings:
+            # Partial-return remainders are tagged with split_from from here on, older ones are inferred
+            self.settings["split_tracking_from"] = self.borrowing_ids.next_id
+            self.save_settings()
+
+        if os.path.exists(self.admin_file):
+            with open(self.admin_file, 'r') as f:
+                self.admin_data = json.load(f)
+        else:
+            self.admin_data = {
+                "username": "admin",
+                "password": self.hash_password("admin123")
+            }
+            self.save_admin()
+
+    def _borrowing_records(self, borrowings):
+        """Loaded borrowings as records, a packed snapshot already loads as them and stays undecoded"""
+        if isinstance(borrowings, LazyBorrowings):
+            return borrowings
+        return [b if isinstance(b, Borrowing) else Borrowing.from_dict(b) for b in borrowings]
+
+    def load_json_collections(self):
+        """Load utensils, borrowings and borrowers from JSON files"""
+        if os.path.exists(self.utensils_file):
+            with open(self.utensils_file, 'r') as f:
+                self.utensils = json.load(f)
+        else:
+            self.utensils = [
+                {"id": 1, "name": "Chef Knife", "quantity": 5, "available": 5, "category": "Cutlery"},
+                {"id": 2, "name": "Cutting Board", "quantity": 8, "available": 8, "category": "Preparation"},
+                {"id": 3, "name": "Mixing Bowl", "quantity": 10, "available": 10, "category": "Cookware"},
+                {"id": 4, "name": "Whisk", "quantity": 6, "available": 6, "category": "Utensils"},
+                {"id": 5, "name": "Spatula", "quantity": 7, "available": 7, "category": "Utensils"},
+            ]
+            self.save_utensils()
+
+        self.borrowings = self.borrowings_journal.load()
+        if not self.borrowings_journal.exists():
+            self.save_borrowings()
+
+        self.borrowers = self._load_json(self.borrowers_file, {})
+        if not os.path.exists(self.borrowers_file):
+            self.save_borrowers()
+
+    def build_indexes(self):
+        """Build the id maps, utensil lookup and active-quantity indexes from the loaded data"""
+        self.utensils_by_id = {}
+        self.utensils_by_name = {}
+        for utensil in self.utensils:
+            self.index_utensil(utensil)
+
+        used_utensil_ids = set(self.utensils_by_id)
+        if isinstance(self.borrowings, LazyBorrowings):
+            self._index_packed_borrowings(used_utensil_ids)
+        else:
+            self.borrowings_by_id = {}
+            for borrowing in self.borrowings:
+                self.borrowings_by_id[borrowing["id"]] = borrowing
+                used_utensil_ids.add(borrowing["utensil_id"])
+            self.borrowing_ids = IdAllocator(self.borrowings_by_id)
+            self.overdue_index = OverdueIndex(self.borrowings)
+            self.recent_activity = RecentActivity(self.borrowings)
+            self.borrower_view = BorrowerAggregates(self.borrowings)
+
+        # Ids are never reused, old borrowings keep pointing at deleted utensils by id
+        self.utensil_ids = IdAllocator(used_utensil_ids)
+        self.borrowing_ids.seen(self.archive.index["max_borrowing_id"])
+        self.utensil_ids.seen(self.archive.index["max_utensil_id"])
+
+        self.count_utensils_out()
+        self._search_index = None
+        self.borrower_view.add_names(self.archive.borrower_names())
+        self.report_engine = ReportEngine()
+        self._log_order = None
+        self._log_blocks = {}
+        for collection in ("utensils", "borrowings", "borrowers"):
+            self.changes.reset(collection)
+
+    def _index_packed_borrowings(self, used_utensil_ids):
+        """build_indexes() for a packed snapshot, from its columns so only the newest loans are decoded"""
+        borrowings = self.borrowings
+        self.borrowings_by_id = LazyBorrowingMap(borrowings)
+        due_by_id = {}
+        newest = []
+        rows = []
+        for row, borrowing_id, name, utensil_id, quantity, returned, borrow_day, due_day in borrowings.summaries():
+            used_utensil_ids.add(utensil_id)
+            if not returned and due_day:
+                due_by_id[borrowing_id] = due_day
+            newest.append((borrow_day, borrowing_id, row))
+            rows.append((name, borrowing_id, quantity, returned))
+        self.borrowing_ids = IdAllocator(borrowing_id for _, borrowing_id, _, _ in rows)
+        self.overdue_index = OverdueIndex.from_due(due_by_id)
+        self.recent_activity = RecentActivity()
+        for _, _, row in heapq.nlargest(self.recent_activity.capacity, newest):
+            self.recent_activity.add(borrowings[row])
+        self.borrower_view = BorrowerAggregates.from_rows(rows)
+
+    @property
+    def search_index(self):
+        """Trigram index over borrower and utensil names, built on the first search rather than at startup"""
+        if self._search_index is None:
+            with self.data_lock:
+                if self._search_index is None:
+                    self._search_index = TrigramIndex(self.borrowings)
+        return self._search_index
+
+    def count_utensils_out(self):
+        """Recount the quantity on loan, borrows and returns keep it up to date after that"""
+        self.utensils_out = sum(u["quantity"] - u["available"] for u in self.utensils)
+
+    def index_utensil(self, utensil):
+        self.utensils_by_id[utensil["id"]] = utensil
+        self.utensils_by_name.setdefault(utensil["name"], utensil)
+
+    def unindex_utensil(self, utensil):
+        self.utensils_by_id.pop(utensil["id"], None)
+        if self.utensils_by_name.get(utensil["name"]) is utensil:
+            del self.utensils_by_name[utensil["name"]]
+
+    def get_borrower_key(self, borrower_name):
+        """Normalize a borrower name for lookups"""
+        return borrower_key(borrower_name)
+
+    def _load_json(self, filepath, default):
+        """Helper to load JSON with default fallback"""
+        if os.path.exists(filepath):
+            with open(filepath, 'r') as f:
+                return json.load(f)
+        return default
+
+    def _collections_of(self, op):
+        """Names of the shared collections a commit op writes, for the version stamps
+
+        A journal compaction only bumps borrowings_snapshot, so other
+        instances that already read the journal know nothing else changed.
+        """
+        if op[0] == "sqlite":
+            return {"utensils": ("utensils",), "borrowings": ("borrowings", "borrowings_snapshot"),
+                    "changed_borrowings": ("borrowings",), "archived_borrowings": ("borrowings", "borrowings_snapshot"),
+                    "borrowers": ("borrowers",)}[op[2]]
+        if op[0] == "rollback":
+            return ()
+        if self.archive.is_archive_file(op[1]):
+            return ("archive",)
+        files = {
+            self.utensils_file: ("utensils",),
+            self.borrowings_journal.snapshot_file: ("borrowings_snapshot",),
+            self.borrowings_journal.packed_file: ("borrowings_snapshot",),
+            self.borrowers_file: ("borrowers",),
+            self.settings_file: ("settings",),
+            self.admin_file: ("admin",),
+        }
+        if op[1] == self.borrowings_journal.journal_file:
+            return ("borrowings",) if op[0] == "append" else ("borrowings_snapshot",)
+        return files.get(op[1], ())
+
+    def _committed(self, collections):
+        """Move the read position past what this instance just wrote, refresh() must not replay it"""
+        if self.store:
+            self.borrowings_seq = self.store.last_borrowing_seq()
+        else:
+            self.journal_offset = self.borrowings_journal.size()
+
+    def _rejected(self, error):
+        # A save outside transaction() raced another instance and was dropped, start over from the disk
+        log.warning("%s, unsaved changes were dropped", error)
+        self._discard_unsaved()
+        with self.data_lock:
+            self.save_errors.append(f"{error}. Your latest changes could not be saved, please make them again.")
+
+    def take_save_errors(self):
+        """Messages about saves lost to another instance since the last call, the data was reloaded from disk"""
+        with self.data_lock:
+            errors, self.save_errors = self.save_errors, []
+        return errors
+
+    def refresh(self):
+        """Reload only the collections other instances changed since the last sync, returns their names"""
+        with self.shared:
+            changed = self.shared.changed(force=True)
+            if changed:
+                with self.data_lock:
+                    self._reload(set(changed))
+                    self.shared.mark_synced(changed)
+        return set(changed)
+
+    def _reload(self, names):
+        if "settings" in names:
+            self.settings = self._load_json(self.settings_file, self.settings)
+            # Moving between json and packed only changes how the next snapshot is written
+            self.borrowings_journal.packed = self.settings.get("storage_backend") == "packed"
+        if "admin" in names:
+            self.admin_data = self._load_json(self.admin_file, self.admin_data)
+        if "utensils" in names:
+            self._reload_utensils(self.store.load_utensils() if self.store else self._load_json(self.utensils_file, []))
+        if "borrowers" in names:
+            loaded = self.store.load_borrowers() if self.store else self._load_json(self.borrowers_file, {})
+            previous = self.borrowers
+            self.borrowers = {key: Borrower.from_dict(data) for key, data in loaded.items()}
+            self.changes.changed("borrowers", [key for key, data in self.borrowers.items() if previous.get(key) != data])
+
+        if "archive" in names:
+            # Another instance moved loans out to the archive, start over from what is on disk
+            self.archive.load()
+            self.pending_borrowings = {}
+            loaded = self.store.load_borrowings() if self.store else self.borrowings_journal.load()
+            self.borrowings = self._borrowing_records(loaded)
+            self.report_engine.close()
+            self.build_indexes()
+            self._committed(())
+        elif "borrowings" in names and "borrowings_snapshot" in names:
+            self.pending_borrowings = {}
+            self._merge_borrowings(self.store.load_borrowings() if self.store else self.borrowings_journal.load())
+            self._committed(())
+        elif "borrowings" in names:
+            if self.store:
+                records, self.borrowings_seq = self.store.load_borrowings_after(self.borrowings_seq)
+            else:
+                records, self.journal_offset = self.borrowings_journal.read_from(self.journal_offset)
+            self._merge_borrowings(records)
+        elif "borrowings_snapshot" in names and not self.store:
+            # Another instance folded the journal this one had already read
+            self.borrowings_journal.folded()
+            self.journal_offset = 0
+
+    def _reload_utensils(self, loaded):
+        """Swap in the utensils on disk, keeping the objects the screens hold"""
+        utensils = []
+        changed = set(self.utensils_by_id) - {data["id"] for data in loaded}
+        for data in loaded:
+            utensil = self.utensils_by_id.get(data["id"])
+            if utensil is None:
+                utensil = Utensil.from_dict(data)
+                changed.add(utensil["id"])
+            elif utensil != data:
+                utensil.replace_fields(data)
+                changed.add(utensil["id"])
+            utensils.append(utensil)
+        self.utensils = utensils
+        self.utensils_by_id = {}
+        self.utensils_by_name = {}
+        for utensil in utensils:
+            self.index_utensil(utensil)
+            self.utensil_ids.seen(utensil["id"])
+        self.count_utensils_out()
+        self.changes.changed("utensils", changed)
+
+    def _merge_borrowings(self, records):
+        """Fold borrowings another instance wrote into memory and every index"""
+        keys = set()
+        for data in records:
+            borrowing = self.borrowings_by_id.get(data["id"])
+            if borrowing is None:
+                borrowing = Borrowing.from_dict(data)
+                self.borrowings.append(borrowing)
+                self.borrowings_by_id[borrowing["id"]] = borrowing
+                self.borrowing_ids.seen(borrowing["id"])
+                self.recent_activity.add(borrowing)
+                self._add_to_log_order(borrowing)
+                if self._search_index is not None:
+                    self._search_index.add(borrowing)
+            elif borrowing == data:
+                continue
+            else:
+                borrowing.replace_fields(data)
+            if borrowing.get("returned", False):
+                self.overdue_index.remove(borrowing["id"])
+            else:
+                self.overdue_index.add(borrowing["id"], borrowing.get("due_date"))
+            self.report_engine.update(borrowing)
+            self.changes.changed("borrowings", (borrowing["id"],))
+            keys.add(borrower_key(borrowing["borrower_name"]))
+        self.changes.changed("borrowers", keys)
+        for key in keys:
+            ids = sorted(set(self.borrower_view.all_borrowing_ids(key)) |
+                         {b["id"] for b in records if borrower_key(b["borrower_name"]) == key})
+            self.borrower_view.rebuild(key, [self.borrowings_by_id[bid] for bid in ids])
+
+    def _save_json_later(self, filepath, get_data):
+        """Queue a JSON file rewrite for the next group commit"""
+        self.writer.mark_dirty(filepath, lambda: [("replace", filepath, json.dumps(get_data(), indent=2, default=record_to_json))])
+
+    def _save_to_store_later(self, kind, get_data):
+        """Queue a SQLite write for the next group commit"""
+        store = self.store
+        self.writer.mark_dirty(kind, lambda: [("sqlite", store, kind, self._copy_collection(get_data()))])
+
+    def _copy_collection(self, data):
+        """Copy a collection so the writer thread does not share records with the UI"""
+        if isinstance(data, dict):
+            return {key: dict(value) for key, value in data.items()}
+        return [dict(item) for item in data]
+
+    def hash_password(self, password):
+        """Hash password using SHA-256"""
+        return hashlib.sha256(password.encode()).hexdigest()
+
+    def save_utensils(self):
+        if self.store:
+            self._save_to_store_later("utensils", lambda: self.utensils)
+        else:
+            self._save_json_later(self.utensils_file, lambda: self.utensils)
+
+    def save_borrowings(self):
+        """Write a full borrowings snapshot and reset the journal"""
+        if self.store:
+            self._save_to_store_later("borrowings", lambda: self.borrowings)
+        else:
+            self.writer.mark_dirty("borrowings_snapshot", self._snapshot_borrowings)
+
+    def log_borrowing(self, op, borrowing):
+        """Persist a borrow, return or split record without rewriting the history"""
+        self.borrowings_by_id[borrowing["id"]] = borrowing
+        if op != "return":
+            self._add_to_log_order(borrowing)
+        if self._search_index is not None:
+            self._search_index.add(borrowing)
+        self.report_engine.update(borrowing)
+        self.changes.changed("borrowings", (borrowing["id"],))
+        if self.store:
+            self.pending_borrowings[borrowing["id"]] = borrowing
+            self.writer.mark_dirty("borrowings", self._write_pending_borrowings)
+        else:
+            self.borrowings_journal.append(op, borrowing)
+            self.writer.mark_dirty("borrowings", self._append_journal)
+
+    def _write_pending_borrowings(self):
+        pending = self.pending_borrowings
+        self.pending_borrowings = {}
+
+        def restore():
+            for borrowing_id, borrowing in pending.items():
+                self.pending_borrowings.setdefault(borrowing_id, borrowing)
+
+        return [("sqlite", self.store, "changed_borrowings", self._copy_collection(pending.values())),
+                ("rollback", restore)]
+
+    def _append_journal(self):
+        lines = self.borrowings_journal.take_pending()
+        if self.borrowings_journal.needs_compaction():
+            # Compact in a commit of its own, so other instances can tell it changed nothing
+            self.writer.mark_dirty("borrowings_snapshot", self._snapshot_borrowings)
+        if not lines:
+            return []
+        return [("append", self.borrowings_journal.journal_file, lines),
+                ("rollback", lambda: self.borrowings_journal.restore_pending(lines))]
+
+    def _snapshot_borrowings(self):
+        """Fold the journal into a new borrowings.json (or packed borrowings.bin) snapshot"""
+        journal = self.borrowings_journal
+        entries = journal.entries
+        # Queued lines stay with the append job, which lands after the truncate in the same
+        # commit, so other instances see new borrowings rather than a bare compaction
+        journal.folded()
+
+        def restore():
+            journal.entries = entries
+
+        # Only the list is copied under data_lock, the writer serializes it after releasing the lock.
+        # A record changed in the meantime is journaled again, and the journal replays over the snapshot
+        snapshot_file, serialize, replaced_file = journal.snapshot(list(self.borrowings))
+        return [("replace", snapshot_file, serialize),
+                ("remove", replaced_file),
+                ("truncate", journal.journal_file),
+                ("rollback", restore)]
+
+    def save_admin(self):
+        self._save_json_later(self.admin_file, lambda: self.admin_data)
+
+    def save_settings(self):
+        self._save_json_later(self.settings_file, lambda: self.settings)
+
+    def save_borrowers(self):
+        if self.store:
+            self._save_to_store_later("borrowers", lambda: self.borrowers)
+        else:
+            self._save_json_later(self.borrowers_file, lambda: self.borrowers)
+
+    def set_storage_backend(self, backend):
+        """Switch between the JSON files and the SQLite database, copying the current data over
+
+        packed is the JSON files with the borrowings snapshot in the binary
+        format of kube.packed.
+        """
+        if backend == self.settings.get("storage_backend", "json"):
+            return
+
+        with self.transaction():
+            if backend == "sqlite":
+                from kube.sqlite_store import SQLiteStore
+                self.store = SQLiteStore(self.db_file)
+            elif self.store:
+                self.store.close()
+                self.store = None
+            self.borrowings_journal.packed = backend == "packed"
+
+            self.save_utensils()
+            self.save_borrowings()
+            self.save_borrowers()
+            self.settings["storage_backend"] = backend
+            self.save_settings()
+
+    def get_due_ordinal(self, borrowing):
+        """Get the due date of a borrowing as a day ordinal, None if it has none"""
+        due = self.overdue_index.get_due(borrowing["id"])
+        if due is None and borrowing.get("due_date"):
+            due = date_ordinal(borrowing["due_date"])
+        return due
+
+    def is_overdue(self, borrowing):
+        """Check if a borrowing is overdue (due on or before the last swept day)"""
+        return self.overdue_index.is_overdue(borrowing["id"])
+
+    def days_overdue(self, borrowing):
+        """Calculate how many days overdue a borrowing is"""
+        if not self.is_overdue(borrowing):
+            return 0
+
+        return self.overdue_index.today - self.get_due_ordinal(borrowing)
+
+    def sweep_overdue(self):
+        """Flag loans that fell due since the last sweep, returns the ids that flipped"""
+        with self.data_lock:
+            return self.overdue_index.sweep(today_ordinal())
+
+    def get_overdue_borrowings(self):
+        """List overdue borrowings, most overdue first"""
+        return [self.borrowings_by_id[bid] for bid in self.overdue_index.overdue_ids()]
+
+    def calculate_credit_score(self, borrower_name):
+        """Calculate credit score for a borrower (0-100, starting at 100)"""
+        borrower_key = self.get_borrower_key(borrower_name)
+
+        if borrower_key not in self.borrowers:
+            return 100
+
+        borrower_data = self.borrowers[borrower_key]
+        return borrower_data.get("credit_score", 100)
+
+    def rescore_borrowers(self, borrower_names):
+        """Recompute borrowers from their own history, the same replay a full rebuild runs"""
+        keys = {self.get_borrower_key(name) for name in borrower_names}
+        if self._deferred_rescore is not None:
+            self._deferred_rescore.update(keys)
+            return
+        tracked_from = self.settings.get("split_tracking_from")
+        baseline = self.archive.index["baseline"]
+        for key in keys:
+            history = [self.borrowings_by_id[bid] for bid in self.borrower_view.all_borrowing_ids(key)]
+            events = build_events(history, tracked_from, self.archive.origins)
+            self._store_credit_scores(replay_events(events, workers=1, baseline={key: baseline[key]} if key in baseline else None))
+
+    @contextmanager
+    def batch(self):
+        """Hold the data lock across many transactions and rescore each borrower once at the end
+
+        The writer cannot snapshot mid-batch, so a flush() after the batch
+        writes all of it in one group commit.
+        """
+        with self.data_lock:
+            if self._deferred_rescore is not None:
+                yield
+                return
+            self._deferred_rescore = set()
+            try:
+                yield
+            finally:
+                keys = self._deferred_rescore
+                self._deferred_rescore = None
+                if keys:
+                    self.rescore_borrowers(keys)
+                    self.save_borrowers()
+
+    @contextmanager
+    def transaction(self):
+        """A batch() that other KUBE instances cannot interleave with
+
+        Holds the data folder lock, catches up with their changes first and
+        commits before letting go, so every check inside sees the latest
+        data. If the commit fails, memory is put back to what is on disk and
+        IOError is raised, nested calls join the outer transaction.
+
+        The commit runs on the calling thread, not the writer's: it has to
+        happen before the folder lock is let go. The window starts its
+        transactions on a worker thread (KUBE.save_in_background).
+        """
+        with self.shared:
+            if self._transaction_depth:
+                with self.batch():
+                    yield
+                return
+            self.refresh()
+            self._transaction_depth += 1
+            try:
+                with self.batch():
+                    yield
+            finally:
+                self._transaction_depth -= 1
+                saved = self.writer.flush()
+                if not saved:
+                    self._discard_unsaved()
+            if not saved:
+                raise IOError("Could not save the changes")
+
+    def _discard_unsaved(self):
+        """Drop changes a failed commit carried and reload the data folder, call under its lock"""
+        self.writer.discard()
+        with self.data_lock:
+            try:
+                # A commit that got as far as its manifest is on disk after all
+                recover_group(self.commit_file)
+            except OSError:
+                traceback.print_exc()
+            self.pending_borrowings = {}
+            if self.store:
+                self.store.close()
+                self.store = None
+            self.report_engine.close()
+            self.shared.mark_synced(self.shared.changed(force=True))
+            self._load_collections()
+            self._committed(())
+
+    def _store_credit_scores(self, rebuilt):
+        self.changes.changed("borrowers", rebuilt)
+        for key, data in rebuilt.items():
+            borrower_data = self.borrowers.get(key)
+            if borrower_data is None:
+                self.borrowers[key] = Borrower.from_dict(data)
+            else:
+                for field in COUNTERS:
+                    borrower_data[field] = data[field]
+
+    def verify_credit_scores(self):
+        """Replay the history and list borrowers whose stored counters drifted from it"""
+        with self.data_lock:
+            events = build_events(self.borrowings, self.settings.get("split_tracking_from"), self.archive.origins)
+            stored = {key: {field: data.get(field) for field in COUNTERS} for key, data in self.borrowers.items()}
+            baseline = self.archive.index["baseline"]
+        return verify(stored, replay_events(events, baseline=baseline))
+
+    def rebuild_credit_scores(self):
+        """Recompute every borrower's score and counters from the history, returns how many changed"""
+        with self.transaction():
+            events = build_events(self.borrowings, self.settings.get("split_tracking_from"), self.archive.origins)
+            rebuilt = replay_events(events, baseline=self.archive.index["baseline"])
+            changed = len({key for key, _, _, _ in verify(self.borrowers, rebuilt)})
+            self._store_credit_scores(rebuilt)
+            self.save_borrowers()
+        return changed
+
+    def get_active_borrowings_count(self, borrower_name):
+        """Count active borrowings for a borrower"""
+        return self.borrower_view.active_quantity(borrower_name)
+
+    def get_active_borrowings(self):
+        """List borrowings that have not been returned yet"""
+        if self.store:
+            return [self.borrowings_by_id[bid] for bid in self.store.active_borrowing_ids()]
+        if isinstance(self.borrowings, LazyBorrowings):
+            return [self.borrowings[row] for row in self.borrowings.active_indexes()]
+        return [b for b in self.borrowings if not b.get("returned", False)]
+
+    def get_status_counts(self):
+        """Number of loans per status (Active, Overdue, Returned) as of the last overdue sweep"""
+        with self.data_lock:
+            today = self.overdue_index.today
+            if isinstance(self.borrowings, LazyBorrowings):
+                return self.borrowings.status_counts(today)
+            counts = {"Active": 0, "Overdue": 0, "Returned": 0}
+            for borrowing in self.borrowings:
+                counts[self.get_borrowing_status(borrowing)] += 1
+            return counts
+
+    def get_borrowing_status(self, borrowing):
+        """Get the Returned/Overdue/Active status of a borrowing"""
+        return "Returned" if borrowing.get("returned") else ("Overdue" if self.is_overdue(borrowing) else "Active")
+
+    def search_borrowings(self, search_term, status_filter="All"):
+        """Find borrowings by borrower or utensil name and status"""
+        return list(self.iter_search_borrowings(search_term, status_filter))
+
+    def iter_search_borrowings(self, search_term, status_filter="All"):
+        """Lazily yield borrowings matching a name substring and status, in id order
+
+        Archived matches follow, read only once the current ones are used up.
+        """
+        search_term = search_term.lower().strip()
+        if search_term:
+            candidates = (self.borrowings_by_id[bid] for bid in sorted(self.search_index.search(search_term)))
+        elif self.store:
+            today = date.fromordinal(self.overdue_index.today).isoformat()
+            ids = self.store.search_borrowing_ids("", status_filter, today)
+            candidates = (self.borrowings_by_id[bid] for bid in ids)
+        elif status_filter == "Overdue":
+            candidates = sorted(self.get_overdue_borrowings(), key=lambda b: b["id"])
+        else:
+            candidates = self.borrowings
+
+        for borrowing in candidates:
+            if status_filter == "All" or self.get_borrowing_status(borrowing) == status_filter:
+                yield borrowing
+        if status_filter in ("All", "Returned"):
+            yield from self.archive.search(search_term)
+
+    def get_borrower_history(self, borrower_name):
+        """Every borrowing under this exact name, oldest first, archived ones included"""
+        history = [self.borrowings_by_id[bid] for bid in self.borrower_view.borrowing_ids(borrower_name)]
+        archived = self.archive.borrower_history(borrower_name)
+        return sorted(archived + history, key=lambda b: b["id"]) if archived else history
+
+    def export_borrowings(self, start_date=None, end_date=None, statuses=None):
+        """Borrowings for an export in transaction log order, archived months in the date range read as reached"""
+        current = list(self.get_transaction_log_order())
+        if (statuses and "Returned" not in statuses) or not self.archive.months:
+            return current
+        return heapq.merge(current, self.archive.iter_borrowings(start_date, end_date, cache=False),
+                           key=log_key, reverse=True)
+
+    def report_history(self):
+        """The whole history for ReportEngine.prepare(), which only reads it (archive too) for its first report"""
+        return chain(self.borrowings, self.archive.iter_borrowings(cache=False))
+
+    def get_dashboard_stats(self):
+        """Numbers for the dashboard cards: quantity out and overdue loans, both kept as loans change"""
+        return {"borrowed": self.utensils_out, "overdue": self.overdue_index.count_overdue()}
+
+    def get_recent_activity(self, limit=10):
+        """The most recently borrowed loans, newest first"""
+        if limit > self.recent_activity.capacity:
+            return sorted(self.borrowings, key=lambda x: (x.get("borrow_date", ""), x["id"]), reverse=True)[:limit]
+        return self.recent_activity.newest(limit)
+
+    def get_transaction_log_order(self):
+        """Borrowings sorted newest first (later ids first on the same day), sorted once and then kept in order"""
+        if self._log_order is None:
+            self._log_order = sorted(self.borrowings, key=log_key, reverse=True)
+        return self._log_order
+
+    def _add_to_log_order(self, borrowing):
+        order = self._log_order
+        if order is None:
+            return
+        order.insert(self._count_newer(order, log_key(borrowing)), borrowing)
+        self._log_blocks = {}
+
+    def _count_newer(self, order, key):
+        """How many loans of a transaction log order sort before key"""
+        lo, hi = 0, len(order)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if log_key(order[mid]) > key:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def transaction_log_count(self):
+        return len(self.get_transaction_log_order()) + len(self.archive)
+
+    def transaction_log_at(self, index):
+        """The index-th loan of the transaction log, archived loans merged in by borrow date
+
+        Archived loans are kept by borrow month, so a row only reads the
+        month it falls in and merges it with the current loans of that month.
+        """
+        order = self.get_transaction_log_order()
+        position = start = 0
+        for month in self.archive.months:
+            # Current loans from later months come first
+            newer = self._count_newer(order, (month + "\uffff",))
+            if index < position + newer - start:
+                return order[start + index - position]
+            position += newer - start
+            end = self._count_newer(order, (month,))
+            size = end - newer + self.archive.index["segments"][month]["count"]
+            if index < position + size:
+                block = self._log_blocks.get(month)
+                if block is None:
+                    if len(self._log_blocks) >= self.archive.cache_size:
+                        self._log_blocks = {}
+                    block = self._log_blocks[month] = list(heapq.merge(order[newer:end], self.archive.read_segment(month),
+                                                                       key=log_key, reverse=True))
+                return block[index - position]
+            position += size
+            start = end
+        if index - position >= len(order) - start:
+            raise IndexError(index)
+        return order[start + index - position]
+
+    def borrow_items(self, borrower_name, quantities, due_date, contact_info, borrow_date=None):
+        """Check out several utensils as one transaction, raises ValueError before changing anything"""
+        borrower_name = borrower_name.strip()
+        if not borrower_name:
+            raise ValueError("Please enter borrower name")
+        if not quantities:
+            raise ValueError("Please select at least one item")
+        if not due_date:
+            # A loan without a due date could never become overdue
+            raise ValueError("Please enter a due date")
+
+        with self.transaction():
+            active_count = self.get_active_borrowings_count(borrower_name)
+            if active_count + sum(quantities.values()) > self.settings["max_borrow_limit"]:
+                raise ValueError(f"Borrow limit exceeded. Current: {active_count}, Limit: {self.settings['max_borrow_limit']}")
+
+            for uid, qty in quantities.items():
+                utensil = self.utensils_by_id.get(uid)
+                if utensil is None:
+                    raise ValueError("Utensil not found")
+                if qty < 1 or qty > utensil["available"]:
+                    raise ValueError(f"Not enough {utensil['name']} available")
+
+            if borrow_date is None:
+                borrow_date = datetime.now().strftime("%Y-%m-%d")
+            new_borrowings = []
+            for uid, qty in quantities.items():
+                utensil = self.utensils_by_id[uid]
+                borrowing = Borrowing(
+                    id=self.borrowing_ids.allocate(),
+                    borrower_name=borrower_name,
+                    utensil_name=utensil["name"],
+                    utensil_id=utensil["id"],
+                    quantity=qty,
+                    borrow_date=borrow_date,
+                    due_date=due_date,
+                    returned=False,
+                    contact_info=dict(contact_info)
+                )
+
+                self.borrowings.append(borrowing)
+                new_borrowings.append(borrowing)
+                utensil["available"] -= qty
+                self.utensils_out += qty
+                self.changes.changed("utensils", (uid,))
+                self.recent_activity.add(borrowing)
+                self.borrower_view.borrowed(borrowing)
+                self.overdue_index.add(borrowing["id"], due_date)
+
+            for borrowing in new_borrowings:
+                self.log_borrowing("borrow", borrowing)
+            self.rescore_borrowers([borrower_name])
+            self.save_utensils()
+            self.save_borrowers()
+        return new_borrowings
+
+    def return_items(self, returns, return_date=None):
+        """Return several borrowings as one transaction, returns is a list of (borrowing, quantity, condition, notes)
+
+        The borrowings are looked up again by id once the transaction has
+        caught up with other instances, a screen may still hold records
+        from before a reload. Returns the records that were returned.
+        """
+        if not returns:
+            raise ValueError("Please select at least one item to return")
+
+        with self.transaction():
+            current = []
+            for borrowing, return_qty, condition, notes in returns:
+                found = self.borrowings_by_id.get(borrowing["id"])
+                if found is None:
+                    raise ValueError(f"{borrowing['utensil_name']} for {borrowing['borrower_name']} is no longer on loan")
+                current.append((found, return_qty, condition, notes))
+            returns = current
+
+            listed = set()
+            for borrowing, return_qty, condition, notes in returns:
+                if borrowing["id"] in listed:
+                    # A second entry would return the loan twice and count its utensils back in twice
+                    raise ValueError(f"{borrowing['utensil_name']} for {borrowing['borrower_name']} is listed more than once")
+                listed.add(borrowing["id"])
+                if borrowing.get("returned", False):
+                    raise ValueError(f"{borrowing['utensil_name']} for {borrowing['borrower_name']} was already returned")
+                if return_qty < 1 or return_qty > borrowing["quantity"]:
+                    raise ValueError(f"Invalid return quantity for {borrowing['utensil_name']}")
+
+            if return_date is None:
+                return_date = datetime.now().strftime("%Y-%m-%d")
+            journal_entries = []
+            for borrowing, return_qty, condition, notes in returns:
+                borrowed_qty = borrowing["quantity"]
+
+                if return_qty < borrowed_qty:
+                    new_borrowing = Borrowing(
+                        id=self.borrowing_ids.allocate(),
+                        borrower_name=borrowing["borrower_name"],
+                        utensil_name=borrowing["utensil_name"],
+                        utensil_id=borrowing["utensil_id"],
+                        quantity=borrowed_qty - return_qty,
+                        borrow_date=borrowing["borrow_date"],
+                        due_date=borrowing["due_date"],
+                        returned=False,
+                        contact_info=borrowing.get("contact_info", {}),
+                        split_from=borrowing["id"]
+                    )
+                    self.borrowings.append(new_borrowing)
+                    self.recent_activity.add(new_borrowing)
+                    self.overdue_index.add(new_borrowing["id"], new_borrowing["due_date"])
+                    self.borrower_view.split(new_borrowing)
+                    journal_entries.append(("split", new_borrowing))
+
+                borrowing["returned"] = True
+                self.overdue_index.remove(borrowing["id"])
+                borrowing["return_date"] = return_date
+                borrowing["return_condition"] = condition
+                borrowing["return_notes"] = notes
+                borrowing["return_quantity"] = return_qty
+                borrowing["quantity"] = return_qty
+                journal_entries.append(("return", borrowing))
+
+                utensil = self.utensils_by_id.get(borrowing["utensil_id"])
+                if utensil:
+                    utensil["available"] += return_qty
+                    self.utensils_out -= return_qty
+                    self.changes.changed("utensils", (utensil["id"],))
+                self.borrower_view.returned(borrowing, return_qty)
+
+            for op, borrowing in journal_entries:
+                self.log_borrowing(op, borrowing)
+            self.rescore_borrowers(borrowing["borrower_name"] for borrowing, _, _, _ in returns)
+            self.save_utensils()
+            self.save_borrowers()
+        return [borrowing for borrowing, _, _, _ in returns]
+
+    def add_utensil(self, name, category, quantity):
+        """Add a utensil to the catalog, raises ValueError for a blank name or bad quantity"""
+        name = name.strip()
+        if not name:
+            raise ValueError("Please enter utensil name")
+        if quantity < 1:
+            raise ValueError("Quantity must be at least 1")
+
+        with self.transaction():
+            utensil = Utensil(id=self.utensil_ids.allocate(), name=name, category=category.strip() or "Uncategorized",
+                              quantity=quantity, available=quantity)
+            self.utensils.append(utensil)
+            self.index_utensil(utensil)
+            self.changes.changed("utensils", (utensil["id"],))
+            self.save_utensils()
+        return utensil
+
+    def update_utensil(self, utensil, name, category, quantity):
+        """Rename, recategorize or resize a utensil, raises ValueError before changing anything"""
+        name = name.strip()
+        if not name:
+            raise ValueError("Please enter utensil name")
+
+        with self.transaction():
+            borrowed = utensil["quantity"] - utensil["available"]
+            if quantity < borrowed:
+                raise ValueError(f"Cannot reduce quantity below borrowed amount ({borrowed})")
+
+            self.unindex_utensil(utensil)
+            utensil["name"] = name
+            self.index_utensil(utensil)
+            utensil["category"] = category.strip() or "Uncategorized"
+            utensil["available"] = quantity - borrowed
+            utensil["quantity"] = quantity
+            self.changes.changed("utensils", (utensil["id"],))
+            self.save_utensils()
+
+    def delete_utensil(self, utensil):
+        """Remove a utensil from the catalog, raises ValueError while any of it is borrowed"""
+        with self.transaction():
+            borrowed_count = utensil["quantity"] - utensil["available"]
+            if borrowed_count > 0:
+                raise ValueError(f"Cannot delete utensil with {borrowed_count} active borrowing(s)")
+
+            self.utensils.remove(utensil)
+            self.unindex_utensil(utensil)
+            self.changes.changed("utensils", (utensil["id"],))
+            self.save_utensils()
+
+    def archive_borrowings(self, older_than_days=None):
+        """Move loans returned more than older_than_days ago (archive_after_days by default) to the archive
+
+        Returns how many moved, raises ValueError for fewer than
+        MIN_ARCHIVE_DAYS days.
+        """
+        if older_than_days is None:
+            older_than_days = self.settings.get("archive_after_days", MIN_ARCHIVE_DAYS)
+        if older_than_days < MIN_ARCHIVE_DAYS:
+            raise ValueError(f"Loans can only be archived {MIN_ARCHIVE_DAYS} or more days after their return")
+        archived_before = (date.today() - timedelta(days=older_than_days)).isoformat()
+
+        with self.transaction():
+            moving = [b for b in self.borrowings if b.get("returned", False) and b.get("return_date", "") < archived_before]
+            if not moving:
+                return 0
+            index, payloads = self.archive.add(moving, archived_before, self.settings.get("split_tracking_from"))
+            self.archive.set_index(index)
+            moved = {b["id"] for b in moving}
+            self.borrowings = [b for b in self.borrowings if b["id"] not in moved]
+            self.report_engine.close()
+            self.build_indexes()
+
+            self.writer.mark_dirty("archive", lambda: self.archive.commit_ops(index, payloads))
+            if self.store:
+                store = self.store
+                self.writer.mark_dirty("archived_borrowings", lambda: [("sqlite", store, "archived_borrowings", sorted(moved))])
+            else:
+                self.writer.mark_dirty("borrowings_snapshot", self._snapshot_borrowings)
+        return len(moving)
+
+    def close(self):
+        """Flush pending writes and stop the background workers"""
+        self.writer.stop()
+        if hasattr(self, "report_engine"):
+            self.report_engine.close()
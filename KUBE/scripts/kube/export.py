@@ -0,0 +1,76 @@
+import csv
+import os
+
+from kube.overdue import date_ordinal, today_ordinal
+
+EXPORT_FIELDS = ["ID", "Borrower", "Utensil", "Quantity", "Borrow Date", "Due Date", "Return Date", "Status", "Condition", "Notes"]
+
+
+class ExportCancelled(Exception):
+    pass
+
+
+def borrowing_status(borrowing, today):
+    """Returned/Overdue/Active status against a given day ordinal"""
+    if borrowing.get("returned"):
+        return "Returned"
+    due_date = borrowing.get("due_date")
+    if due_date and date_ordinal(due_date) <= today:
+        return "Overdue"
+    return "Active"
+
+
+def iter_export_rows(borrowings, start_date=None, end_date=None, statuses=None, today=None,
+                     progress=None, cancel_event=None, progress_every=1000):
+    """Yield CSV rows one at a time, filtered by borrow date range (YYYY-MM-DD, inclusive) and status"""
+    if today is None:
+        today = today_ordinal()
+
+    for scanned, borrowing in enumerate(borrowings, 1):
+        if scanned % progress_every == 0:
+            if cancel_event is not None and cancel_event.is_set():
+                raise ExportCancelled()
+            if progress:
+                progress(scanned)
+
+        borrow_date = borrowing.get("borrow_date", "")
+        if start_date and borrow_date < start_date:
+            continue
+        if end_date and borrow_date > end_date:
+            continue
+
+        status = borrowing_status(borrowing, today)
+        if statuses and status not in statuses:
+            continue
+
+        yield {
+            "ID": borrowing["id"],
+            "Borrower": borrowing["borrower_name"],
+            "Utensil": borrowing["utensil_name"],
+            "Quantity": borrowing["quantity"],
+            "Borrow Date": borrow_date,
+            "Due Date": borrowing.get("due_date", "N/A"),
+            "Return Date": borrowing.get("return_date", "N/A"),
+            "Status": status,
+            "Condition": borrowing.get("return_condition", "N/A"),
+            "Notes": borrowing.get("return_notes", "")
+        }
+
+
+def write_csv(file_path, rows):
+    """Stream rows to a CSV file through a temp file, the partial file is removed on failure or cancel"""
+    tmp_file = file_path + ".part"
+    count = 0
+    try:
+        with open(tmp_file, 'w', newline='') as csvfile:
+            writer = csv.DictWriter(csvfile, fieldnames=EXPORT_FIELDS)
+            writer.writeheader()
+            for row in rows:
+                writer.writerow(row)
+                count += 1
+        os.replace(tmp_file, file_path)
+    except BaseException:
+        if os.path.exists(tmp_file):
+            os.remove(tmp_file)
+        raise
+    return count
@@ -0,0 +1,173 @@
+import json
+import os
+import threading
+
+from kube.packed import LazyBorrowings, PackedBorrowings, pack_borrowings
+from kube.records import Borrowing, record_to_json
+
+
+class BorrowingJournal:
+    """Append-only JSONL journal of borrowing changes on top of a JSON snapshot
+
+    With packed set, snapshots are written to packed_file in the
+    fixed-width format of kube.packed instead. Loading reads whichever
+    snapshot is there, writing one removes the other.
+    """
+
+    def __init__(self, snapshot_file, compact_threshold=2000, packed=False):
+        self.snapshot_file = snapshot_file
+        self.packed_file = os.path.splitext(snapshot_file)[0] + ".bin"
+        self.packed = packed
+        self.journal_file = os.path.splitext(snapshot_file)[0] + ".journal.jsonl"
+        self.compacting_file = self.journal_file + ".compacting"
+        self.compact_threshold = compact_threshold
+        self.entries = 0
+        self.pending_lines = []
+        self.lock = threading.Lock()
+
+    def exists(self):
+        """Check if a snapshot has been written"""
+        return os.path.exists(self.snapshot_file) or os.path.exists(self.packed_file)
+
+    def load(self):
+        """Replay the snapshot plus the journal tail into a list of borrowings
+
+        A packed snapshot stays mapped and comes back as a LazyBorrowings,
+        with the journal tail already folded in as records.
+        """
+        records = {}
+        lazy = None
+        if os.path.exists(self.packed_file):
+            lazy = LazyBorrowings(PackedBorrowings(self.packed_file))
+        elif os.path.exists(self.snapshot_file):
+            with open(self.snapshot_file, 'r') as f:
+                for borrowing in json.load(f):
+                    records[borrowing["id"]] = borrowing
+
+        with self.lock:
+            self.pending_lines = []
+        interrupted = os.path.exists(self.compacting_file)
+        if interrupted:
+            self._replay(self.compacting_file, records)
+        self.entries = self._replay(self.journal_file, records)
+
+        if lazy is None:
+            borrowings = list(records.values())
+        else:
+            borrowings = lazy
+            for borrowing_id, data in records.items():
+                index = lazy.index_of(borrowing_id)
+                if index is None:
+                    lazy.append(Borrowing.from_dict(data))
+                else:
+                    lazy[index] = Borrowing.from_dict(data)
+        if interrupted:
+            # A previous compaction never finished, fold everything into a fresh snapshot
+            self.compact(list(borrowings))
+        return borrowings
+
+    def _replay(self, filepath, records):
+        """Apply journal entries from a file, return the number of entries read"""
+        if not os.path.exists(filepath):
+            return 0
+
+        count = 0
+        offset = 0
+        torn_at = None
+        with open(filepath, 'rb+') as f:
+            for line in f:
+                try:
+                    entry = json.loads(line.decode("utf-8")) if line.strip() else None
+                except ValueError:
+                    # Torn write from a crash, normally cut off by recover_group() first
+                    torn_at = offset
+                    offset += len(line)
+                    continue
+                offset += len(line)
+                torn_at = None
+                if entry is None:
+                    continue
+                borrowing = entry["borrowing"]
+                records[borrowing["id"]] = borrowing
+                count += 1
+            if torn_at is not None:
+                # Drop a torn last line so later appends start on a clean line
+                f.truncate(torn_at)
+        return count
+
+    def size(self):
+        """Current length of the journal file in bytes"""
+        try:
+            return os.path.getsize(self.journal_file)
+        except FileNotFoundError:
+            return 0
+
+    def read_from(self, offset):
+        """Borrowings appended from a byte offset on, returns (borrowings, end offset)
+
+        For catching up with another instance's appends, read under the
+        data folder lock so every line is complete.
+        """
+        borrowings = []
+        if not os.path.exists(self.journal_file):
+            return borrowings, 0
+        with open(self.journal_file, 'rb') as f:
+            f.seek(offset)
+            for line in f:
+                offset += len(line)
+                if line.strip():
+                    borrowings.append(json.loads(line.decode("utf-8"))["borrowing"])
+        self.entries += len(borrowings)
+        return borrowings, offset
+
+    def append(self, op, borrowing):
+        """Queue one borrow, return or split record for the next group commit"""
+        line = json.dumps({"op": op, "borrowing": borrowing}, default=record_to_json) + "\n"
+        with self.lock:
+            self.pending_lines.append(line)
+
+    def take_pending(self):
+        """Hand queued lines to a commit, give them back with restore_pending() if it fails"""
+        with self.lock:
+            lines = self.pending_lines
+            self.pending_lines = []
+            self.entries += len(lines)
+        return lines
+
+    def restore_pending(self, lines):
+        with self.lock:
+            self.pending_lines[:0] = lines
+            self.entries -= len(lines)
+
+    def needs_compaction(self):
+        return self.entries + len(self.pending_lines) >= self.compact_threshold
+
+    def folded(self):
+        """Record that a snapshot now covers every journal entry"""
+        with self.lock:
+            self.entries = 0
+
+    def snapshot(self, borrowings):
+        """(file, serialize, file it replaces) of a full snapshot in the format packed selects
+
+        serialize() builds the payload, so a caller can pick the format
+        under a lock and do the expensive part after letting go of it.
+        """
+        if self.packed:
+            return self.packed_file, lambda: pack_borrowings(borrowings), self.snapshot_file
+        return self.snapshot_file, lambda: json.dumps(borrowings, default=record_to_json), self.packed_file
+
+    def compact(self, borrowings):
+        """Write a full snapshot and discard the journal"""
+        snapshot_file, serialize, replaced_file = self.snapshot(borrowings)
+        payload = serialize()
+        with self.lock:
+            self.pending_lines = []
+            tmp_file = snapshot_file + ".tmp"
+            with open(tmp_file, 'wb' if isinstance(payload, bytes) else 'w') as f:
+                f.write(payload)
+            os.replace(tmp_file, snapshot_file)
+            for filepath in (replaced_file, self.compacting_file, self.journal_file):
+                if os.path.exists(filepath):
+                    os.remove(filepath)
+            self.entries = 0
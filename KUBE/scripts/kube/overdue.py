@@ -0,0 +1,100 @@
+import bisect
+from datetime import date
+from functools import lru_cache
+
+
+@lru_cache(maxsize=8192)
+def date_ordinal(date_str):
+    """Parse a YYYY-MM-DD string into a day ordinal, cached since dates repeat heavily"""
+    return date.fromisoformat(date_str).toordinal()
+
+
+def today_ordinal():
+    return date.today().toordinal()
+
+
+class OverdueIndex:
+    """Active loans kept sorted by due date so overdue queries avoid a full scan
+
+    The overdue flag of each loan is cached as of self.today and only moves
+    when sweep() advances the day, so status checks never parse a date.
+    """
+
+    def __init__(self, borrowings=(), today=None):
+        due_by_id = {}
+        for borrowing in borrowings:
+            if not borrowing.get("returned", False) and borrowing.get("due_date"):
+                due_by_id[borrowing["id"]] = date_ordinal(borrowing["due_date"])
+        self._build(due_by_id, today)
+
+    @classmethod
+    def from_due(cls, due_by_id, today=None):
+        """Index the active loans from {id: due day ordinal}, for loaders that already have the days"""
+        index = cls.__new__(cls)
+        index._build(due_by_id, today)
+        return index
+
+    def _build(self, due_by_id, today):
+        self.due_by_id = due_by_id
+        self.entries = sorted((due, bid) for bid, due in due_by_id.items())
+        self.today = today_ordinal() if today is None else today
+        self.overdue = {bid for _, bid in self.entries[:self.count_overdue()]}
+
+    def __len__(self):
+        return len(self.entries)
+
+    def add(self, borrowing_id, due_date_str):
+        """Track an active loan"""
+        if not due_date_str:
+            return
+        self.remove(borrowing_id)
+        due = date_ordinal(due_date_str)
+        self.due_by_id[borrowing_id] = due
+        bisect.insort(self.entries, (due, borrowing_id))
+        if due <= self.today:
+            self.overdue.add(borrowing_id)
+
+    def remove(self, borrowing_id):
+        """Stop tracking a loan once it is returned"""
+        due = self.due_by_id.pop(borrowing_id, None)
+        if due is None:
+            return
+        i = bisect.bisect_left(self.entries, (due, borrowing_id))
+        del self.entries[i]
+        self.overdue.discard(borrowing_id)
+
+    def get_due(self, borrowing_id):
+        return self.due_by_id.get(borrowing_id)
+
+    def is_overdue(self, borrowing_id):
+        """Cached flag as of the last sweep"""
+        return borrowing_id in self.overdue
+
+    def count_overdue(self, today=None):
+        """Number of active loans due on or before today, the last swept day by default"""
+        if today is None:
+            today = self.today
+        return bisect.bisect_right(self.entries, (today, float("inf")))
+
+    def overdue_ids(self, today=None):
+        """Ids of overdue loans, most overdue first"""
+        return [bid for _, bid in self.entries[:self.count_overdue(today)]]
+
+    def sweep(self, today=None):
+        """Move the cached day to today, returns the ids whose overdue flag flipped
+
+        Only the loans due between the previous day and the new one are
+        touched. A clock set backwards un-flags them the same way.
+        """
+        if today is None:
+            today = today_ordinal()
+        if today == self.today:
+            return []
+        low, high = sorted((self.today, today))
+        changed = [bid for _, bid in self.entries[self.count_overdue(low):self.count_overdue(high)]]
+        if today > self.today:
+            self.overdue.update(changed)
+        else:
+            self.overdue.difference_update(changed)
+        self.today = today
+        return changed
@@ -0,0 +1,408 @@
+import json
+import mmap
+import os
+import struct
+import sys
+import threading
+from array import array
+from bisect import bisect_left
+from datetime import date
+
+from kube.overdue import date_ordinal, today_ordinal
+from kube.records import CONDITIONS, Borrowing, Record, intern_contact
+
+MAGIC = b"KUBEPACK"
+VERSION = 1
+# magic, version, record size, record count, offset of the string table
+HEADER = struct.Struct("<8sHHIQ")
+# id, utensil id, then string table indexes of borrower name, utensil name, contact info (JSON), return
+# notes and any fields that do not fit the columns (JSON), then quantity, return quantity, split_from,
+# borrow, due and return days as date ordinals, flags and condition code
+RECORD = struct.Struct("<13I2B2x")
+# The record as 32-bit words, the flags and condition bytes share the last one
+COLUMNS = ("id", "utensil_id", "borrower_name", "utensil_name", "contact_info", "return_notes", "extra",
+           "quantity", "return_quantity", "split_from", "borrow_date", "due_date", "return_date", "flags")
+WORDS = RECORD.size // 4
+NONE = 0xFFFFFFFF
+RETURNED = 1
+HAS_RETURNED = 2
+
+
+def _day(value):
+    """Day ordinal of a date string, 0 when missing or not a date"""
+    try:
+        return date_ordinal(value) if value else 0
+    except (TypeError, ValueError):
+        return 0
+
+
+def _take_int(fields, key):
+    value = fields.get(key)
+    if value.__class__ is int and 0 <= value < NONE:
+        del fields[key]
+        return value
+    return NONE
+
+
+def pack_borrowings(borrowings):
+    """Bytes of a packed snapshot, every value round-trips through PackedBorrowings"""
+    strings = []
+    string_refs = {}
+    days = {}
+
+    def ref(value):
+        index = string_refs.get(value)
+        if index is None:
+            index = string_refs[value] = len(strings)
+            strings.append(value)
+        return index
+
+    def take_string(fields, key):
+        value = fields.get(key)
+        if value.__class__ is str:
+            del fields[key]
+            return ref(value)
+        return NONE
+
+    def take_day(fields, key):
+        value = fields.get(key)
+        if value.__class__ is not str:
+            return 0
+        day = days.get(value)
+        if day is None:
+            try:
+                parsed = date.fromisoformat(value)
+                # Anything but a plain YYYY-MM-DD keeps its exact text in the extra fields
+                day = parsed.toordinal() if parsed.isoformat() == value else 0
+            except ValueError:
+                day = 0
+            days[value] = day
+        if day:
+            del fields[key]
+        return day
+
+    rows = []
+    for borrowing in borrowings:
+        fields = borrowing.to_dict() if isinstance(borrowing, Record) else dict(borrowing)
+        flags = 0
+        if fields.get("returned").__class__ is bool:
+            flags = HAS_RETURNED | (RETURNED if fields.pop("returned") else 0)
+        condition = 0
+        if fields.get("return_condition") in CONDITIONS:
+            condition = CONDITIONS.index(fields.pop("return_condition")) + 1
+        contact = NONE
+        if isinstance(fields.get("contact_info"), dict):
+            contact = ref(json.dumps(fields.pop("contact_info")))
+        row = (_take_int(fields, "id"), _take_int(fields, "utensil_id"), take_string(fields, "borrower_name"),
+               take_string(fields, "utensil_name"), contact, take_string(fields, "return_notes"))
+        row += (_take_int(fields, "quantity"), _take_int(fields, "return_quantity"), _take_int(fields, "split_from"),
+                take_day(fields, "borrow_date"), take_day(fields, "due_date"), take_day(fields, "return_date"))
+        # Whatever is left did not fit a column
+        extra = ref(json.dumps(fields)) if fields else NONE
+        rows.append(RECORD.pack(*row[:6], extra, *row[6:], flags, condition))
+
+    strings_at = HEADER.size + RECORD.size * len(rows)
+    return b"".join([HEADER.pack(MAGIC, VERSION, RECORD.size, len(rows), strings_at)] + rows
+                    + [json.dumps(strings).encode("utf-8")])
+
+
+class PackedBorrowings:
+    """A packed borrowings snapshot, mapped into memory rather than read
+
+    Records are fixed-width rows of ids, day ordinals, quantities and flags,
+    names and notes are indexes into one string table at the end of the
+    file. Scans like status_counts() read the packed columns directly and
+    build no records, iterating builds Borrowing records straight from the
+    rows without going through dicts.
+
+    Windows cannot replace a file that is mapped, and another instance
+    rewrites it when it compacts the journal, so there it is read into
+    memory instead.
+    """
+
+    def __init__(self, file_path):
+        with open(file_path, 'rb') as f:
+            if os.name == "nt":
+                self.map = f.read()
+            else:
+                self.map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            try:
+                magic, version, record_size, self.count, strings_at = HEADER.unpack_from(self.map)
+            except struct.error:
+                raise ValueError(f"{file_path} is truncated") from None
+            if magic != MAGIC or version != VERSION or record_size != RECORD.size:
+                raise ValueError(f"{file_path} is not a version {VERSION} packed borrowings file")
+            if strings_at != HEADER.size + RECORD.size * self.count or len(self.map) < strings_at:
+                raise ValueError(f"{file_path} is truncated")
+            try:
+                self.strings = [sys.intern(value) for value in json.loads(self.map[strings_at:].decode("utf-8"))]
+            except ValueError as e:
+                raise ValueError(f"{file_path} has a damaged string table: {e}") from None
+        except ValueError:
+            self.close()
+            raise
+        self.contacts = {}
+        self.dates = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        if isinstance(self.map, mmap.mmap):
+            self.map.close()
+
+    def __len__(self):
+        return self.count
+
+    def rows(self):
+        """Raw column tuples in file order"""
+        with memoryview(self.map) as view:
+            yield from RECORD.iter_unpack(view[HEADER.size:HEADER.size + RECORD.size * self.count])
+
+    def __getitem__(self, index):
+        if not 0 <= index < self.count:
+            raise IndexError(index)
+        return self.decode(RECORD.unpack_from(self.map, HEADER.size + RECORD.size * index))
+
+    def __iter__(self):
+        decode = self.decode
+        for row in self.rows():
+            yield decode(row)
+
+    def column(self, name):
+        """One of COLUMNS for every row as an array of 32-bit values, copied straight out of the rows"""
+        index = COLUMNS.index(name)
+        start = HEADER.size
+        with memoryview(self.map) as view, view[start:start + RECORD.size * self.count] as rows, \
+                rows.cast("I") as words, words[index::WORDS] as values:
+            column = array("I", values.tobytes())
+        if sys.byteorder == "big":
+            column.byteswap()
+        return column
+
+    def status_counts(self, today=None):
+        """Loans per status (Active, Overdue, Returned) as of a day ordinal, read from the packed columns"""
+        today = today_ordinal() if today is None else today
+        active = overdue = returned = 0
+        columns = zip(self.column("extra"), self.column("flags"), self.column("due_date"))
+        for row, (extra, flags, due_day) in enumerate(columns):
+            if extra != NONE:
+                # Fields kept as text, read the whole record the slow way
+                borrowing = self[row]
+                is_returned = borrowing.get("returned", False)
+                due_day = _day(borrowing.get("due_date"))
+            else:
+                is_returned = flags & RETURNED
+            if is_returned:
+                returned += 1
+            elif due_day and due_day <= today:
+                overdue += 1
+            else:
+                active += 1
+        return {"Active": active, "Overdue": overdue, "Returned": returned}
+
+    def _date(self, day):
+        value = self.dates.get(day)
+        if value is None:
+            value = self.dates[day] = sys.intern(date.fromordinal(day).isoformat())
+        return value
+
+    def decode(self, row):
+        (borrowing_id, utensil_id, borrower_name, utensil_name, contact, notes, extra,
+         quantity, return_quantity, split_from, borrow_day, due_day, return_day, flags, condition) = row
+        strings = self.strings
+        borrowing = Borrowing.__new__(Borrowing)
+        # Plain slot assignments, this runs once per row of a cold start
+        if borrowing_id != NONE:
+            borrowing.id = borrowing_id
+        if borrower_name != NONE:
+            borrowing.borrower_name = strings[borrower_name]
+        if utensil_name != NONE:
+            borrowing.utensil_name = strings[utensil_name]
+        if utensil_id != NONE:
+            borrowing.utensil_id = utensil_id
+        if quantity != NONE:
+            borrowing.quantity = quantity
+        if borrow_day:
+            borrowing.borrow_date = self.dates.get(borrow_day) or self._date(borrow_day)
+        if due_day:
+            borrowing.due_date = self.dates.get(due_day) or self._date(due_day)
+        if flags & HAS_RETURNED:
+            borrowing.returned = bool(flags & RETURNED)
+        if return_day:
+            borrowing.return_date = self.dates.get(return_day) or self._date(return_day)
+        if condition:
+            borrowing.return_condition = CONDITIONS[condition - 1]
+        if notes != NONE:
+            borrowing.return_notes = strings[notes]
+        if return_quantity != NONE:
+            borrowing.return_quantity = return_quantity
+        if contact != NONE:
+            contact_info = self.contacts.get(contact)
+            if contact_info is None:
+                contact_info = self.contacts[contact] = intern_contact(json.loads(strings[contact]))
+            borrowing.contact_info = contact_info
+        if split_from != NONE:
+            borrowing.split_from = split_from
+        if extra != NONE:
+            for key, value in json.loads(strings[extra]).items():
+                borrowing[key] = value
+        return borrowing
+
+
+class LazyBorrowings:
+    """The borrowings list on top of a mapped packed snapshot, a row becomes a Borrowing when first read
+
+    Rows the program replaced or appended are held as records, untouched
+    rows stay in the file. The startup scans (ids, borrower totals,
+    active/overdue status, borrow and due days) read the packed columns and
+    only look at records for rows already decoded. The map is closed once
+    every row has been decoded.
+    """
+
+    def __init__(self, packed):
+        self.packed = packed
+        self.records = [None] * len(packed)
+        self.undecoded = len(packed)
+        self.lock = threading.Lock()
+        self.ids = packed.column("id")
+        self.ids_sorted = None
+        self.positions = None
+        if not self.undecoded:
+            packed.close()
+
+    def __len__(self):
+        return len(self.records)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self.records)))]
+        record = self.records[index]
+        if record is None:
+            with self.lock:
+                record = self.records[index]
+                if record is None:
+                    record = self.records[index] = self.packed[index % len(self.records)]
+                    self._decoded()
+        return record
+
+    def __setitem__(self, index, borrowing):
+        with self.lock:
+            if self.records[index] is None:
+                self._decoded()
+            self.records[index] = borrowing
+
+    def _decoded(self):
+        self.undecoded -= 1
+        if not self.undecoded:
+            self.packed.close()
+
+    def append(self, borrowing):
+        self.records.append(borrowing)
+
+    def __iter__(self):
+        for index, record in enumerate(self.records):
+            yield self[index] if record is None else record
+
+    def index_of(self, borrowing_id):
+        """Row of the snapshot holding this id, or None"""
+        if borrowing_id.__class__ is not int:
+            return None
+        ids = self.ids
+        if self.ids_sorted is None:
+            self.ids_sorted = all(a < b for a, b in zip(ids, ids[1:]))
+        if self.ids_sorted:
+            index = bisect_left(ids, borrowing_id)
+            return index if index < len(ids) and ids[index] == borrowing_id else None
+        if self.positions is None:
+            self.positions = {row_id: index for index, row_id in enumerate(ids)}
+        return self.positions.get(borrowing_id)
+
+    def get_by_id(self, borrowing_id):
+        """The record of a snapshot row by id, or None"""
+        index = self.index_of(borrowing_id)
+        return None if index is None else self[index]
+
+    def summaries(self):
+        """(row, id, borrower name, utensil id, quantity, returned, borrow day, due day) of every loan
+
+        Undecoded rows come from the packed columns, the rest from their
+        records. Days are ordinals, 0 when missing.
+        """
+        records = self.records
+        if self.undecoded:
+            packed = self.packed
+            strings = packed.strings
+            columns = zip(self.ids, packed.column("borrower_name"), packed.column("utensil_id"),
+                          packed.column("quantity"), packed.column("flags"), packed.column("borrow_date"),
+                          packed.column("due_date"), packed.column("extra"))
+            for row, (row_id, name, utensil_id, quantity, flags, borrow_day, due_day, extra) in enumerate(columns):
+                if records[row] is None and extra == NONE and NONE not in (row_id, name, utensil_id, quantity):
+                    yield (row, row_id, strings[name], utensil_id, quantity, bool(flags & RETURNED),
+                           borrow_day, due_day)
+                else:
+                    # Decoded, or has fields the columns cannot answer for
+                    yield self._summary(row, self[row])
+            start = len(self.ids)
+        else:
+            start = 0
+        for row in range(start, len(records)):
+            yield self._summary(row, records[row])
+
+    @staticmethod
+    def _summary(row, borrowing):
+        return (row, borrowing["id"], borrowing["borrower_name"], borrowing["utensil_id"], borrowing["quantity"],
+                borrowing.get("returned", False), _day(borrowing.get("borrow_date")), _day(borrowing.get("due_date")))
+
+    def active_indexes(self):
+        """Rows of loans not yet returned, in list order"""
+        return [row for row, _, _, _, _, returned, _, _ in self.summaries() if not returned]
+
+    def status_counts(self, today=None):
+        """Loans per status (Active, Overdue, Returned) as of a day ordinal, like PackedBorrowings.status_counts"""
+        today = today_ordinal() if today is None else today
+        counts = {"Active": 0, "Overdue": 0, "Returned": 0}
+        for _, _, _, _, _, returned, _, due_day in self.summaries():
+            if returned:
+                counts["Returned"] += 1
+            elif due_day and due_day <= today:
+                counts["Overdue"] += 1
+            else:
+                counts["Active"] += 1
+        return counts
+
+
+class LazyBorrowingMap(dict):
+    """borrowings_by_id over a LazyBorrowings, ids of untouched snapshot rows are looked up in its id column"""
+
+    def __init__(self, borrowings):
+        # Records appended after the snapshot have no row in it
+        super().__init__((borrowing["id"], borrowing) for borrowing in borrowings.records[len(borrowings.ids):])
+        self.borrowings = borrowings
+
+    def __missing__(self, borrowing_id):
+        borrowing = self.borrowings.get_by_id(borrowing_id)
+        if borrowing is None:
+            raise KeyError(borrowing_id)
+        self[borrowing_id] = borrowing
+        return borrowing
+
+    def get(self, borrowing_id, default=None):
+        try:
+            return self[borrowing_id]
+        except KeyError:
+            return default
+
+    def __contains__(self, borrowing_id):
+        return self.get(borrowing_id) is not None
+
+
+if __name__ == "__main__":
+    file_path = sys.argv[1] if len(sys.argv) > 1 else os.path.join("kube_data", "borrowings.bin")
+    with PackedBorrowings(file_path) as packed:
+        counts = packed.status_counts()
+    print(f"{file_path}: {len(packed)} borrowings, " + ", ".join(f"{n} {status.lower()}" for status, n in counts.items()))
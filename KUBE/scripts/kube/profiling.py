@@ -0,0 +1,122 @@
+import cProfile
+import functools
+import json
+import os
+import threading
+import time
+from collections import deque
+
+
+class Profiler:
+    """Opt-in timings of named methods, for finding where the time goes
+
+    attach() shadows methods with timing wrappers on one instance and
+    detach() deletes them again, so nothing is wrapped and nothing costs
+    anything while profiling is off. Every call adds to per-operation
+    totals and to a bounded list of trace events for dump_trace().
+    """
+
+    def __init__(self, max_events=50000):
+        self.enabled = False
+        self.stats = {}
+        self.events = deque(maxlen=max_events)
+        self.lock = threading.Lock()
+        self.started = time.perf_counter()
+        self._attached = []
+
+    def attach(self, obj, names, prefix=""):
+        """Time every call to these methods of obj, labelled prefix + name"""
+        for name in names:
+            setattr(obj, name, self.timed(prefix + name, getattr(obj, name)))
+            self._attached.append((obj, name))
+        self.enabled = True
+
+    def detach(self):
+        """Put back the plain methods"""
+        for obj, name in self._attached:
+            obj.__dict__.pop(name, None)
+        self._attached = []
+        self.enabled = False
+
+    def timed(self, label, func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                self.record(label, started, time.perf_counter() - started)
+        return wrapper
+
+    def record(self, label, started, elapsed):
+        with self.lock:
+            entry = self.stats.get(label)
+            if entry is None:
+                entry = self.stats[label] = [0, 0.0, 0.0]
+            entry[0] += 1
+            entry[1] += elapsed
+            if elapsed > entry[2]:
+                entry[2] = elapsed
+            self.events.append((label, started, elapsed, threading.get_ident()))
+
+    def reset(self):
+        with self.lock:
+            self.stats.clear()
+            self.events.clear()
+
+    def slowest(self, limit=None, sort_by="total"):
+        """Rows of (label, calls, total ms, mean ms, max ms), slowest first by total or max"""
+        with self.lock:
+            rows = [(label, calls, total * 1000, total * 1000 / calls, longest * 1000)
+                    for label, (calls, total, longest) in self.stats.items()]
+        column = 4 if sort_by == "max" else 2
+        rows.sort(key=lambda row: row[column], reverse=True)
+        return rows[:limit] if limit else rows
+
+    def dump_trace(self, file_path):
+        """Write the recorded calls as Chrome trace events (chrome://tracing, Perfetto), returns how many"""
+        with self.lock:
+            events = list(self.events)
+            summary = {label: {"calls": calls, "total_ms": round(total * 1000, 3), "max_ms": round(longest * 1000, 3)}
+                       for label, (calls, total, longest) in self.stats.items()}
+        trace = [{"name": label, "ph": "X", "pid": os.getpid(), "tid": thread,
+                  "ts": round((started - self.started) * 1e6, 1), "dur": round(elapsed * 1e6, 1)}
+                 for label, started, elapsed, thread in events]
+        with open(file_path, 'w') as f:
+            json.dump({"traceEvents": trace, "otherData": {"summary": summary}}, f)
+        return len(trace)
+
+    def capture_next(self, obj, names, on_done):
+        """Run the next call to any of these methods under cProfile, then call on_done(name, profile)"""
+        previous = {name: obj.__dict__.get(name) for name in names}
+        installed = {}
+        fired = []
+
+        def restore():
+            for name, method in previous.items():
+                # Leave alone anything attach() or detach() changed in the meantime
+                if obj.__dict__.get(name) is not installed[name]:
+                    continue
+                if method is None:
+                    obj.__dict__.pop(name, None)
+                else:
+                    setattr(obj, name, method)
+
+        def one_shot(name, func):
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                # Screens that open other screens only get the outer one profiled
+                if fired:
+                    return func(*args, **kwargs)
+                fired.append(name)
+                restore()
+                profile = cProfile.Profile()
+                try:
+                    return profile.runcall(func, *args, **kwargs)
+                finally:
+                    on_done(name, profile)
+            return wrapper
+
+        for name in names:
+            installed[name] = one_shot(name, getattr(obj, name))
+            setattr(obj, name, installed[name])
@@ -0,0 +1,171 @@
+import sys
+
+
+class Record:
+    """Fixed-field record with dict-style access, __slots__ drops the per-row key dict
+
+    A field that was never set reads as a missing key, matching the JSON
+    format where e.g. return details only exist on returned borrowings.
+    """
+
+    __slots__ = ()
+    FIELDS = ()
+    # String fields whose values repeat across rows (names, dates, conditions)
+    INTERNED = ()
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls.FIELD_SET = frozenset(cls.FIELDS)
+        # Slot descriptors' setters, for from_dict()
+        cls.SETTERS = {key: getattr(cls, key).__set__ for key in cls.__dict__.get("__slots__", ())}
+
+    def __init__(self, **fields):
+        for key, value in fields.items():
+            self[key] = value
+
+    @classmethod
+    def from_dict(cls, data):
+        """Build a record from loaded data, the hot path of a cold start
+
+        Same result as cls(**data), but sets the slots directly instead of
+        going through __setitem__ for every field.
+        """
+        record = cls.__new__(cls)
+        setters = cls.SETTERS
+        interned = cls.INTERNED
+        intern = sys.intern
+        for key, value in data.items():
+            if key in interned:
+                if value.__class__ is str:
+                    value = intern(value)
+            elif key == "contact_info":
+                value = intern_contact(value)
+            setters[key](record, value)
+        return record
+
+    def to_dict(self):
+        return {key: getattr(self, key) for key in self.keys()}
+
+    def replace_fields(self, data):
+        """Make this record equal to data in place, for screens holding on to the object"""
+        for key in self.keys():
+            if key not in data:
+                delattr(self, key)
+        for key, value in data.items():
+            self[key] = value
+
+    def __getitem__(self, key):
+        if key not in self.FIELD_SET:
+            raise KeyError(key)
+        try:
+            return getattr(self, key)
+        except AttributeError:
+            raise KeyError(key) from None
+
+    def __setitem__(self, key, value):
+        if key not in self.FIELD_SET:
+            raise KeyError(key)
+        if key in self.INTERNED and isinstance(value, str):
+            value = sys.intern(value)
+        elif key == "contact_info":
+            value = intern_contact(value)
+        setattr(self, key, value)
+
+    def __delitem__(self, key):
+        try:
+            delattr(self, key)
+        except AttributeError:
+            raise KeyError(key) from None
+
+    def __contains__(self, key):
+        return key in self.FIELD_SET and hasattr(self, key)
+
+    def get(self, key, default=None):
+        if key in self.FIELD_SET:
+            return getattr(self, key, default)
+        return default
+
+    def keys(self):
+        return [key for key in self.FIELDS if hasattr(self, key)]
+
+    def items(self):
+        return [(key, getattr(self, key)) for key in self.keys()]
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def __len__(self):
+        return len(self.keys())
+
+    def __eq__(self, other):
+        if isinstance(other, (Record, dict)):
+            return self.to_dict() == dict(other)
+        return NotImplemented
+
+    __hash__ = object.__hash__
+
+    def __repr__(self):
+        return f"{type(self).__name__}({self.to_dict()!r})"
+
+
+class Utensil(Record):
+    FIELDS = ("id", "name", "category", "quantity", "available")
+    INTERNED = ("category",)
+    __slots__ = FIELDS
+
+
+class Borrowing(Record):
+    FIELDS = ("id", "borrower_name", "utensil_name", "utensil_id", "quantity", "borrow_date", "due_date",
+              "returned", "return_date", "return_condition", "return_notes", "return_quantity", "contact_info",
+              "split_from")
+    INTERNED = ("borrower_name", "utensil_name", "borrow_date", "due_date", "return_date", "return_condition")
+    __slots__ = FIELDS
+
+
+# Return conditions, best first. Packed snapshots store the position, so only ever add to the end
+CONDITIONS = ("Excellent", "Good", "Fair", "Damaged", "Lost")
+
+
+class Borrower(Record):
+    FIELDS = ("name", "credit_score", "total_borrowings", "on_time_returns", "late_returns",
+              "damaged_items", "contact_info")
+    INTERNED = ("name",)
+    __slots__ = FIELDS
+
+
+_contacts = {}
+
+
+def intern_contact(contact_info):
+    """Share one dict per distinct contact, treat the result as read-only"""
+    if not isinstance(contact_info, dict):
+        return contact_info
+    try:
+        key = tuple(sorted(contact_info.items()))
+        return _contacts.setdefault(key, contact_info)
+    except TypeError:
+        return contact_info
+
+
+def record_to_json(obj):
+    """json.dumps default= hook for records"""
+    if isinstance(obj, Record):
+        return obj.to_dict()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+class IdAllocator:
+    """Hands out increasing ids that are never reused, even after the highest record is deleted"""
+
+    def __init__(self, used_ids=()):
+        self.next_id = max(used_ids, default=0) + 1
+
+    def allocate(self):
+        allocated = self.next_id
+        self.next_id += 1
+        return allocated
+
+    def seen(self, used_id):
+        """Keep ahead of an id that came from outside the allocator"""
+        if used_id >= self.next_id:
+            self.next_id = used_id + 1
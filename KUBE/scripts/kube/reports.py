@@ -0,0 +1,277 @@
+import threading
+from array import array
+
+from kube.overdue import date_ordinal, today_ordinal
+
+NO_DATE = -1
+# Below this many loans a window is cheaper to compute in-process than to ship to a worker
+POOL_MIN_ROWS = 200000
+
+WINDOWS = {
+    "Last 30 days": 30,
+    "Last 90 days": 90,
+    "Last 365 days": 365,
+    "All time": None,
+}
+
+METRICS = ("loans", "quantity", "returns", "loan_days", "late", "peak")
+
+
+def _ordinal(date_str):
+    return date_ordinal(date_str) if date_str else NO_DATE
+
+
+def window_bounds(window, today=None):
+    """(start, end) day ordinals, inclusive, for a WINDOWS label"""
+    if today is None:
+        today = today_ordinal()
+    days = WINDOWS[window]
+    return (0 if days is None else today - days + 1), today
+
+
+class LoanColumns:
+    """Columnar copy of the borrowing history, one row per borrowing id
+
+    A partial-return remainder (split_from set) keeps its own row, so peak
+    sees its quantity out until it comes back, but counts 0 in new_loan:
+    it is the rest of the loan it was split from, not a new one.
+    """
+
+    def __init__(self, borrowings=()):
+        self.row_by_id = {}
+        self.utensil_names = {}
+        self.utensil_id = array('i')
+        self.borrowed_on = array('i')
+        self.due_on = array('i')
+        self.returned_on = array('i')
+        self.quantity = array('i')
+        self.new_loan = array('i')
+        for borrowing in borrowings:
+            self.upsert(borrowing)
+
+    def __len__(self):
+        return len(self.utensil_id)
+
+    def upsert(self, borrowing):
+        """Add a new borrowing or refresh one that was returned or split"""
+        returned_on = _ordinal(borrowing.get("return_date")) if borrowing.get("returned") else NO_DATE
+        row = self.row_by_id.get(borrowing["id"])
+        if row is None:
+            self.row_by_id[borrowing["id"]] = len(self.utensil_id)
+            self.utensil_id.append(borrowing["utensil_id"])
+            self.borrowed_on.append(_ordinal(borrowing.get("borrow_date")))
+            self.due_on.append(_ordinal(borrowing.get("due_date")))
+            self.returned_on.append(returned_on)
+            self.quantity.append(borrowing["quantity"])
+            self.new_loan.append(0 if borrowing.get("split_from") is not None else 1)
+        else:
+            self.returned_on[row] = returned_on
+            self.quantity[row] = borrowing["quantity"]
+        self.utensil_names[borrowing["utensil_id"]] = borrowing["utensil_name"]
+
+    def snapshot(self):
+        """Copy the columns so a worker can read them while new loans come in"""
+        return (array('i', self.utensil_id), array('i', self.borrowed_on), array('i', self.due_on),
+                array('i', self.returned_on), array('i', self.quantity), array('i', self.new_loan))
+
+
+# numpy is optional and slow to import, so it is looked up on the first report, not at startup
+np = None
+_numpy_checked = False
+
+
+def _have_numpy():
+    global np, _numpy_checked
+    if not _numpy_checked:
+        try:
+            import numpy as np
+        except ImportError:
+            np = None
+        _numpy_checked = True
+    return np is not None
+
+
+def rollup(columns, group_of_utensil, group_count, start, end):
+    """Per-group totals for loans in [start, end], returns {metric: list indexed by group}
+
+    A loan is late when it came back on or after its due date, the day it
+    turns overdue, as in the credit score. Peak is the highest total
+    quantity out at once, treating a loan as out from its borrow day up to
+    (not including) its return day.
+    """
+    if _have_numpy():
+        return _rollup_numpy(columns, group_of_utensil, group_count, start, end)
+    return _rollup_python(columns, group_of_utensil, group_count, start, end)
+
+
+def _rollup_numpy(columns, group_of_utensil, group_count, start, end):
+    utensil_id, borrowed, due, returned, qty, new_loan = (np.frombuffer(c, dtype=np.intc).astype(np.int64) for c in columns)
+    totals = {metric: [0] * group_count for metric in METRICS}
+    if not len(utensil_id):
+        return totals
+
+    lookup = np.zeros(max(int(utensil_id.max()), max(group_of_utensil, default=0)) + 1, dtype=np.int64)
+    for uid, code in group_of_utensil.items():
+        lookup[uid] = code
+    groups = lookup[utensil_id]
+
+    def count(mask, weights=None):
+        return np.bincount(groups[mask], weights=None if weights is None else weights[mask], minlength=group_count)
+
+    borrowed_in = (borrowed >= start) & (borrowed <= end)
+    returned_in = (returned != NO_DATE) & (returned >= start) & (returned <= end)
+    totals["loans"] = count(borrowed_in, new_loan).astype(np.int64).tolist()
+    totals["quantity"] = count(borrowed_in, qty).astype(np.int64).tolist()
+    totals["returns"] = count(returned_in).tolist()
+    totals["loan_days"] = count(returned_in, returned - borrowed).astype(np.int64).tolist()
+    totals["late"] = count(returned_in & (due != NO_DATE) & (returned >= due)).tolist()
+
+    # Sweep +qty/-qty events per group, closing events sort first within a day
+    closed = np.where(returned == NO_DATE, end + 1, np.maximum(returned, borrowed + 1))
+    live = (borrowed != NO_DATE) & (borrowed <= end) & (closed > start)
+    if live.any():
+        live_groups = groups[live]
+        event_group = np.concatenate((live_groups, live_groups))
+        event_day = np.concatenate((np.maximum(borrowed[live], start), np.minimum(closed[live], end + 1)))
+        event_delta = np.concatenate((qty[live], -qty[live]))
+        # One packed int64 key (group, day, opening) sorts far faster than a lexsort
+        event_day -= event_day.min()
+        order = np.argsort((event_group * (int(event_day.max()) + 1) + event_day) * 2 + (event_delta > 0))
+        event_group = event_group[order]
+        # Every loan opens and closes inside the sweep, so each group's running level starts from zero
+        level = np.cumsum(event_delta[order])
+        starts = np.flatnonzero(np.concatenate(([True], event_group[1:] != event_group[:-1])))
+        peaks = np.maximum.reduceat(level, starts)
+        for group, peak in zip(event_group[starts].tolist(), peaks.tolist()):
+            totals["peak"][group] = max(peak, 0)
+    return totals
+
+
+def _rollup_python(columns, group_of_utensil, group_count, start, end):
+    totals = {metric: [0] * group_count for metric in METRICS}
+    events = {}
+    for uid, borrowed, due, returned, qty, new_loan in zip(*columns):
+        group = group_of_utensil.get(uid, 0)
+        if start <= borrowed <= end:
+            totals["loans"][group] += new_loan
+            totals["quantity"][group] += qty
+        if returned != NO_DATE and start <= returned <= end:
+            totals["returns"][group] += 1
+            totals["loan_days"][group] += returned - borrowed
+            if due != NO_DATE and returned >= due:
+                totals["late"][group] += 1
+
+        closed = end + 1 if returned == NO_DATE else max(returned, borrowed + 1)
+        if borrowed != NO_DATE and borrowed <= end and closed > start:
+            group_events = events.setdefault(group, [])
+            group_events.append((max(borrowed, start), qty))
+            group_events.append((min(closed, end + 1), -qty))
+
+    for group, group_events in events.items():
+        group_events.sort()
+        level = peak = 0
+        for _, delta in group_events:
+            level += delta
+            peak = max(peak, level)
+        totals["peak"][group] = peak
+    return totals
+
+
+class ReportEngine:
+    """Utilization rollups over the borrowing history, cached until the history changes
+
+    The columns are built on the first report, so startup does not pay for them.
+    """
+
+    def __init__(self):
+        self.columns = None
+        self.version = 0
+        self.cache = {}
+        self.lock = threading.Lock()
+        self.pool = None
+
+    def update(self, borrowing):
+        """Keep the columns in step with a borrow, return or split"""
+        with self.lock:
+            if self.columns is not None:
+                self.columns.upsert(borrowing)
+            self.version += 1
+            self.cache.clear()
+
+    def prepare(self, borrowings, utensils, group_by):
+        """Take what a report needs from the live data, call with the data lock held"""
+        with self.lock:
+            if self.columns is None:
+                self.columns = LoanColumns(borrowings)
+            labels = dict(self.columns.utensil_names)
+            categories = {}
+            for utensil in utensils:
+                labels[utensil["id"]] = utensil["name"]
+                categories[utensil["id"]] = utensil.get("category") or "Uncategorized"
+            if group_by == "Category":
+                labels = {uid: categories.get(uid, "Uncategorized") for uid in labels}
+
+            group_names = sorted(set(labels.values()))
+            codes = {name: code for code, name in enumerate(group_names)}
+            group_of_utensil = {uid: codes[label] for uid, label in labels.items()}
+            return {
+                "version": self.version,
+                "group_by": group_by,
+                "group_names": group_names,
+                "group_of_utensil": group_of_utensil,
+                # Renamed or recategorized utensils change the layout without touching the history
+                "layout": (tuple(group_names), tuple(sorted(group_of_utensil.items()))),
+                "columns": self.columns.snapshot(),
+            }
+
+    def run(self, prepared, windows, today=None):
+        """Build report rows for each window label, heavy multi-window runs go through a process pool"""
+        if today is None:
+            today = today_ordinal()
+        results = {}
+        todo = []
+        for window in windows:
+            key = (prepared["version"], prepared["layout"], window, today)
+            with self.lock:
+                cached = self.cache.get(key)
+            if cached is not None:
+                results[window] = cached
+            else:
+                todo.append((window, key))
+
+        args = [(prepared["columns"], prepared["group_of_utensil"], len(prepared["group_names"])) +
+                window_bounds(window, today) for window, _ in todo]
+        if len(todo) > 1 and len(prepared["columns"][0]) >= POOL_MIN_ROWS:
+            if self.pool is None:
+                from concurrent.futures import ProcessPoolExecutor
+                self.pool = ProcessPoolExecutor(max_workers=min(len(todo), 4))
+            totals = list(self.pool.map(rollup, *zip(*args)))
+        else:
+            totals = [rollup(*arg) for arg in args]
+
+        for (window, key), window_totals in zip(todo, totals):
+            rows = self._rows(prepared["group_names"], window_totals)
+            with self.lock:
+                if self.version == prepared["version"]:
+                    self.cache[key] = rows
+            results[window] = rows
+        return results
+
+    def _rows(self, group_names, totals):
+        rows = []
+        for code, name in enumerate(group_names):
+            returns = totals["returns"][code]
+            rows.append({
+                "name": name,
+                "loans": totals["loans"][code],
+                "quantity": totals["quantity"][code],
+                "mean_loan_days": totals["loan_days"][code] / returns if returns else None,
+                "late_rate": totals["late"][code] / returns if returns else None,
+                "peak": totals["peak"][code],
+            })
+        return rows
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.shutdown(wait=False)
+            self.pool = None
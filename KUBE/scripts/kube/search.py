@@ -0,0 +1,54 @@
+def trigrams(text):
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+class TrigramIndex:
+    """Substring index over borrower and utensil names"""
+
+    def __init__(self, borrowings=()):
+        # Names repeat across borrowings, so trigrams point at distinct names and names at borrowing ids
+        self.postings = {}
+        self.names_by_trigram = {}
+        for borrowing in borrowings:
+            self.add(borrowing)
+
+    def add(self, borrowing):
+        for name in (borrowing["borrower_name"], borrowing["utensil_name"]):
+            self._add_name(name.lower(), borrowing["id"])
+
+    def remove(self, borrowing):
+        for name in (borrowing["borrower_name"], borrowing["utensil_name"]):
+            ids = self.postings.get(name.lower())
+            if ids is not None:
+                ids.discard(borrowing["id"])
+
+    def _add_name(self, name, borrowing_id):
+        ids = self.postings.get(name)
+        if ids is None:
+            ids = self.postings[name] = set()
+            for trigram in trigrams(name):
+                self.names_by_trigram.setdefault(trigram, set()).add(name)
+        ids.add(borrowing_id)
+
+    def matching_names(self, term):
+        """Distinct names containing the term"""
+        term = term.lower()
+        if len(term) < 3:
+            return [name for name in self.postings if term in name]
+
+        candidates = None
+        for trigram in sorted(trigrams(term), key=lambda t: len(self.names_by_trigram.get(t, ()))):
+            names = self.names_by_trigram.get(trigram)
+            if not names:
+                return []
+            candidates = set(names) if candidates is None else candidates & names
+            if not candidates:
+                return []
+        return [name for name in candidates if term in name]
+
+    def search(self, term):
+        """Ids of borrowings whose borrower or utensil name contains the term"""
+        ids = set()
+        for name in self.matching_names(term):
+            ids |= self.postings[name]
+        return ids
@@ -0,0 +1,406 @@
+import asyncio
+import json
+import re
+import signal
+import time
+import traceback
+from collections import deque
+from http import HTTPStatus
+from itertools import islice
+from urllib.parse import parse_qs, unquote, urlsplit
+
+from kube.bulk import parse_borrow, parse_date, parse_return
+from kube.records import record_to_json
+from kube.reports import WINDOWS
+
+MAX_BODY = 1024 * 1024
+MAX_HEADERS = 100
+# Idle keep-alive connections are closed after this many seconds
+IDLE_TIMEOUT = 15
+# Mutations queued while a commit is in flight go out together in the next one
+MAX_WRITE_BATCH = 500
+LATENCY_SAMPLES = 2048
+
+
+class HTTPError(Exception):
+    def __init__(self, status, message=None):
+        super().__init__(message or HTTPStatus(status).phrase)
+        self.status = status
+
+
+class LatencyStats:
+    """Recent request latencies per route, for percentiles"""
+
+    def __init__(self, samples=LATENCY_SAMPLES):
+        self.samples = samples
+        self.by_route = {}
+        self.counts = {}
+
+    def record(self, route, seconds):
+        recent = self.by_route.get(route)
+        if recent is None:
+            recent = self.by_route[route] = deque(maxlen=self.samples)
+        recent.append(seconds)
+        self.counts[route] = self.counts.get(route, 0) + 1
+
+    def summary(self):
+        """{route: {count, p50_ms, p95_ms, p99_ms, max_ms}} over the recent samples"""
+        summary = {}
+        for route, recent in sorted(self.by_route.items()):
+            ordered = sorted(recent)
+            summary[route] = {"count": self.counts[route]}
+            for name, fraction in (("p50_ms", 0.5), ("p95_ms", 0.95), ("p99_ms", 0.99), ("max_ms", 1.0)):
+                value = ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+                summary[route][name] = round(value * 1000, 3)
+        return summary
+
+
+class APIServer:
+    """HTTP/JSON API over a loaded KubeEngine
+
+    Reads take the data lock on a worker thread, never on the event loop,
+    so a commit or report build holding it stalls no connection. Every
+    mutation goes through one writer task, which applies whatever is
+    queued as one engine.transaction() on a worker thread and only answers
+    once it is committed, so a 2xx means the change is on disk. Changes other KUBE
+    instances save to the data folder are picked up every two seconds.
+    """
+
+    def __init__(self, engine, token=None):
+        self.engine = engine
+        self.token = token
+        self.stats = LatencyStats()
+        self.writes = None
+        self.routes = [
+            ("GET", re.compile(r"/utensils"), self.get_utensils),
+            ("GET", re.compile(r"/borrowings"), self.get_borrowings),
+            ("GET", re.compile(r"/borrowings/(\d+)"), self.get_borrowing),
+            ("GET", re.compile(r"/overdue"), self.get_overdue),
+            ("GET", re.compile(r"/borrowers"), self.get_borrowers),
+            ("GET", re.compile(r"/borrowers/([^/]+)"), self.get_borrower),
+            ("GET", re.compile(r"/reports"), self.get_report),
+            ("GET", re.compile(r"/stats"), self.get_stats),
+            ("POST", re.compile(r"/borrow"), self.post_borrow),
+            ("POST", re.compile(r"/return"), self.post_return),
+        ]
+
+    async def serve(self, host, port):
+        self.writes = asyncio.Queue()
+        stopping = asyncio.Event()
+        try:
+            asyncio.get_event_loop().add_signal_handler(signal.SIGTERM, stopping.set)
+        except (NotImplementedError, AttributeError):
+            pass  # No signal handlers on Windows, Ctrl+C still stops the server
+        tasks = [asyncio.ensure_future(self._write_loop()), asyncio.ensure_future(self._sweep_loop()),
+                 asyncio.ensure_future(self._refresh_loop())]
+        server = await asyncio.start_server(self._serve_connection, host, port)
+        try:
+            await stopping.wait()
+        finally:
+            server.close()
+            for task in tasks:
+                task.cancel()
+
+    async def _sweep_loop(self):
+        """Keep overdue status current across day boundaries, like the window's minute check"""
+        while True:
+            await asyncio.sleep(60)
+            await asyncio.get_event_loop().run_in_executor(None, self.engine.sweep_overdue)
+
+    async def _refresh_loop(self):
+        """Reload what other instances sharing the data folder saved, waiting for their lock off the loop"""
+        loop = asyncio.get_event_loop()
+        while True:
+            await asyncio.sleep(2)
+            if self.engine.shared.changed():
+                await loop.run_in_executor(None, self.engine.refresh)
+
+    # Connections
+
+    async def _serve_connection(self, reader, writer):
+        try:
+            while True:
+                try:
+                    request_line = await asyncio.wait_for(reader.readline(), IDLE_TIMEOUT)
+                except asyncio.TimeoutError:
+                    break
+                if not request_line:
+                    break
+                started = time.perf_counter()
+                route = "-"
+                keep_alive = False
+                try:
+                    method, target, version = self._parse_request_line(request_line)
+                    headers = await self._read_headers(reader)
+                    connection = headers.get("connection", "").lower()
+                    keep_alive = connection != "close" if version == "HTTP/1.1" else connection == "keep-alive"
+                    body = await self._read_body(reader, headers)
+                    route, status, payload = await self._dispatch(method, target, headers, body)
+                except HTTPError as e:
+                    status, payload = e.status, {"error": str(e)}
+                    if e.status >= 500 or e.status in (400, 413, 431):
+                        keep_alive = False
+
+                self._write_response(writer, status, payload, keep_alive)
+                await writer.drain()
+                self.stats.record(route, time.perf_counter() - started)
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    def _parse_request_line(self, request_line):
+        parts = request_line.decode("latin-1").split()
+        if len(parts) != 3 or not parts[2].startswith("HTTP/1."):
+            raise HTTPError(400, "Malformed request line")
+        return parts
+
+    async def _read_headers(self, reader):
+        headers = {}
+        while True:
+            try:
+                line = await reader.readline()
+            except ValueError:
+                raise HTTPError(431) from None
+            if line in (b"\r\n", b"\n", b""):
+                return headers
+            if len(headers) >= MAX_HEADERS:
+                raise HTTPError(431)
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+
+    async def _read_body(self, reader, headers):
+        if "transfer-encoding" in headers:
+            raise HTTPError(400, "Chunked request bodies are not supported, send Content-Length")
+        try:
+            length = int(headers.get("content-length", 0))
+        except ValueError:
+            raise HTTPError(400, "Bad Content-Length") from None
+        if length > MAX_BODY:
+            raise HTTPError(413)
+        return await reader.readexactly(length) if length > 0 else b""
+
+    def _write_response(self, writer, status, payload, keep_alive):
+        body = json.dumps(payload, default=record_to_json).encode("utf-8")
+        head = (f"HTTP/1.1 {status} {HTTPStatus(status).phrase}\r\n"
+                f"Content-Type: application/json\r\n"
+                f"Content-Length: {len(body)}\r\n"
+                f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n")
+        if keep_alive:
+            head += f"Keep-Alive: timeout={IDLE_TIMEOUT}\r\n"
+        writer.write(head.encode("latin-1") + b"\r\n" + body)
+
+    async def _dispatch(self, method, target, headers, body):
+        """Returns (route label, status, payload)"""
+        if self.token and headers.get("authorization") != f"Bearer {self.token}":
+            raise HTTPError(401)
+        url = urlsplit(target)
+        path = url.path.rstrip("/") or "/"
+        allowed = []
+        for route_method, pattern, handler in self.routes:
+            match = pattern.fullmatch(path)
+            if match is None:
+                continue
+            if route_method != method:
+                allowed.append(route_method)
+                continue
+            query = {key: values[-1] for key, values in parse_qs(url.query).items()}
+            data = None
+            if method == "POST":
+                try:
+                    data = json.loads(body.decode("utf-8") or "null")
+                except ValueError:
+                    raise HTTPError(400, "Body is not valid JSON") from None
+            route = f"{method} {pattern.pattern}"
+            try:
+                status, payload = await handler(*[unquote(group) for group in match.groups()], query=query, data=data)
+            except ValueError as e:
+                status, payload = 422, {"error": str(e)}
+            except HTTPError as e:
+                status, payload = e.status, {"error": str(e)}
+            except Exception:
+                traceback.print_exc()
+                status, payload = 500, {"error": "Internal Server Error"}
+            return route, status, payload
+        raise HTTPError(405 if allowed else 404)
+
+    # Reads
+
+    def _utensil_row(self, utensil):
+        row = utensil.to_dict()
+        row["borrowed"] = utensil["quantity"] - utensil["available"]
+        return row
+
+    def _borrowing_row(self, borrowing):
+        row = borrowing.to_dict()
+        row["status"] = self.engine.get_borrowing_status(borrowing)
+        return row
+
+    async def _read(self, read):
+        """Run read() under the data lock on a worker thread, the lock can be held for a whole commit or report build"""
+        def locked():
+            with self.engine.data_lock:
+                return read()
+        return await asyncio.get_event_loop().run_in_executor(None, locked)
+
+    async def get_utensils(self, query, data):
+        return 200, await self._read(lambda: [self._utensil_row(u) for u in self.engine.utensils])
+
+    async def get_borrowings(self, query, data):
+        """?q=name substring&status=All|Active|Returned|Overdue&offset=&limit=, in id order"""
+        status = query.get("status", "All")
+        if status not in ("All", "Active", "Returned", "Overdue"):
+            raise ValueError("status must be All, Active, Returned or Overdue")
+        offset = self._int_param(query, "offset", 0)
+        limit = min(self._int_param(query, "limit", 100), 1000)
+        if limit < 1:
+            # next_offset would never move on
+            raise HTTPError(400, "limit must be at least 1")
+
+        def read():
+            matches = self.engine.iter_search_borrowings(query.get("q", ""), status)
+            return [self._borrowing_row(b) for b in islice(matches, offset, offset + limit + 1)]
+        rows = await self._read(read)
+        more = len(rows) > limit
+        return 200, {"borrowings": rows[:limit], "next_offset": offset + limit if more else None}
+
+    async def get_borrowing(self, borrowing_id, query, data):
+        def read():
+            borrowing = self.engine.borrowings_by_id.get(int(borrowing_id))
+            if borrowing is None:
+                raise HTTPError(404, "Borrowing not found")
+            return self._borrowing_row(borrowing)
+        return 200, await self._read(read)
+
+    async def get_overdue(self, query, data):
+        def read():
+            rows = []
+            for borrowing in self.engine.get_overdue_borrowings():
+                row = self._borrowing_row(borrowing)
+                row["days_overdue"] = self.engine.days_overdue(borrowing)
+                rows.append(row)
+            return rows
+        return 200, await self._read(read)
+
+    def _borrower_row(self, borrower_name):
+        data = self.engine.borrowers.get(self.engine.get_borrower_key(borrower_name))
+        row = data.to_dict() if data is not None else {"name": borrower_name, "credit_score": 100}
+        row["name"] = borrower_name
+        row["active_quantity"] = self.engine.get_active_borrowings_count(borrower_name)
+        return row
+
+    async def get_borrowers(self, query, data):
+        return 200, await self._read(lambda: [self._borrower_row(name) for name in self.engine.borrower_view.names()])
+
+    async def get_borrower(self, borrower_name, query, data):
+        def read():
+            history = self.engine.get_borrower_history(borrower_name)
+            if not history:
+                raise HTTPError(404, "Borrower not found")
+            row = self._borrower_row(borrower_name)
+            row["borrowings"] = [self._borrowing_row(borrowing) for borrowing in history]
+            return row
+        return 200, await self._read(read)
+
+    async def get_report(self, query, data):
+        """?window=one of WINDOWS&group_by=Utensil|Category, computed on a worker thread"""
+        window = query.get("window", "Last 30 days")
+        group_by = query.get("group_by", "Utensil")
+        if window not in WINDOWS:
+            raise ValueError(f"window must be one of {', '.join(WINDOWS)}")
+        if group_by not in ("Utensil", "Category"):
+            raise ValueError("group_by must be Utensil or Category")
+        engine = self.engine
+        # The first report builds its columns over the whole history, archive included
+        prepared = await self._read(lambda: engine.report_engine.prepare(engine.report_history(), engine.utensils, group_by))
+        loop = asyncio.get_event_loop()
+        reports = await loop.run_in_executor(None, engine.report_engine.run, prepared, [window])
+        return 200, reports[window]
+
+    async def get_stats(self, query, data):
+        counts = await self._read(self.engine.get_status_counts)
+        return 200, {"latency": self.stats.summary(), "queued_writes": self.writes.qsize(), "borrowings": counts}
+
+    def _int_param(self, query, key, default):
+        try:
+            value = int(query.get(key, default))
+        except ValueError:
+            raise ValueError(f"{key} must be a whole number") from None
+        if value < 0:
+            raise ValueError(f"{key} must not be negative")
+        return value
+
+    # Writes
+
+    async def post_borrow(self, query, data):
+        """{borrower, due_date, items: [{utensil or utensil_id, quantity}], phone, email}"""
+        def apply():
+            return self.engine.borrow_items(*parse_borrow(self.engine, data))
+        return 201, {"borrowings": await self._submit(apply)}
+
+    async def post_return(self, query, data):
+        """{returns: [{id, quantity, condition, notes}], return_date}, all or nothing"""
+        if not isinstance(data, dict) or not isinstance(data.get("returns"), list):
+            raise ValueError("Expected an object with a returns list")
+
+        def apply():
+            returns = [parse_return(self.engine, row) for row in data["returns"]]
+            ids = [borrowing["id"] for borrowing, _, _, _ in returns]
+            if len(set(ids)) != len(ids):
+                raise HTTPError(400, "A borrowing is listed more than once, send its whole quantity in one entry")
+            return self.engine.return_items(returns, return_date=parse_date(data, "return_date"))
+        return 200, {"borrowings": await self._submit(apply)}
+
+    async def _submit(self, apply):
+        """Queue apply() for the writer task and wait until its commit is on disk"""
+        future = asyncio.get_event_loop().create_future()
+        await self.writes.put((apply, future))
+        return await future
+
+    async def _write_loop(self):
+        loop = asyncio.get_event_loop()
+        while True:
+            batch = [await self.writes.get()]
+            while len(batch) < MAX_WRITE_BATCH and not self.writes.empty():
+                batch.append(self.writes.get_nowait())
+
+            results = []
+            saved = await loop.run_in_executor(None, self._apply_batch, batch, results)
+            for future, value, error in results:
+                if future.cancelled():
+                    continue
+                if error is not None:
+                    future.set_exception(error)
+                elif not saved:
+                    # The failed commit was rolled back to what is on disk, nothing of it is kept
+                    future.set_exception(HTTPError(503, "Not saved, the change was discarded, send the request again"))
+                else:
+                    future.set_result(value)
+
+    def _apply_batch(self, batch, results):
+        """Apply queued writes as one transaction, returns False if it could not be saved"""
+        try:
+            with self.engine.transaction():
+                for apply, future in batch:
+                    try:
+                        # Copy the records now, a later write in the batch may change them
+                        results.append((future, json.loads(json.dumps(apply(), default=record_to_json)), None))
+                    except (ValueError, HTTPError) as e:
+                        results.append((future, None, e))
+                    except Exception as e:
+                        results.append((future, None, HTTPError(500, f"{type(e).__name__}: {e}")))
+        except IOError:
+            return False
+        return True
+
+
+def run(engine, host="127.0.0.1", port=8765, token=None):
+    """Serve until Ctrl+C or SIGTERM, returns the latency summary"""
+    server = APIServer(engine, token)
+    try:
+        asyncio.run(server.serve(host, port))
+    except KeyboardInterrupt:
+        pass
+    return server.stats.summary()
@@ -0,0 +1,170 @@
+import json
+import os
+import threading
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+from kube.commit import recover_group
+
+
+class ConflictError(Exception):
+    """Another KUBE instance changed collections this one was about to overwrite"""
+
+    def __init__(self, collections):
+        super().__init__("Changed by another KUBE instance: " + ", ".join(collections))
+        self.collections = collections
+
+
+class DataDirLock:
+    """Advisory lock on a file, re-entrant within the process
+
+    Threads queue on an RLock and only the outermost acquire takes the
+    OS-level lock, so other processes wait until this one is done.
+    """
+
+    def __init__(self, lock_file):
+        self.lock_file = lock_file
+        self.thread_lock = threading.RLock()
+        self.depth = 0
+        self.handle = None
+
+    def acquire(self):
+        self.thread_lock.acquire()
+        if self.depth == 0:
+            try:
+                self._lock_file()
+            except BaseException:
+                self.thread_lock.release()
+                raise
+        self.depth += 1
+        return self.depth == 1
+
+    def release(self):
+        self.depth -= 1
+        if self.depth == 0:
+            self._unlock_file()
+        self.thread_lock.release()
+
+    def _lock_file(self):
+        self.handle = open(self.lock_file, 'a+')
+        if fcntl is not None:
+            fcntl.flock(self.handle.fileno(), fcntl.LOCK_EX)
+            return
+        self.handle.seek(0)
+        while True:
+            try:
+                msvcrt.locking(self.handle.fileno(), msvcrt.LK_LOCK, 1)
+                return
+            except OSError:
+                pass  # LK_LOCK gives up after 10 seconds, keep waiting
+
+    def _unlock_file(self):
+        try:
+            if fcntl is not None:
+                fcntl.flock(self.handle.fileno(), fcntl.LOCK_UN)
+            else:
+                self.handle.seek(0)
+                msvcrt.locking(self.handle.fileno(), msvcrt.LK_UNLCK, 1)
+        finally:
+            self.handle.close()
+            self.handle = None
+
+
+class SharedDataDir:
+    """Lock and per-collection version counters for a data folder shared by several KUBE processes
+
+    Every group commit runs under the lock and bumps versions.json for the
+    collections it writes, in the same commit. Each instance remembers the
+    versions it last caught up with: changed() tells which collections to
+    reload, and stamp() refuses a commit from an instance that has not
+    caught up with everything, so nothing written elsewhere is overwritten.
+    Entering the lock first finishes any commit a crashed instance left
+    behind.
+    """
+
+    def __init__(self, data_dir, manifest_file, collection_of):
+        self.lock = DataDirLock(os.path.join(data_dir, ".lock"))
+        self.versions_file = os.path.join(data_dir, "versions.json")
+        self.manifest_file = manifest_file
+        # Maps a commit op to the names of the collections it writes
+        self.collection_of = collection_of
+        self.synced = {}
+        self.on_commit = None
+        self.on_conflict = None
+        self._stat = None
+        self._versions = {}
+        self._committing = None
+
+    def __enter__(self):
+        if self.lock.acquire():
+            try:
+                recover_group(self.manifest_file)
+            except BaseException:
+                self.lock.release()
+                raise
+        return self
+
+    def __exit__(self, *exc_info):
+        self.lock.release()
+
+    def read_versions(self, force=False):
+        """Version counters on disk, re-read only when the file was replaced unless forced"""
+        try:
+            st = os.stat(self.versions_file)
+        except FileNotFoundError:
+            self._stat, self._versions = None, {}
+            return {}
+        key = (st.st_ino, st.st_size, st.st_mtime_ns)
+        if force or key != self._stat:
+            with open(self.versions_file, 'r') as f:
+                self._versions = json.load(f)
+            self._stat = key
+        return self._versions
+
+    def changed(self, force=False):
+        """{collection: version} for collections other instances changed since the last sync
+
+        Without the lock this is a cheap stat() for polling, call it again
+        under the lock with force=True before acting on the answer.
+        """
+        return {name: version for name, version in self.read_versions(force).items()
+                if self.synced.get(name, 0) != version}
+
+    def mark_synced(self, versions):
+        self.synced.update(versions)
+
+    def stamp(self, ops):
+        """Ops bumping the versions of what ops write, call under the lock
+
+        Raises ConflictError instead when another instance committed
+        anything this one has not caught up with.
+        """
+        touched = sorted({name for op in ops for name in self.collection_of(op)})
+        if not touched:
+            return []
+        stale = sorted(self.changed(force=True))
+        if stale:
+            raise ConflictError(stale)
+        current = self.read_versions()
+        versions = dict(current)
+        for name in touched:
+            versions[name] = versions.get(name, 0) + 1
+        self._committing = {name: versions[name] for name in touched}
+        return [("replace", self.versions_file, json.dumps(versions, sort_keys=True))]
+
+    def committed(self):
+        """The stamped commit is on disk"""
+        committing, self._committing = self._committing, None
+        if committing:
+            self.synced.update(committing)
+            if self.on_commit:
+                self.on_commit(set(committing))
+
+    def rejected(self, error):
+        self._committing = None
+        if self.on_conflict:
+            self.on_conflict(error)
@@ -0,0 +1,302 @@
+import json
+import os
+import sqlite3
+import sys
+import threading
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS utensils (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL,
+    category TEXT,
+    quantity INTEGER NOT NULL,
+    available INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS borrowings (
+    id INTEGER PRIMARY KEY,
+    borrower_name TEXT NOT NULL,
+    borrower_key TEXT NOT NULL,
+    utensil_id INTEGER NOT NULL,
+    utensil_name TEXT NOT NULL,
+    quantity INTEGER NOT NULL,
+    borrow_date TEXT,
+    due_date TEXT,
+    returned INTEGER NOT NULL DEFAULT 0,
+    return_date TEXT,
+    return_condition TEXT,
+    return_notes TEXT,
+    return_quantity INTEGER,
+    contact_info TEXT,
+    split_from INTEGER,
+    updated_seq INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS sequences (
+    name TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS borrowers (
+    key TEXT PRIMARY KEY,
+    name TEXT NOT NULL,
+    credit_score INTEGER NOT NULL,
+    total_borrowings INTEGER NOT NULL,
+    on_time_returns INTEGER NOT NULL,
+    late_returns INTEGER NOT NULL,
+    damaged_items INTEGER NOT NULL,
+    contact_info TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_borrowings_borrower ON borrowings (borrower_key, returned);
+CREATE INDEX IF NOT EXISTS idx_borrowings_utensil ON borrowings (utensil_id, returned);
+CREATE INDEX IF NOT EXISTS idx_borrowings_returned ON borrowings (returned, due_date);
+CREATE INDEX IF NOT EXISTS idx_borrowings_due_date ON borrowings (due_date);
+CREATE INDEX IF NOT EXISTS idx_borrowings_updated_seq ON borrowings (updated_seq);
+"""
+
+BORROWING_COLUMNS = ("id", "borrower_name", "borrower_key", "utensil_id", "utensil_name", "quantity",
+                     "borrow_date", "due_date", "returned", "return_date", "return_condition",
+                     "return_notes", "return_quantity", "contact_info", "split_from")
+
+# Keys that are only present on returned borrowings in the JSON format
+RETURN_KEYS = ("return_date", "return_condition", "return_notes", "return_quantity")
+# Keys that are only present on some borrowings
+OPTIONAL_KEYS = RETURN_KEYS + ("split_from",)
+
+BORROWER_COUNTERS = ("credit_score", "total_borrowings", "on_time_returns", "late_returns", "damaged_items")
+
+
+class SQLiteStore:
+    """SQLite storage backend for utensils, borrowings and borrowers"""
+
+    def __init__(self, db_file):
+        self.db_file = db_file
+        # Shared by the UI thread and the background writer, every use goes through self.lock
+        self.conn = sqlite3.connect(db_file, check_same_thread=False)
+        self.conn.row_factory = sqlite3.Row
+        self.lock = threading.RLock()
+        with self.conn:
+            columns = [row[1] for row in self.conn.execute("PRAGMA table_info(borrowings)")]
+            if columns and "split_from" not in columns:
+                self.conn.execute("ALTER TABLE borrowings ADD COLUMN split_from INTEGER")
+            if columns and "updated_seq" not in columns:
+                self.conn.execute("ALTER TABLE borrowings ADD COLUMN updated_seq INTEGER NOT NULL DEFAULT 0")
+            self.conn.executescript(SCHEMA)
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+    def is_empty(self):
+        """Check if nothing has been stored yet"""
+        with self.lock:
+            row = self.conn.execute("SELECT (SELECT COUNT(*) FROM utensils) + (SELECT COUNT(*) FROM borrowings)").fetchone()
+        return row[0] == 0
+
+    # Loading
+
+    def load_utensils(self):
+        with self.lock:
+            rows = self.conn.execute("SELECT id, name, category, quantity, available FROM utensils ORDER BY rowid").fetchall()
+        utensils = []
+        for row in rows:
+            utensil = dict(row)
+            if utensil["category"] is None:
+                del utensil["category"]
+            utensils.append(utensil)
+        return utensils
+
+    def load_borrowings(self):
+        with self.lock:
+            rows = self.conn.execute("SELECT * FROM borrowings ORDER BY id").fetchall()
+        return [self._borrowing_from_row(row) for row in rows]
+
+    def load_borrowings_after(self, seq):
+        """Borrowings written after a write sequence number, returns (borrowings, last sequence number)
+
+        Every write stamps its rows with the next number of the borrowings
+        sequence, so this picks up returns of existing loans as well as new
+        ones. The rowid is the id and stays put on INSERT OR REPLACE.
+        """
+        with self.lock:
+            rows = self.conn.execute("SELECT * FROM borrowings WHERE updated_seq > ? ORDER BY updated_seq, id",
+                                     (seq,)).fetchall()
+        borrowings = []
+        for row in rows:
+            seq = row["updated_seq"]
+            borrowings.append(self._borrowing_from_row(row))
+        return borrowings, seq
+
+    def last_borrowing_seq(self):
+        with self.lock:
+            row = self.conn.execute("SELECT value FROM sequences WHERE name = 'borrowings'").fetchone()
+        return row[0] if row else 0
+
+    def _next_seq(self, name):
+        # Kept apart from the rows, so deleting the newest ones never hands a number out twice
+        self.conn.execute("INSERT INTO sequences (name, value) VALUES (?, 1) "
+                          "ON CONFLICT (name) DO UPDATE SET value = value + 1", (name,))
+        return self.conn.execute("SELECT value FROM sequences WHERE name = ?", (name,)).fetchone()[0]
+
+    def load_borrowers(self):
+        with self.lock:
+            rows = self.conn.execute("SELECT * FROM borrowers").fetchall()
+        borrowers = {}
+        for row in rows:
+            data = dict(row)
+            key = data.pop("key")
+            data["contact_info"] = json.loads(data["contact_info"] or "{}")
+            borrowers[key] = data
+        return borrowers
+
+    def _borrowing_from_row(self, row):
+        return self._borrowing_from_dict(dict(row))
+
+    def _borrowing_from_dict(self, borrowing):
+        del borrowing["borrower_key"]
+        del borrowing["updated_seq"]
+        borrowing["returned"] = bool(borrowing["returned"])
+        borrowing["contact_info"] = json.loads(borrowing["contact_info"] or "{}")
+        # Return details are kept on returned rows even when empty, like the JSON format
+        optional = ("split_from",) if borrowing["returned"] else OPTIONAL_KEYS
+        for key in optional:
+            if borrowing[key] is None:
+                del borrowing[key]
+        return borrowing
+
+    # Saving
+
+    def write_batch(self, writes):
+        """Apply (kind, data) writes as one transaction
+
+        kind is utensils, borrowings, changed_borrowings, archived_borrowings
+        (ids to delete) or borrowers.
+        """
+        savers = {
+            "utensils": self._save_utensils,
+            "borrowings": self._save_borrowings,
+            "changed_borrowings": self._put_borrowings,
+            "archived_borrowings": self._delete_borrowings,
+            "borrowers": self._save_borrowers,
+        }
+        with self.lock, self.conn:
+            for kind, data in writes:
+                savers[kind](data)
+
+    def save_utensils(self, utensils):
+        with self.lock, self.conn:
+            self._save_utensils(utensils)
+
+    def _save_utensils(self, utensils):
+        self.conn.execute("DELETE FROM utensils")
+        self.conn.executemany(
+            "INSERT INTO utensils (id, name, category, quantity, available) VALUES (?, ?, ?, ?, ?)",
+            [(u["id"], u["name"], u.get("category"), u["quantity"], u["available"]) for u in utensils])
+
+    def save_borrowings(self, borrowings):
+        with self.lock, self.conn:
+            self._save_borrowings(borrowings)
+
+    def _save_borrowings(self, borrowings):
+        self.conn.execute("DELETE FROM borrowings")
+        self._put_borrowings(borrowings)
+
+    def put_borrowings(self, borrowings):
+        """Insert or update changed borrowings"""
+        with self.lock, self.conn:
+            self._put_borrowings(borrowings)
+
+    def _put_borrowings(self, borrowings):
+        seq = self._next_seq("borrowings")
+        placeholders = ", ".join("?" for _ in BORROWING_COLUMNS)
+        self.conn.executemany(
+            f"INSERT OR REPLACE INTO borrowings ({', '.join(BORROWING_COLUMNS)}, updated_seq) VALUES ({placeholders}, ?)",
+            [self._borrowing_to_row(b) + (seq,) for b in borrowings])
+
+    def _delete_borrowings(self, borrowing_ids):
+        self.conn.executemany("DELETE FROM borrowings WHERE id = ?", [(bid,) for bid in borrowing_ids])
+
+    def _borrowing_to_row(self, borrowing):
+        return (
+            borrowing["id"],
+            borrowing["borrower_name"],
+            borrowing["borrower_name"].lower().strip(),
+            borrowing["utensil_id"],
+            borrowing["utensil_name"],
+            borrowing["quantity"],
+            borrowing.get("borrow_date"),
+            borrowing.get("due_date"),
+            1 if borrowing.get("returned") else 0,
+            borrowing.get("return_date"),
+            borrowing.get("return_condition"),
+            borrowing.get("return_notes"),
+            borrowing.get("return_quantity"),
+            json.dumps(borrowing.get("contact_info", {})),
+            borrowing.get("split_from"),
+        )
+
+    def save_borrowers(self, borrowers):
+        with self.lock, self.conn:
+            self._save_borrowers(borrowers)
+
+    def _save_borrowers(self, borrowers):
+        self.conn.executemany(
+            "INSERT OR REPLACE INTO borrowers (key, name, credit_score, total_borrowings, on_time_returns, "
+            "late_returns, damaged_items, contact_info) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            [(key, data["name"]) + tuple(data.get(c, 0) for c in BORROWER_COUNTERS) +
+             (json.dumps(data.get("contact_info", {})),) for key, data in borrowers.items()])
+
+    # Indexed queries
+
+    def active_borrowing_ids(self):
+        with self.lock:
+            rows = self.conn.execute("SELECT id FROM borrowings WHERE returned = 0 ORDER BY id").fetchall()
+        return [row[0] for row in rows]
+
+    def search_borrowing_ids(self, search_term, status, today):
+        """Find borrowings by name substring and status, today is a YYYY-MM-DD string"""
+        clauses = []
+        params = []
+        if status == "Returned":
+            clauses.append("returned = 1")
+        elif status == "Active":
+            clauses.append("returned = 0 AND (due_date IS NULL OR due_date > ?)")
+            params.append(today)
+        elif status == "Overdue":
+            clauses.append("returned = 0 AND due_date <= ?")
+            params.append(today)
+
+        if search_term:
+            pattern = "%" + search_term.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+            clauses.append("(borrower_name LIKE ? ESCAPE '\\' OR utensil_name LIKE ? ESCAPE '\\')")
+            params.extend([pattern, pattern])
+
+        where = " WHERE " + " AND ".join(clauses) if clauses else ""
+        with self.lock:
+            rows = self.conn.execute(f"SELECT id FROM borrowings{where} ORDER BY id", params).fetchall()
+        return [row[0] for row in rows]
+
+
+def migrate_json(data_dir, db_file=None):
+    """One-shot migration of the JSON data files into a SQLite database"""
+    from kube.journal import BorrowingJournal
+
+    db_file = db_file or os.path.join(data_dir, "kube.db")
+    store = SQLiteStore(db_file)
+
+    utensils_file = os.path.join(data_dir, "utensils.json")
+    if os.path.exists(utensils_file):
+        with open(utensils_file, 'r') as f:
+            store.save_utensils(json.load(f))
+
+    store.save_borrowings(BorrowingJournal(os.path.join(data_dir, "borrowings.json")).load())
+
+    borrowers_file = os.path.join(data_dir, "borrowers.json")
+    if os.path.exists(borrowers_file):
+        with open(borrowers_file, 'r') as f:
+            store.save_borrowers(json.load(f))
+
+    return store
+
+
+if __name__ == "__main__":
+    data_dir = sys.argv[1] if len(sys.argv) > 1 else "kube_data"
+    migrate_json(data_dir).close()
+    print(f"Migrated {data_dir} to {os.path.join(data_dir, 'kube.db')}")
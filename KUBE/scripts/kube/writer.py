@@ -0,0 +1,104 @@
+import threading
+import traceback
+
+from contextlib import contextmanager
+
+from kube.commit import commit_group, rollback
+from kube.shared import ConflictError
+
+
+class WriteBehindWriter:
+    """Background thread that coalesces saves and group-commits every dirty collection at most once per interval
+
+    Jobs are prepare callables returning a list of commit operations (see
+    kube.commit). They all run under data_lock in one go, so a flush never
+    captures half of a borrow or return transaction. A replace payload may
+    be a callable, which is serialized after data_lock is released so big
+    snapshots do not hold up the app. With a SharedDataDir every flush
+    holds its lock and stamps the commit with version bumps.
+    """
+
+    def __init__(self, data_lock, manifest_file, interval=1.0, shared=None):
+        self.data_lock = data_lock
+        self.manifest_file = manifest_file
+        self.interval = interval
+        self.shared = shared
+        self.pending = {}
+        self.lock = threading.Lock()
+        self.flush_lock = threading.Lock()
+        self.dirty = threading.Event()
+        self.stopping = threading.Event()
+        self.thread = threading.Thread(target=self._run, name="kube-writer", daemon=True)
+        self.thread.start()
+
+    def mark_dirty(self, name, job):
+        """Schedule job() for the next group commit, repeated marks before a flush collapse into one"""
+        with self.lock:
+            self.pending[name] = job
+        self.dirty.set()
+
+    def _run(self):
+        while not self.stopping.is_set():
+            self.dirty.wait()
+            # Let more changes pile up, but wake straight away when the app is closing
+            self.stopping.wait(self.interval)
+            self.flush()
+
+    @contextmanager
+    def _commit_lock(self):
+        if self.shared is None:
+            yield
+        else:
+            with self.shared:
+                yield
+
+    def flush(self):
+        """Commit every pending job now, returns False if the commit failed or was refused"""
+        with self._commit_lock(), self.flush_lock:
+            with self.lock:
+                jobs = self.pending
+                self.pending = {}
+                self.dirty.clear()
+            if not jobs:
+                return True
+
+            ops = []
+            try:
+                with self.data_lock:
+                    for job in jobs.values():
+                        ops.extend(job())
+                    if self.shared is not None:
+                        ops.extend(self.shared.stamp(ops))
+                commit_group([op[:2] + (op[2](),) if op[0] == "replace" and callable(op[2]) else op for op in ops],
+                             self.manifest_file)
+            except Exception as e:
+                with self.data_lock:
+                    rollback(ops)
+                if isinstance(e, ConflictError):
+                    # The jobs captured data another instance has since changed, writing it now would undo
+                    # that change. Drop them, the owner starts over from the disk and reports the loss
+                    self.shared.rejected(e)
+                    return False
+                traceback.print_exc()
+                # Keep the jobs so the next flush retries them
+                with self.lock:
+                    for name, job in jobs.items():
+                        self.pending.setdefault(name, job)
+                    self.dirty.set()
+                return False
+            if self.shared is not None:
+                self.shared.committed()
+            return True
+
+    def discard(self):
+        """Forget every pending job, for changes that are being thrown away"""
+        with self.lock:
+            self.pending = {}
+            self.dirty.clear()
+
+    def stop(self):
+        """Flush outstanding writes and stop the thread"""
+        self.stopping.set()
+        self.dirty.set()
+        self.thread.join()
+        self.flush()
@@ -0,0 +1,19 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from kube.engine import KubeEngine  # noqa: E402
+
+
+@pytest.fixture
+def engine(tmp_path):
+    """An engine on an empty data folder with two utensils"""
+    engine = KubeEngine(str(tmp_path / "kube_data"))
+    engine.load_data()
+    engine.add_utensil("Pot", "Cookware", 5)
+    engine.add_utensil("Ladle", "Utensils", 3)
+    yield engine
+    engine.close()
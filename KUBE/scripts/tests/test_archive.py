@@ -0,0 +1,61 @@
+import pytest
+
+from kube.archive import log_key
+from kube.engine import KubeEngine
+
+
+@pytest.fixture
+def archived(engine):
+    """Loans returned in 2024 moved to the archive, with current loans borrowed before and among them"""
+    pot = engine.utensils_by_name["Pot"]["id"]
+    ladle = engine.utensils_by_name["Ladle"]["id"]
+    for name, month in (("Ana", "01"), ("Ben", "02"), ("Ana", "03"), ("Cy", "03")):
+        loan, = engine.borrow_items(name, {pot: 1}, f"2024-{month}-20", {}, borrow_date=f"2024-{month}-10")
+        engine.return_items([(loan, 1, "Good", "")], return_date=f"2024-{month}-15")
+    # Still out, borrowed in an archived month and before every archived loan
+    engine.borrow_items("Dee", {ladle: 1}, "2024-03-20", {}, borrow_date="2024-03-12")
+    engine.borrow_items("Eve", {ladle: 1}, "2023-12-20", {}, borrow_date="2023-12-01")
+    engine.borrow_items("Ana", {ladle: 1}, "2099-01-01", {})
+    assert engine.archive_borrowings() == 4
+    return engine
+
+
+def test_archive_moves_returned_loans(archived):
+    assert len(archived.archive) == 4 and len(archived.borrowings) == 3
+    assert archived.archive.months == ["2024-03", "2024-02", "2024-01"]
+    assert [b["id"] for b in archived.get_borrower_history("Ana")] == [1, 3, 7]
+    # Ids are never reused for archived loans
+    loan, = archived.borrow_items("Fay", {archived.utensils_by_name["Pot"]["id"]: 1}, "2099-01-01", {})
+    assert loan["id"] == 8
+
+
+def test_transaction_log_merges_archived_loans_by_date(archived):
+    expected = sorted(list(archived.borrowings) + list(archived.archive.iter_borrowings()), key=log_key, reverse=True)
+    count = archived.transaction_log_count()
+    assert [archived.transaction_log_at(i)["id"] for i in range(count)] == [b["id"] for b in expected]
+    assert [b["id"] for b in archived.export_borrowings()] == [b["id"] for b in expected]
+    with pytest.raises(IndexError):
+        archived.transaction_log_at(count)
+
+
+def test_search_reads_months_as_needed(archived):
+    matches = archived.archive.search("ana")
+    assert next(matches)["id"] == 1
+    # Only January has been read, March is not opened until the caller asks for more
+    assert list(archived.archive.cache) == ["2024-01"]
+    assert [b["id"] for b in matches] == [3]
+    assert [b["id"] for b in archived.iter_search_borrowings("ana")] == [7, 1, 3]
+    assert [b["id"] for b in archived.iter_search_borrowings("", "Returned")] == [1, 2, 3, 4]
+
+
+def test_archive_survives_a_reload(archived):
+    archived.close()
+    reopened = KubeEngine(archived.data_dir)
+    reopened.load_data()
+    try:
+        assert len(reopened.archive) == 4
+        assert [b["id"] for b in reopened.get_borrower_history("Ana")] == [1, 3, 7]
+        assert reopened.borrowing_ids.next_id == 8
+        assert reopened.borrowers["ana"]["total_borrowings"] == 3
+    finally:
+        reopened.close()
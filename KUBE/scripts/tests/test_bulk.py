@@ -0,0 +1,40 @@
+import pytest
+
+from kube.bulk import parse_borrow, parse_date
+
+
+def test_parse_borrow(engine):
+    pot = engine.utensils_by_name["Pot"]
+    row = {"borrower": " Ana ", "utensil": "Pot", "quantity": 2, "due_date": "2026-10-20", "phone": 555}
+    assert parse_borrow(engine, row) == ("Ana", {pot["id"]: 2}, "2026-10-20", {"phone": "555"}, None)
+
+
+def test_parse_borrow_sums_items_of_one_utensil(engine):
+    pot = engine.utensils_by_name["Pot"]
+    row = {"borrower": "Ana", "due_date": "2026-10-20",
+           "items": [{"utensil": "Pot"}, {"utensil_id": pot["id"], "quantity": 2}]}
+    assert parse_borrow(engine, row)[1] == {pot["id"]: 3}
+
+
+@pytest.mark.parametrize("row, message", [
+    ({"borrower": "Ana", "utensil": "Pot"}, "Missing due_date"),
+    ({"borrower": "Ana", "utensil": "Pot", "due_date": None}, "Missing due_date"),
+    ({"borrower": "Ana", "utensil": "Pot", "due_date": "20/10/2026"}, "YYYY-MM-DD"),
+    ({"borrower": "Ana", "utensil": "Wok", "due_date": "2026-10-20"}, "Utensil not found"),
+    ({"borrower": "Ana", "due_date": "2026-10-20", "items": "Pot"}, "items must be a list"),
+    (["Ana"], "Not a JSON object"),
+])
+def test_parse_borrow_rejects(engine, row, message):
+    with pytest.raises(ValueError, match=message):
+        parse_borrow(engine, row)
+
+
+@pytest.mark.parametrize("value, expected", [("2026-10-20", "2026-10-20"), ("2026-1-5", "2026-01-05")])
+def test_parse_date_stores_the_canonical_form(value, expected):
+    assert parse_date({"due_date": value}, "due_date") == expected
+
+
+@pytest.mark.parametrize("value", ["20261020", "2026-W43-2", "2026-10-20T10:00", "2026-02-30", 20261020])
+def test_parse_date_rejects_other_iso_forms(value):
+    with pytest.raises(ValueError, match="YYYY-MM-DD"):
+        parse_date({"due_date": value}, "due_date")
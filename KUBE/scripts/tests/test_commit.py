@@ -0,0 +1,66 @@
+import json
+import os
+
+from kube.commit import commit_group, recover_group, rollback
+
+
+def test_commit_group_writes_every_op(tmp_path):
+    manifest = str(tmp_path / "commit.json")
+    data = tmp_path / "data.json"
+    gone = tmp_path / "old.bin"
+    gone.write_bytes(b"old")
+    journal = tmp_path / "journal.jsonl"
+    journal.write_text('{"n": 1}\n')
+
+    commit_group([("replace", str(data), '{"a": 1}'),
+                  ("remove", str(gone)),
+                  ("append", str(journal), ['{"n": 2}\n']),
+                  ("append", str(journal), ['{"n": 3}\n'])], manifest)
+
+    assert data.read_text() == '{"a": 1}'
+    assert not gone.exists()
+    assert journal.read_text() == '{"n": 1}\n{"n": 2}\n{"n": 3}\n'
+    assert not os.path.exists(manifest)
+
+
+def test_truncate_then_append_in_one_group(tmp_path):
+    journal = tmp_path / "journal.jsonl"
+    journal.write_text('{"n": 1}\n')
+    commit_group([("append", str(journal), ['{"n": 2}\n']), ("truncate", str(journal))], str(tmp_path / "commit.json"))
+    assert journal.read_text() == '{"n": 2}\n'
+
+
+def test_recover_group_rolls_an_interrupted_commit_forward(tmp_path):
+    manifest = tmp_path / "commit.json"
+    data = tmp_path / "data.json"
+    data.write_text("old")
+    (tmp_path / "data.json.tmp").write_text("new")
+    journal = tmp_path / "journal.jsonl"
+    journal.write_text('{"n": 1}\n')
+    size = journal.stat().st_size
+    manifest.write_text(json.dumps({"replace": [[str(tmp_path / "data.json.tmp"), str(data)]], "truncate": [],
+                                    "remove": [], "append": [[str(journal), '{"n": 2}\n', size]]}))
+    # The crash tore the append halfway through
+    with open(journal, "a") as f:
+        f.write('{"n"')
+
+    assert recover_group(str(manifest))
+    assert data.read_text() == "new"
+    assert journal.read_text() == '{"n": 1}\n{"n": 2}\n'
+    assert not manifest.exists()
+    assert not recover_group(str(manifest))
+
+
+def test_recovering_twice_appends_once(tmp_path):
+    journal = tmp_path / "journal.jsonl"
+    manifest = {"replace": [], "truncate": [], "remove": [], "append": [[str(journal), '{"n": 1}\n', 0]]}
+    for _ in range(2):
+        (tmp_path / "commit.json").write_text(json.dumps(manifest))
+        recover_group(str(tmp_path / "commit.json"))
+    assert journal.read_text() == '{"n": 1}\n'
+
+
+def test_rollback_runs_only_rollback_ops():
+    calls = []
+    rollback([("replace", "x", ""), ("rollback", lambda: calls.append(1)), ("rollback", lambda: calls.append(2))])
+    assert calls == [1, 2]
@@ -0,0 +1,63 @@
+from kube.credit import build_events, late_days, replay, replay_events, verify
+
+
+def loan(borrowing_id, borrow_date, due_date, return_date=None, condition="Good", name="Ana", **fields):
+    borrowing = {"id": borrowing_id, "borrower_name": name, "utensil_name": "Pot", "utensil_id": 1, "quantity": 1,
+                 "borrow_date": borrow_date, "due_date": due_date, "returned": return_date is not None, **fields}
+    if return_date:
+        borrowing.update(return_date=return_date, return_condition=condition)
+    return borrowing
+
+
+def test_late_from_the_due_date_on():
+    assert late_days("2026-10-10", "2026-10-09") is None
+    assert late_days("2026-10-10", "2026-10-10") == 0
+    assert late_days("2026-10-10", "2026-10-13") == 3
+    assert late_days(None, "2026-10-13") is None
+
+
+def test_replay_scores_by_return_date():
+    ana = replay([
+        loan(1, "2026-10-01", "2026-10-05", "2026-10-04", "Excellent"),
+        loan(2, "2026-10-01", "2026-10-05", "2026-10-05"),
+        loan(3, "2026-10-02", "2026-10-05", "2026-10-14", "Damaged"),
+        loan(4, "2026-10-03", "2026-10-20"),
+    ], tracked_from=1)["ana"]
+    # 100 capped at +5+2, then -10 on the due date, -25 and -50 for nine days late and damaged
+    assert ana["credit_score"] == 15
+    assert (ana["total_borrowings"], ana["on_time_returns"], ana["late_returns"], ana["damaged_items"]) == (4, 1, 2, 1)
+
+
+def test_split_remainder_is_not_a_new_loan():
+    history = [loan(1, "2026-10-01", "2026-10-05", "2026-10-02"),
+               loan(2, "2026-10-01", "2026-10-05", "2026-10-03", split_from=1)]
+    assert replay(history, tracked_from=1)["ana"]["total_borrowings"] == 1
+    # Before split_from was recorded the remainder is recognized by its origin
+    assert replay([dict(b) for b in history], tracked_from=None)["ana"]["total_borrowings"] == 1
+
+
+def replay_from_zero(history):
+    zero = {"credit_score": 0, "total_borrowings": 0, "on_time_returns": 0, "late_returns": 0, "damaged_items": 0}
+    return replay_events(build_events(history, tracked_from=1), baseline={"ana": zero})["ana"]
+
+
+def test_milestone_once_on_the_tenth_clean_return():
+    history = [loan(i, "2026-09-01", "2026-09-05", "2026-09-02") for i in range(1, 13)]
+    # +5 per on-time return, +25 once with the 10th
+    assert [replay_from_zero(history[:n])["credit_score"] for n in (9, 10, 12)] == [45, 75, 85]
+    history[0]["return_condition"] = "Damaged"
+    assert replay_from_zero(history[:10])["credit_score"] == 45
+
+
+def test_verify_and_rebuild(engine):
+    pot = engine.utensils_by_name["Pot"]
+    engine.borrow_items("Ana", {pot["id"]: 2}, "2000-01-01", {})
+    engine.return_items([(engine.borrowings[0], 2, "Good", "")])
+    stored = {key: b.to_dict() for key, b in engine.borrowers.items()}
+    assert stored["ana"]["late_returns"] == 1
+    assert verify(stored, replay(engine.borrowings)) == []
+
+    engine.borrowers["ana"]["credit_score"] = 42
+    assert engine.rebuild_credit_scores() == 1
+    assert engine.borrowers["ana"]["credit_score"] == stored["ana"]["credit_score"]
+    assert engine.rebuild_credit_scores() == 0
@@ -0,0 +1,74 @@
+import pytest
+
+
+def borrow(engine, name="Ana", utensil="Pot", quantity=3):
+    engine.borrow_items(name, {engine.utensils_by_name[utensil]["id"]: quantity}, "2026-10-20", {})
+    return engine.borrowings[-1]
+
+
+def test_borrow_requires_a_due_date(engine):
+    pot = engine.utensils_by_name["Pot"]
+    for due_date in ("", None):
+        with pytest.raises(ValueError, match="due date"):
+            engine.borrow_items("Ana", {pot["id"]: 1}, due_date, {})
+    assert not engine.borrowings and pot["available"] == 5
+
+
+def test_partial_return_splits_the_loan(engine):
+    loan = borrow(engine)
+    engine.return_items([(loan, 1, "Good", "")])
+    remainder = engine.borrowings[-1]
+    assert loan["returned"] and loan["quantity"] == 1
+    assert not remainder["returned"] and remainder["quantity"] == 2 and remainder["split_from"] == loan["id"]
+    assert engine.utensils_by_name["Pot"]["available"] == 3
+
+
+@pytest.mark.parametrize("quantity", [0, 4])
+def test_return_rejects_a_bad_quantity(engine, quantity):
+    loan = borrow(engine)
+    with pytest.raises(ValueError, match="Invalid return quantity"):
+        engine.return_items([(loan, quantity, "Good", "")])
+    assert not loan["returned"]
+
+
+def test_return_rejects_nothing_and_returned_loans(engine):
+    with pytest.raises(ValueError, match="at least one"):
+        engine.return_items([])
+    loan = borrow(engine)
+    engine.return_items([(loan, 3, "Good", "")])
+    with pytest.raises(ValueError, match="already returned"):
+        engine.return_items([(loan, 3, "Good", "")])
+
+
+def test_return_rejects_a_loan_listed_twice(engine):
+    loan = borrow(engine)
+    ladle = borrow(engine, utensil="Ladle", quantity=1)
+    with pytest.raises(ValueError, match="more than once"):
+        engine.return_items([(ladle, 1, "Good", ""), (loan, 1, "Good", ""), (loan, 1, "Good", "")])
+    # Nothing from the batch was applied
+    assert not loan["returned"] and not ladle["returned"]
+    assert len(engine.borrowings) == 2
+    assert engine.utensils_by_name["Pot"]["available"] == 2
+    assert engine.utensils_by_name["Ladle"]["available"] == 2
+
+
+def test_return_uses_the_current_record_after_a_reload(engine):
+    stale = borrow(engine)
+    with engine.data_lock:
+        engine._load_collections()
+    current = engine.borrowings_by_id[stale["id"]]
+    assert current is not stale
+
+    assert engine.return_items([(stale, 3, "Good", "")]) == [current]
+    assert current["returned"] and not stale["returned"]
+    assert engine.borrowings_by_id[stale["id"]] is current
+    # The stale copy still looks active, the loan it stands for is not
+    with pytest.raises(ValueError, match="already returned"):
+        engine.return_items([(stale, 3, "Good", "")])
+    assert engine.utensils_by_name["Pot"]["available"] == 5
+
+
+def test_return_rejects_loans_that_are_gone(engine):
+    loan = dict(borrow(engine), id=999)
+    with pytest.raises(ValueError, match="no longer on loan"):
+        engine.return_items([(loan, 1, "Good", "")])
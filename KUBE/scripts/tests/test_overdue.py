@@ -0,0 +1,57 @@
+from kube.overdue import OverdueIndex, date_ordinal
+
+DAY = date_ordinal("2026-10-17")
+
+
+def test_counts_loans_due_on_or_before_today():
+    borrowings = [
+        {"id": 1, "due_date": "2026-10-16"},
+        {"id": 2, "due_date": "2026-10-17"},
+        {"id": 3, "due_date": "2026-10-18"},
+        {"id": 4, "due_date": "2026-10-01", "returned": True},
+        {"id": 5, "due_date": ""},
+    ]
+    index = OverdueIndex(borrowings, today=DAY)
+    assert len(index) == 3
+    assert index.count_overdue() == 2
+    assert index.overdue_ids() == [1, 2]
+    assert index.is_overdue(2) and not index.is_overdue(3) and not index.is_overdue(4)
+    assert index.count_overdue(DAY + 1) == 3
+
+
+def test_add_and_remove_keep_the_flags():
+    index = OverdueIndex(today=DAY)
+    index.add(1, "2026-10-10")
+    index.add(2, "2026-10-20")
+    assert index.overdue_ids() == [1]
+    # A new due date replaces the old one
+    index.add(2, "2026-10-12")
+    assert index.overdue_ids() == [1, 2] and len(index) == 2
+    index.remove(1)
+    index.remove(99)
+    assert index.overdue_ids() == [2] and not index.is_overdue(1)
+    assert index.get_due(2) == date_ordinal("2026-10-12")
+
+
+def test_sweep_flips_only_loans_that_fell_due():
+    index = OverdueIndex([{"id": i, "due_date": f"2026-10-{day}"} for i, day in ((1, 17), (2, 18), (3, 20))],
+                         today=DAY)
+    assert index.sweep(DAY) == []
+    assert index.sweep(DAY + 3) == [2, 3]
+    assert index.is_overdue(3)
+    # A clock set backwards un-flags them again
+    assert index.sweep(DAY) == [2, 3]
+    assert index.overdue_ids() == [1]
+
+
+def test_engine_days_overdue(engine):
+    pot = engine.utensils_by_name["Pot"]
+    engine.borrow_items("Ana", {pot["id"]: 1}, "2026-10-10", {})
+    engine.borrow_items("Ben", {pot["id"]: 1}, "2099-01-01", {})
+    late, on_time = engine.borrowings
+    engine.overdue_index.sweep(DAY)
+    assert engine.is_overdue(late) and engine.days_overdue(late) == 7
+    assert not engine.is_overdue(on_time) and engine.days_overdue(on_time) == 0
+    assert engine.get_overdue_borrowings() == [late]
+    engine.return_items([(late, 1, "Good", "")])
+    assert not engine.is_overdue(late) and engine.get_overdue_borrowings() == []
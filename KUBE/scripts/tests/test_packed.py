@@ -0,0 +1,123 @@
+from datetime import date
+
+import pytest
+
+from kube.engine import KubeEngine
+from kube.journal import BorrowingJournal
+from kube.packed import LazyBorrowings, PackedBorrowings, pack_borrowings
+from kube.records import Borrowing
+
+TODAY = date(2026, 10, 17).toordinal()
+
+
+def loan(borrowing_id, due_date, returned=False, **fields):
+    return Borrowing(id=borrowing_id, borrower_name="Ana", utensil_name="Pot", utensil_id=1, quantity=1,
+                     borrow_date="2026-10-01", due_date=due_date, returned=returned, **fields)
+
+
+LOANS = [
+    loan(1, "2026-10-20"),
+    loan(2, "2026-10-17"),
+    loan(3, "2026-10-10", returned=True, return_date="2026-10-09", return_condition="Good"),
+    loan(4, "2026-10-05"),
+    # Not a plain date, kept in the extra fields and read the slow way
+    loan(5, "2026-10-5"),
+]
+
+
+def write_packed(tmp_path, borrowings=LOANS):
+    path = tmp_path / "borrowings.bin"
+    path.write_bytes(pack_borrowings(borrowings))
+    return str(path)
+
+
+def test_status_counts_read_from_columns(tmp_path):
+    with PackedBorrowings(write_packed(tmp_path)) as packed:
+        assert packed.status_counts(TODAY) == {"Active": 2, "Overdue": 2, "Returned": 1}
+        assert list(packed.column("id")) == [1, 2, 3, 4, 5]
+        assert list(packed) == LOANS
+
+
+def test_rows_decoded_on_first_access(tmp_path):
+    borrowings = LazyBorrowings(PackedBorrowings(write_packed(tmp_path)))
+    assert borrowings.undecoded == 5
+    assert borrowings.status_counts(TODAY) == {"Active": 2, "Overdue": 2, "Returned": 1}
+    assert borrowings.undecoded == 4  # only the row with extra fields
+
+    assert borrowings[-2] == LOANS[3]
+    assert borrowings[-2] is borrowings[3]
+    assert borrowings.get_by_id(2) == LOANS[1]
+    assert borrowings.get_by_id(9) is None
+    assert borrowings.undecoded == 2
+
+    # A changed row is counted from its record, not the file
+    borrowings[0]["returned"] = True
+    borrowings.append(loan(6, "2026-10-30"))
+    assert borrowings.status_counts(TODAY) == {"Active": 2, "Overdue": 2, "Returned": 2}
+    assert [b["id"] for b in borrowings] == [1, 2, 3, 4, 5, 6]
+    assert borrowings.undecoded == 0
+
+
+def test_journal_tail_folds_into_lazy_rows(tmp_path):
+    journal = BorrowingJournal(str(tmp_path / "borrowings.json"), packed=True)
+    write_packed(tmp_path)
+    journal.append("return", loan(2, "2026-10-17", returned=True, return_date="2026-10-17"))
+    journal.append("borrow", loan(6, "2026-10-30"))
+    (tmp_path / "borrowings.journal.jsonl").write_text("".join(journal.take_pending()))
+
+    borrowings = journal.load()
+    assert isinstance(borrowings, LazyBorrowings)
+    assert borrowings.undecoded == 4
+    assert [b["id"] for b in borrowings] == [1, 2, 3, 4, 5, 6]
+    assert borrowings[1]["returned"] is True
+
+
+@pytest.mark.parametrize("damage", ["truncated", "magic", "strings"])
+def test_damaged_file_raises_value_error(tmp_path, damage):
+    data = pack_borrowings(LOANS)
+    if damage == "truncated":
+        data = data[:100]
+    elif damage == "magic":
+        data = b"NOTAPACK" + data[8:]
+    else:
+        data = data[:-3]
+    path = tmp_path / "borrowings.bin"
+    path.write_bytes(data)
+    with pytest.raises(ValueError):
+        PackedBorrowings(str(path))
+
+
+def test_engine_indexes_match_decoded(engine):
+    pot = engine.utensils_by_name["Pot"]
+    ladle = engine.utensils_by_name["Ladle"]
+    engine.borrow_items("Ana", {pot["id"]: 2, ladle["id"]: 1}, "2026-10-01", {})
+    engine.borrow_items("Ben", {pot["id"]: 1}, "2099-01-01", {})
+    engine.return_items([(engine.borrowings[0], 1, "Good", "")])
+    engine.set_storage_backend("packed")
+    engine.borrowings_journal.compact_threshold = 1
+    engine.borrow_items("Cy", {ladle["id"]: 1}, "2099-01-02", {})
+    engine.writer.flush()
+    engine.writer.flush()
+    engine.close()
+
+    reopened = KubeEngine(engine.data_dir)
+    reopened.load_data()
+    try:
+        assert isinstance(reopened.borrowings, LazyBorrowings)
+        counts = reopened.get_status_counts()
+        active = [b["id"] for b in reopened.get_active_borrowings()]
+        overdue = reopened.overdue_index.entries
+        totals = {name: reopened.borrower_view.active_quantity(name) for name in ("Ana", "Ben", "Cy")}
+        next_id = reopened.borrowing_ids.next_id
+        assert reopened.borrowings_by_id[2]["id"] == 2
+        assert 99 not in reopened.borrowings_by_id
+
+        reopened.borrowings = list(reopened.borrowings)
+        reopened.build_indexes()
+        assert reopened.get_status_counts() == counts == {"Active": 2, "Overdue": 2, "Returned": 1}
+        assert [b["id"] for b in reopened.get_active_borrowings()] == active
+        assert reopened.overdue_index.entries == overdue
+        assert {name: reopened.borrower_view.active_quantity(name) for name in totals} == totals
+        assert reopened.borrowing_ids.next_id == next_id
+    finally:
+        reopened.close()
@@ -0,0 +1,85 @@
+import pytest
+
+from kube import reports
+from kube.overdue import date_ordinal
+from kube.reports import ReportEngine
+
+TODAY = date_ordinal("2026-10-17")
+UTENSILS = [{"id": 1, "name": "Pot", "category": "Cookware"}, {"id": 2, "name": "Ladle", "category": "Utensils"}]
+
+
+def loan(borrowing_id, utensil_id, quantity, borrow_date, due_date, return_date=None, **fields):
+    borrowing = {"id": borrowing_id, "utensil_id": utensil_id, "utensil_name": UTENSILS[utensil_id - 1]["name"],
+                 "quantity": quantity, "borrow_date": borrow_date, "due_date": due_date,
+                 "returned": return_date is not None, **fields}
+    if return_date:
+        borrowing["return_date"] = return_date
+    return borrowing
+
+
+HISTORY = [
+    loan(1, 1, 2, "2026-10-01", "2026-10-05", "2026-10-07"),
+    loan(2, 1, 1, "2026-10-03", "2026-10-10", "2026-10-04"),
+    loan(3, 2, 1, "2026-10-10", "2026-10-20"),
+    # The rest of loan 1 after a partial return, not a loan of its own
+    loan(4, 1, 1, "2026-10-01", "2026-10-05", "2026-10-09", split_from=1),
+    loan(5, 2, 1, "2025-01-01", "2025-01-03", "2025-01-02"),
+]
+
+
+@pytest.fixture(params=["numpy", "python"])
+def backend(request, monkeypatch):
+    if request.param == "python":
+        monkeypatch.setattr(reports, "np", None)
+        monkeypatch.setattr(reports, "_numpy_checked", True)
+    return request.param
+
+
+def report(history, windows, group_by="Utensil"):
+    engine = ReportEngine()
+    return engine.run(engine.prepare(history, UTENSILS, group_by), windows, today=TODAY)
+
+
+def test_rollups_per_utensil(backend):
+    rows = report(HISTORY, ["Last 30 days", "All time"])
+    recent = {row["name"]: row for row in rows["Last 30 days"]}
+    assert recent["Pot"] == {"name": "Pot", "loans": 2, "quantity": 4, "mean_loan_days": 5.0,
+                             "late_rate": 2 / 3, "peak": 4}
+    assert recent["Ladle"] == {"name": "Ladle", "loans": 1, "quantity": 1, "mean_loan_days": None,
+                               "late_rate": None, "peak": 1}
+    ladle = {row["name"]: row for row in rows["All time"]}["Ladle"]
+    assert (ladle["loans"], ladle["mean_loan_days"], ladle["late_rate"]) == (2, 1.0, 0.0)
+
+
+def test_rollups_per_category(backend):
+    rows = report(HISTORY, ["All time"], group_by="Category")["All time"]
+    assert [(row["name"], row["loans"]) for row in rows] == [("Cookware", 2), ("Utensils", 2)]
+
+
+def test_update_refreshes_columns_and_cache():
+    engine = ReportEngine()
+    history = [dict(b) for b in HISTORY]
+    first = engine.run(engine.prepare(history, UTENSILS, "Utensil"), ["Last 30 days"], today=TODAY)
+    history[2].update(returned=True, return_date="2026-10-25")
+    engine.update(history[2])
+    engine.update(loan(6, 2, 2, "2026-10-15", "2026-10-16"))
+    second = engine.run(engine.prepare(history, UTENSILS, "Utensil"), ["Last 30 days"], today=TODAY)
+    ladle_before = {row["name"]: row for row in first["Last 30 days"]}["Ladle"]
+    ladle_after = {row["name"]: row for row in second["Last 30 days"]}["Ladle"]
+    assert ladle_before["loans"] == 1 and ladle_after["loans"] == 2
+    assert ladle_after["peak"] == 3
+
+
+def test_engine_report_skips_split_remainders(engine):
+    pot = engine.utensils_by_name["Pot"]
+    engine.borrow_items("Ana", {pot["id"]: 3}, "2099-01-01", {})
+    engine.return_items([(engine.borrowings[0], 1, "Good", "")])
+    prepared = engine.report_engine.prepare(engine.report_history(), engine.utensils, "Utensil")
+    rows = {row["name"]: row for row in engine.report_engine.run(prepared, ["All time"])["All time"]}
+    assert rows["Pot"]["loans"] == 1 and rows["Pot"]["quantity"] == 3
+
+
+def test_return_on_the_due_date_is_late(backend):
+    history = [loan(1, 1, 1, "2026-10-01", "2026-10-05", "2026-10-05"),
+               loan(2, 1, 1, "2026-10-01", "2026-10-06", "2026-10-05")]
+    assert report(history, ["All time"])["All time"][1]["late_rate"] == 0.5
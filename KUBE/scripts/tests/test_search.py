@@ -0,0 +1,48 @@
+from kube.search import TrigramIndex
+
+
+def loan(borrowing_id, borrower_name, utensil_name):
+    return {"id": borrowing_id, "borrower_name": borrower_name, "utensil_name": utensil_name}
+
+
+def test_substring_matches_either_name():
+    index = TrigramIndex([loan(1, "Ana Lopez", "Pot"), loan(2, "Ben", "Stock Pot"), loan(3, "Ana Lopez", "Ladle")])
+    assert index.search("LOPEZ") == {1, 3}
+    assert index.search("pot") == {1, 2}
+    assert index.search("ock p") == {2}
+    assert index.search("zzz") == set()
+
+
+def test_short_terms_fall_back_to_a_name_scan():
+    index = TrigramIndex([loan(1, "Ana", "Pot"), loan(2, "Ben", "Ladle")])
+    assert index.search("a") == {1, 2}
+    assert index.search("be") == {2}
+
+
+def test_trigrams_must_appear_in_the_same_name():
+    # Anapo and Pot hold every trigram of "anapot" between them, but neither name contains it
+    index = TrigramIndex([loan(1, "Ana", "Pot"), loan(2, "Anapo", "Ladle")])
+    assert index.search("anapot") == set()
+    assert index.search("anapo") == {2}
+
+
+def test_add_and_remove():
+    index = TrigramIndex()
+    index.add(loan(1, "Ana", "Pot"))
+    index.add(loan(2, "Ana", "Pan"))
+    index.remove(loan(1, "Ana", "Pot"))
+    assert index.search("ana") == {2}
+    assert index.search("pot") == set()
+
+
+def test_engine_search_matches_a_full_scan(engine):
+    pot = engine.utensils_by_name["Pot"]["id"]
+    ladle = engine.utensils_by_name["Ladle"]["id"]
+    engine.borrow_items("Ana Lopez", {pot: 1}, "2026-10-20", {})
+    engine.borrow_items("Ben", {ladle: 1}, "2026-10-20", {})
+    assert [b["borrower_name"] for b in engine.iter_search_borrowings("lop")] == ["Ana Lopez"]
+    # Loans made after the index was built are found too
+    engine.borrow_items("Lopez Cy", {ladle: 1}, "2026-10-20", {})
+    found = [b["id"] for b in engine.iter_search_borrowings("LOPEZ")]
+    assert found == [b["id"] for b in engine.borrowings if "lopez" in b["borrower_name"].lower()]
+    assert [b["borrower_name"] for b in engine.iter_search_borrowings("ladle")] == ["Ben", "Lopez Cy"]
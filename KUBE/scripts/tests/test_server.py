@@ -0,0 +1,106 @@
+import asyncio
+import json
+
+import pytest
+
+from kube.server import APIServer, HTTPError
+
+
+def call(engine, requests, token=None):
+    """Run (method, path, body) requests through one server, returns [(status, payload)]"""
+    async def run():
+        server = APIServer(engine, token)
+        server.writes = asyncio.Queue()
+        writer = asyncio.ensure_future(server._write_loop())
+        results = []
+        try:
+            for method, path, body in requests:
+                headers = {"authorization": f"Bearer {token}"} if token else {}
+                try:
+                    _, status, payload = await server._dispatch(method, path, headers, json.dumps(body).encode())
+                except HTTPError as e:
+                    status, payload = e.status, {"error": str(e)}
+                results.append((status, payload))
+        finally:
+            writer.cancel()
+        return results
+    return asyncio.run(run())
+
+
+def borrow(item="Pot", quantity=2, borrower="Ana"):
+    return ("POST", "/borrow", {"borrower": borrower, "due_date": "2099-01-01",
+                                "items": [{"utensil": item, "quantity": quantity}]})
+
+
+def test_borrow_then_return(engine):
+    (status, borrowed), (_, loan), (status_return, returned), (_, utensils) = call(engine, [
+        borrow(), ("GET", "/borrowings/1", None),
+        ("POST", "/return", {"returns": [{"id": 1, "quantity": 2, "condition": "Good"}]}),
+        ("GET", "/utensils", None),
+    ])
+    assert status == 201 and borrowed["borrowings"][0]["quantity"] == 2
+    assert loan["status"] == "Active"
+    assert status_return == 200 and returned["borrowings"][0]["returned"] is True
+    assert {u["name"]: u["borrowed"] for u in utensils}["Pot"] == 0
+
+
+def test_invalid_requests(engine):
+    results = call(engine, [
+        borrow(quantity=9), ("GET", "/borrowings/99", None), ("DELETE", "/borrow", None),
+        ("GET", "/borrowings?limit=abc", None),
+        ("POST", "/return", {"returns": [{"id": 1, "quantity": 1}, {"id": 1, "quantity": 1}]}),
+    ])
+    assert [status for status, _ in results] == [422, 404, 405, 422, 422]
+
+
+def test_token_required(engine):
+    with pytest.raises(HTTPError) as raised:
+        asyncio.run(APIServer(engine, "s3cret")._dispatch("GET", "/utensils", {}, b""))
+    assert raised.value.status == 401
+    assert call(engine, [("GET", "/utensils", None)], token="s3cret")[0][0] == 200
+
+
+def test_paging_and_zero_limit(engine):
+    requests = [borrow(quantity=1, borrower=name) for name in ("Ana", "Ben", "Cy")]
+    requests += [("GET", "/borrowings?limit=2", None), ("GET", "/borrowings?limit=2&offset=2", None),
+                 ("GET", "/borrowings?limit=0", None)]
+    results = call(engine, requests)
+    first, second, zero = results[3:]
+    assert [b["id"] for b in first[1]["borrowings"]] == [1, 2] and first[1]["next_offset"] == 2
+    assert [b["id"] for b in second[1]["borrowings"]] == [3] and second[1]["next_offset"] is None
+    assert zero[0] == 400
+
+
+def test_failed_save_asks_for_a_resubmit(engine, monkeypatch):
+    monkeypatch.setattr(engine.writer, "flush", lambda *args, **kwargs: False)
+    (status, payload), = call(engine, [borrow()])
+    assert status == 503 and "send the request again" in payload["error"]
+    monkeypatch.undo()
+    # Nothing of the failed request was kept
+    assert not engine.borrowings and engine.utensils_by_name["Pot"]["available"] == 5
+    (status, _), = call(engine, [borrow()])
+    assert status == 201
+
+
+def test_stats_count_loans(engine):
+    (_, stats), = call(engine, [borrow(), ("GET", "/stats", None)])[1:]
+    assert stats["borrowings"] == {"Active": 1, "Overdue": 0, "Returned": 0}
+
+
+@pytest.mark.parametrize("connection", ["keep-alive", "close"])
+def test_http_round_trip(engine, connection):
+    async def run():
+        server = APIServer(engine)
+        listener = await asyncio.start_server(server._serve_connection, "127.0.0.1", 0)
+        port = listener.sockets[0].getsockname()[1]
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        writer.write(f"GET /utensils HTTP/1.1\r\nHost: x\r\nConnection: {connection}\r\n\r\n".encode())
+        head = await reader.readuntil(b"\r\n\r\n")
+        length = int(next(line.split(b":")[1] for line in head.split(b"\r\n") if line.startswith(b"Content-Length")))
+        body = json.loads(await reader.readexactly(length))
+        writer.close()
+        listener.close()
+        return head, body
+    head, body = asyncio.run(run())
+    assert head.startswith(b"HTTP/1.1 200") and f"Connection: {connection}".encode() in head
+    assert [u["name"] for u in body] == [u["name"] for u in engine.utensils]
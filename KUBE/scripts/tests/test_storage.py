@@ -0,0 +1,46 @@
+import os
+
+import pytest
+
+from kube.engine import KubeEngine
+
+
+def borrowing_state(engine):
+    return sorted((b.to_dict() for b in engine.borrowings), key=lambda b: b["id"])
+
+
+@pytest.mark.parametrize("backend", ["json", "packed", "sqlite"])
+def test_round_trip(engine, backend):
+    pot = engine.utensils_by_name["Pot"]
+    ladle = engine.utensils_by_name["Ladle"]
+    engine.borrow_items("Ana", {pot["id"]: 3, ladle["id"]: 1}, "2026-10-20", {"phone": "555"})
+    engine.borrow_items("Ben", {pot["id"]: 1}, "2026-10-01", {})
+    engine.return_items([(engine.borrowings[0], 1, "Damaged", "dented"), (engine.borrowings[1], 1, "Excellent", "")])
+    engine.set_storage_backend(backend)
+    # Fold the journal into a snapshot in the new format as well
+    engine.borrowings_journal.compact_threshold = 1
+    engine.borrow_items("Cy", {ladle["id"]: 1}, "2026-10-25", {"email": "cy@example.com"})
+    engine.writer.flush()
+    engine.writer.flush()
+
+    journal = engine.borrowings_journal
+    if backend != "sqlite":
+        assert os.path.exists(journal.packed_file if backend == "packed" else journal.snapshot_file)
+        assert not os.path.exists(journal.snapshot_file if backend == "packed" else journal.packed_file)
+
+    borrowings = borrowing_state(engine)
+    utensils = [u.to_dict() for u in engine.utensils]
+    borrowers = {key: b.to_dict() for key, b in engine.borrowers.items()}
+    engine.close()
+
+    reopened = KubeEngine(engine.data_dir)
+    reopened.load_data()
+    try:
+        assert reopened.settings.get("storage_backend", "json") == backend
+        assert reopened.borrowings_journal.packed == (backend == "packed")
+        assert (reopened.store is not None) == (backend == "sqlite")
+        assert borrowing_state(reopened) == borrowings
+        assert [u.to_dict() for u in reopened.utensils] == utensils
+        assert {key: b.to_dict() for key, b in reopened.borrowers.items()} == borrowers
+    finally:
+        reopened.close()